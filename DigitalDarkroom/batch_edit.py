@@ -0,0 +1,190 @@
+"""
+Module to apply an edit recipe to many images at once.
+
+The images are rendered at full resolution in a pool of processes. They are
+spread over the chunks of work by file size so that every process gets about
+the same amount of pixels to decode, and each file is written atomically (a
+temporary file renamed over the destination). The image database is updated
+with a single write at the end of the batch.
+
+Functions
+---------
+select_images
+    Function to get the images of an event or of a query over the image database.
+
+make_chunks
+    Function to split the images into chunks of about the same total file size.
+
+render_chunk
+    Function to render and save a chunk of images (run in the worker processes).
+
+batch_edit
+    Function to apply a recipe to many images.
+"""
+import os
+from concurrent.futures import (ProcessPoolExecutor, as_completed)
+import pandas as pd
+from PIL import Image
+import config
+import catalog
+import recipes
+import rotation
+from metadata_reader import orient
+from storage import atomic_file
+from rescan import update_signatures
+
+def select_images(event = None, query = None):
+    """ Returns the IDs of the images of an event or matching a query.
+
+    Parameters
+    ----------
+    event : str
+        the name of an event.
+    query : str
+        a pandas query over the columns of the image database.
+        Example: 'Event == "Greece" and Width > 3000'
+
+    Returns
+    -------
+    list
+        the image IDs.
+    """
+    images = config.DB
+    if event is not None:
+        images = images[images["Event"] == event]
+    if query is not None:
+        images = images.query(query)
+    return list(images.index)
+
+def make_chunks(tasks, number_chunks):
+    """ Splits tasks into chunks of about the same total file size
+    (largest files first, each one added to the lightest chunk).
+
+    Parameters
+    ----------
+    tasks : list
+        the tasks (source path, destination path, operations).
+    number_chunks : int
+        the maximum number of chunks.
+
+    Returns
+    -------
+    list
+        the non-empty chunks (lists of tasks).
+    """
+    chunks = [[] for _ in range(max(1, min(number_chunks, len(tasks))))]
+    sizes = [0] * len(chunks)
+    for task in sorted(tasks, key = lambda task: os.path.getsize(task[0]), reverse = True):
+        lightest = sizes.index(min(sizes))
+        chunks[lightest].append(task)
+        sizes[lightest] += os.path.getsize(task[0])
+    return [chunk for chunk in chunks if chunk]
+
+def render_chunk(chunk):
+    """ Renders the recipes of a chunk of images at full resolution and saves them atomically.
+
+    Parameters
+    ----------
+    chunk : list
+        the tasks (source path, destination path, operations).
+
+    Returns
+    -------
+    list
+        (destination path, size of the edited image, error message or None) for each task.
+    """
+    results = []
+    for source_path, destination_path, operations in chunk:
+        try:
+            with Image.open(source_path) as image:
+                image_format = image.format
+                edited_image = recipes.apply_recipe(orient(image), operations)
+
+                # Write to a temporary file first so that a file is never left half-written
+                with atomic_file(destination_path) as file:
+                    edited_image.save(file, image_format, quality = 95)
+            results.append((destination_path, edited_image.size, None))
+        except Exception as error:
+            results.append((destination_path, None, str(error)))
+    return results
+
+def batch_edit(image_ids, operations, copies = True, workers = config.batch_workers,
+               chunks_per_worker = config.batch_chunks_per_worker):
+    """ Applies an edit recipe to many images.
+
+    Parameters
+    ----------
+    image_ids : list
+        the IDs of the images to edit.
+    operations : list
+        the operations to add after the edits already stored for each image.
+    copies : bool
+        render the edited images as new files (name_2.jpg, ...) in the pool of processes,
+        or replace the recipes of the originals in the database (non-destructive, no rendering).
+        A rotation alone replaces the originals with rotation.rotate_images.
+    workers : int
+        the number of processes.
+    chunks_per_worker : int
+        the number of chunks of images per process.
+
+    Returns
+    -------
+    list
+        the IDs of the edited images (the new copies or the originals).
+    """
+    # Replace a rotation alone: rotate the files (losslessly for JPEG images)
+    operations = recipes.fuse(operations)
+    if not copies and len(operations) == 1 and operations[0][0] == "rotate":
+        rotated = rotation.rotate_images(image_ids, operations[0][1])
+        print(f"{len(rotated)} images rotated")
+        return rotated
+
+    # Replace: add the operations to the stored recipes of the originals
+    if not copies:
+        recipes.set_recipes({image_id: recipes.get_recipe(image_id) + list(operations)
+                             for image_id in image_ids})
+        print(f"{len(image_ids)} images edited")
+        return list(image_ids)
+
+    # Save: render each original with its stored recipe and the new operations into a new file
+    tasks = []
+    originals = {}
+    taken = {}
+    for image_id in image_ids:
+        event = config.DB.at[image_id, "Event"]
+        edited_image_name = recipes.copy_name(image_id, taken = taken.setdefault(event, set()))
+        taken[event].add(edited_image_name)
+        destination_path = os.path.join(config.images_path, event, edited_image_name)
+        originals[destination_path] = image_id
+        tasks.append((catalog.image_path(image_id), destination_path,
+                      recipes.fuse(recipes.get_recipe(image_id) + list(operations))))
+
+    edited = {}
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        futures = [pool.submit(render_chunk, chunk) for chunk in make_chunks(tasks, workers * chunks_per_worker)]
+        done = 0
+        for future in as_completed(futures):
+            for destination_path, size, error in future.result():
+                done += 1
+                if error is None:
+                    edited[destination_path] = size
+                else:
+                    print(f"Error! {catalog.label(originals[destination_path])} could not be edited: {error}")
+            print(f"{done}/{len(tasks)} images edited")
+
+    # Add the new images to the image database with a single write
+    new_rows = config.DB.loc[[originals[destination_path] for destination_path in edited]].copy()
+    new_rows.index = pd.Index(catalog.next_ids(len(new_rows)), name = "ID")
+    new_rows["Filename"] = [os.path.basename(destination_path) for destination_path in edited]
+    new_rows["Edited"] = True
+    if "Recipe" in new_rows.columns:
+        new_rows["Recipe"] = None
+    if "Width" in new_rows.columns:
+        new_rows["Width"] = [size[0] for size in edited.values()]
+        new_rows["Height"] = [size[1] for size in edited.values()]
+    previous = config.DB
+    config.DB = pd.concat([config.DB, new_rows])
+    catalog.refresh(new_rows.index, previous)
+    update_signatures(new_rows.index)
+    config.STORAGE.save_rows(config.DB, new_rows.index)
+    return list(new_rows.index)
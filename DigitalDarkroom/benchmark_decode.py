@@ -0,0 +1,75 @@
+"""
+Benchmark of the decoding of downscaled images for the display.
+
+Compares the previous full decode followed by a resize with the reduced
+resolution decode of thumbnails.load_downscaled (JPEG DCT scaling), at the
+panorama (1/20) and diaporama (1/4) scales, for each event in Images/.
+Each measure runs in a new process to report its own peak memory (RSS).
+Run from the DigitalDarkroom folder:
+    python benchmark_decode.py [--repeat N]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import resource
+import subprocess
+import config
+from PIL import Image
+from thumbnails import load_downscaled
+
+def full_decode(path, scale):
+    """ The decoding used before load_downscaled: full size decode and resize.
+    """
+    image = Image.open(path)
+    width = int(image.size[0] / scale)
+    height = int(image.size[1] / scale)
+    return image.resize((width, height))
+
+METHODS = {"full": full_decode, "draft": load_downscaled}
+
+def run_worker(method, event, scale, repeat):
+    """ Decodes the images of an event and prints the time per image and peak RSS as JSON.
+    """
+    paths = sorted(glob.glob(os.path.join(config.images_path, event, "*")))
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            METHODS[method](path, scale)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"ms": 1000 * elapsed / (repeat * len(paths)),
+                      "peak_mb": peak / 1024,
+                      "extra_mb": (peak - baseline) / 1024}))
+
+def measure(method, event, scale, repeat):
+    """ Runs a worker process and returns its results.
+    """
+    output = subprocess.run([sys.executable, __file__, "--worker", method, event, str(scale),
+                             "--repeat", str(repeat)],
+                            cwd = config.program_path, capture_output = True, check = True)
+    return json.loads(output.stdout)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the decoding of downscaled images")
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--worker", nargs = 3, metavar = ("METHOD", "EVENT", "SCALE"))
+    args = parser.parse_args()
+
+    if args.worker:
+        method, event, scale = args.worker
+        run_worker(method, event, int(scale), args.repeat)
+        raise SystemExit
+
+    print(f"{'Event':<12}{'Scale':>6}{'Full ms':>10}{'Draft ms':>10}{'Speedup':>9}"
+          f"{'Full MB':>10}{'Draft MB':>10}")
+    for event_path in sorted(glob.glob(os.path.join(config.images_path, "*"))):
+        event = os.path.basename(event_path)
+        for scale in config.thumbnail_scales:
+            full = measure("full", event, scale, args.repeat)
+            draft = measure("draft", event, scale, args.repeat)
+            print(f"{event:<12}{'1/' + str(scale):>6}{full['ms']:>10.1f}{draft['ms']:>10.1f}"
+                  f"{full['ms'] / draft['ms']:>8.1f}x{full['extra_mb']:>10.1f}{draft['extra_mb']:>10.1f}")
@@ -0,0 +1,63 @@
+"""
+Benchmark of the enhancements evaluated for many factors (slider tuning).
+
+Compares PIL.ImageEnhance (enhancer(image).enhance(factor) for each factor)
+with enhance.FastEnhancer (degenerate image computed once, then a NumPy
+blend per factor) for brightness, contrast, colour and sharpness, at the
+preview size (1/4) and at full size of an image.
+Run from the DigitalDarkroom folder:
+    python benchmark_enhance.py [--image PATH] [--factors N] [--repeat N]
+"""
+import os
+import glob
+import time
+import argparse
+import numpy as np
+import config
+import recipes
+from PIL import Image
+from enhance import FastEnhancer
+from thumbnails import load_downscaled
+
+def time_pil(image, enhancer, factors):
+    """ Returns the time in ms per factor of PIL.ImageEnhance.
+    """
+    start = time.perf_counter()
+    for factor in factors:
+        enhancer(image).enhance(factor)
+    return 1000 * (time.perf_counter() - start) / len(factors)
+
+def time_fast(image, enhancer, factors):
+    """ Returns the time in ms of the precomputation and per factor of FastEnhancer.
+    """
+    start = time.perf_counter()
+    engine = FastEnhancer(image, enhancer)
+    setup = time.perf_counter() - start
+    start = time.perf_counter()
+    for factor in factors:
+        engine.enhance_array(factor)
+    return 1000 * setup, 1000 * (time.perf_counter() - start) / len(factors)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the enhancements for many factors")
+    parser.add_argument("--image", help = "image to enhance (default: first image in Images/)")
+    parser.add_argument("--factors", type = int, default = 30, help = "number of factors (slider positions)")
+    parser.add_argument("--repeat", type = int, default = 3)
+    args = parser.parse_args()
+
+    image_path = args.image or sorted(glob.glob(os.path.join(config.images_path, "*", "*.jpg")))[0]
+    factors = list(np.linspace(0, 3, args.factors))
+    with Image.open(image_path) as image:
+        full_image = image.convert("RGB")
+    images = {"1/4": load_downscaled(image_path, 4).convert("RGB"), "full": full_image}
+
+    print(f"{os.path.basename(image_path)}, {args.factors} factors")
+    print(f"{'Enhancement':<12}{'Size':>6}{'PIL ms':>9}{'Setup ms':>10}{'Fast ms':>9}{'Speedup':>9}")
+    for name, enhancer in recipes.ENHANCERS.items():
+        for size, image in images.items():
+            pil = min(time_pil(image, enhancer, factors) for _ in range(args.repeat))
+            setup, fast = min(time_fast(image, enhancer, factors) for _ in range(args.repeat))
+
+            # Speedup over the whole tuning (precomputation included)
+            speedup = pil * len(factors) / (setup + fast * len(factors))
+            print(f"{name:<12}{size:>6}{pil:>9.2f}{setup:>10.2f}{fast:>9.2f}{speedup:>8.1f}x")
@@ -0,0 +1,63 @@
+"""
+Benchmark of the drawing of the image locations on the map.
+
+For libraries of increasing size, measures the time to compute the clusters and
+to draw the markers of the clusters in view (world, continent and city views),
+compared with drawing one marker per image.
+Run from the DigitalDarkroom folder:
+    python benchmark_map.py [--sizes N N ...]
+"""
+import time
+import argparse
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from map_clusters import MarkerClusters
+
+# Views of the map: (south, west, north, east)
+VIEWS = [(-90, -180, 90, 180), (30, -10, 60, 40), (48.7, 2.2, 49.0, 2.5)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the drawing of the image locations on the map")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 10000, 100000])
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    for size in args.sizes:
+        latitudes = np.clip(generator.normal(45, 15, size), -90, 90)
+        longitudes = np.clip(generator.normal(5, 40, size), -180, 180)
+
+        start = time.perf_counter()
+        clusters = MarkerClusters(np.arange(size), latitudes, longitudes)
+        built = time.perf_counter() - start
+
+        # Draw the clusters in each view
+        figure, axis = plt.subplots()
+        axis.set_autoscale_on(False)
+        markers = axis.scatter([], [], color = "red")
+        start = time.perf_counter()
+        for south, west, north, east in VIEWS:
+            axis.set_xlim(west, east)
+            axis.set_ylim(south, north)
+            view_longitudes, view_latitudes, counts = clusters.view(south, west, north, east)
+            markers.set_offsets(np.column_stack([view_longitudes, view_latitudes]))
+            markers.set_sizes(MarkerClusters.marker_sizes(counts))
+            figure.canvas.draw()
+        clustered = (time.perf_counter() - start) / len(VIEWS)
+        plt.close(figure)
+
+        # Draw every image in each view
+        figure, axis = plt.subplots()
+        axis.set_autoscale_on(False)
+        axis.scatter(longitudes, latitudes, color = "red")
+        start = time.perf_counter()
+        for south, west, north, east in VIEWS:
+            axis.set_xlim(west, east)
+            axis.set_ylim(south, north)
+            figure.canvas.draw()
+        every = (time.perf_counter() - start) / len(VIEWS)
+        plt.close(figure)
+
+        print(f"{size} images: clusters computed in {built * 1000:.0f} ms, "
+              f"view drawn in {clustered * 1000:.1f} ms with clusters, {every * 1000:.1f} ms with a marker per image")
@@ -0,0 +1,77 @@
+"""
+Benchmark of the metadata extraction of the images in Images/.
+
+Compares the previous extraction path (PIL Image.open and getexif) with the
+header-only reader of metadata_reader. Run from the DigitalDarkroom folder:
+    python benchmark_metadata.py [--repeat N]
+"""
+import os
+import glob
+import time
+import argparse
+import config
+from PIL import Image
+from metadata_reader import read_jpeg_metadata, read_metadata
+
+class CountingFile():
+    """ File wrapper counting the number of bytes read.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+
+    def read(self, size = -1):
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+def pil_path(file):
+    """ The metadata extraction used before metadata_reader.
+    """
+    img = Image.open(file)
+    exifdata = img.getexif()
+    date_time = exifdata.get(306)
+    return img.format, img.size, img.mode, len(Image.Image.getbands(img)), date_time
+
+def header_path(file):
+    """ The header-only metadata extraction.
+    """
+    return read_jpeg_metadata(file)
+
+def measure(function, paths, repeat):
+    """ Returns the mean time per image (ms) and the mean number of bytes read per image.
+    """
+    bytes_read = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            with open(path, "rb") as raw:
+                file = CountingFile(raw)
+                function(file)
+                bytes_read += file.bytes_read
+    elapsed = time.perf_counter() - start
+    count = repeat * len(paths)
+    return 1000 * elapsed / count, bytes_read / count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the image metadata extraction")
+    parser.add_argument("--repeat", type = int, default = 20)
+    args = parser.parse_args()
+
+    print(f"{'Event':<12}{'Images':>8}{'PIL ms':>10}{'Header ms':>11}{'Speedup':>9}"
+          f"{'PIL KB':>9}{'Header KB':>11}")
+    for event_path in sorted(glob.glob(os.path.join(config.images_path, "*"))):
+        paths = [path for path in sorted(glob.glob(os.path.join(event_path, "*")))
+                 if read_metadata(path)["format"] in ("JPEG", "MPO")]
+        if not paths:
+            continue
+        pil_ms, pil_bytes = measure(pil_path, paths, args.repeat)
+        header_ms, header_bytes = measure(header_path, paths, args.repeat)
+        print(f"{os.path.basename(event_path):<12}{len(paths):>8}{pil_ms:>10.3f}{header_ms:>11.3f}"
+              f"{pil_ms / header_ms:>8.1f}x{pil_bytes / 1024:>9.1f}{header_bytes / 1024:>11.1f}")
@@ -0,0 +1,56 @@
+"""
+Benchmark of the queries over the image database.
+
+Builds a random database, then measures the time to build the indexes and
+to answer a query with the indexes, compared with filtering the whole DataFrame.
+Run from the DigitalDarkroom folder:
+    python benchmark_query.py [--images N] [--repeat N]
+"""
+import time
+import argparse
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import config
+import query
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the queries over the image database")
+    parser.add_argument("--images", type = int, default = 100000)
+    parser.add_argument("--repeat", type = int, default = 20)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    days = generator.integers(0, 10 * 365, args.images)
+    db = pd.DataFrame({"Filename": [f"image_{number}.jpg" for number in range(args.images)],
+                       "Event": [f"Event_{number % 500}" for number in range(args.images)],
+                       "Format": generator.choice(["JPEG", "PNG", "TIFF"], args.images, p = [0.9, 0.05, 0.05]),
+                       "Mode": generator.choice(["RGB", "L", "RGBA"], args.images, p = [0.9, 0.05, 0.05]),
+                       "Megapixels": generator.uniform(2, 50, args.images),
+                       "Date": [np.array(np.datetime64("2015-01-01") + day) for day in days],
+                       "Latitude": generator.uniform(-60, 70, args.images),
+                       "Longitude": generator.uniform(-180, 180, args.images)},
+                      index = pd.Index(range(1, args.images + 1), name = "ID"))
+    text = "date:2019-01..2019-06 event:Event_42 mp>12"
+
+    with patch.object(config, "DB", db):
+        start = time.perf_counter()
+        query.get_index()
+        built = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            found = query.find_images(text)
+        indexed = (time.perf_counter() - start) / args.repeat
+
+        # The same query as a scan of the whole DataFrame
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            dates = pd.to_datetime(pd.Series([date[()] for date in db["Date"]]), errors = "coerce").to_numpy()
+            scanned = db[(db["Event"] == "Event_42") & (db["Megapixels"] > 12)
+                         & (dates >= np.datetime64("2019-01-01")) & (dates < np.datetime64("2019-07-01"))]
+        scan = (time.perf_counter() - start) / args.repeat
+
+    assert found == list(scanned.index)
+    print(f"{args.images} images: indexes built in {built:.2f} s, "
+          f"query in {indexed * 1000:.2f} ms with the indexes, {scan * 1000:.1f} ms with a scan ({len(found)} images)")
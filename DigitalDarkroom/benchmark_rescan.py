@@ -0,0 +1,49 @@
+"""
+Benchmark of the rescan of an unchanged library.
+
+Builds a temporary library of small JPEG files in event folders with a database
+that is up to date, then measures the rescan time (nothing to extract or write).
+Run from the DigitalDarkroom folder:
+    python benchmark_rescan.py [--images N] [--events N]
+"""
+import os
+import time
+import argparse
+import tempfile
+from unittest.mock import patch
+import pandas as pd
+from PIL import Image
+import config
+from storage import PickleStorage
+from rescan import (scan_library, rescan)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the rescan of an unchanged library")
+    parser.add_argument("--images", type = int, default = 100000)
+    parser.add_argument("--events", type = int, default = 100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        images_path = os.path.join(tmp_dir, "Images")
+        image_path = os.path.join(tmp_dir, "image.jpg")
+        Image.new("RGB", (16, 16)).save(image_path)
+        with open(image_path, "rb") as file:
+            data = file.read()
+        for event in range(args.events):
+            os.makedirs(os.path.join(images_path, f"Event_{event}"))
+        for number in range(args.images):
+            with open(os.path.join(images_path, f"Event_{number % args.events}", f"image_{number}.jpg"), "wb") as file:
+                file.write(data)
+
+        scanned = scan_library(images_path)
+        db = scanned.assign(Edited = False)
+        db.index = pd.Index(range(1, len(db) + 1), name = "ID")
+        with patch.object(config, "images_path", images_path), \
+             patch.object(config, "STORAGE", PickleStorage(os.path.join(tmp_dir, "image_DB.pkl"))), \
+             patch.object(config, "DB", db):
+            start = time.perf_counter()
+            result = rescan()
+            elapsed = time.perf_counter() - start
+
+    changes = sum(len(names) for names in result.values())
+    print(f"{args.images} images in {args.events} events rescanned in {elapsed:.2f} s ({changes} changes)")
@@ -0,0 +1,50 @@
+"""
+Benchmark of the spatial index of the image locations.
+
+Builds the index of random points (half of them around a few cities, as in a
+real library), then measures the bounding box and radius queries, compared with
+computing the distance of every point.
+Run from the DigitalDarkroom folder:
+    python benchmark_spatial.py [--points N] [--queries N] [--radius KM]
+"""
+import time
+import argparse
+import numpy as np
+from spatial import (SpatialIndex, haversine)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the spatial index of the image locations")
+    parser.add_argument("--points", type = int, default = 100000)
+    parser.add_argument("--queries", type = int, default = 1000)
+    parser.add_argument("--radius", type = float, default = 50)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    cities = generator.uniform((-60, -180), (70, 180), (20, 2))
+    clustered = cities[generator.integers(0, len(cities), args.points // 2)] + generator.normal(0, 0.2, (args.points // 2, 2))
+    spread = generator.uniform((-60, -180), (70, 180), (args.points - len(clustered), 2))
+    points = np.clip(np.concatenate([clustered, spread]), (-90, -180), (90, 180))
+    ids = np.arange(1, args.points + 1)
+
+    start = time.perf_counter()
+    index = SpatialIndex(ids, points[:, 0], points[:, 1])
+    built = time.perf_counter() - start
+
+    centres = points[generator.integers(0, args.points, args.queries)]
+    start = time.perf_counter()
+    found = sum(len(index.radius(latitude, longitude, args.radius)) for latitude, longitude in centres)
+    radius = (time.perf_counter() - start) / args.queries
+
+    start = time.perf_counter()
+    for latitude, longitude in centres:
+        index.bbox(latitude - 0.5, longitude - 0.5, latitude + 0.5, longitude + 0.5)
+    bbox = (time.perf_counter() - start) / args.queries
+
+    start = time.perf_counter()
+    for latitude, longitude in centres[:50]:
+        ids[haversine(latitude, longitude, points[:, 0], points[:, 1]) <= args.radius]
+    scan = (time.perf_counter() - start) / 50
+
+    print(f"{args.points} points: index built in {built * 1000:.0f} ms, radius query in {radius * 1000:.3f} ms "
+          f"({found / args.queries:.0f} points on average), bounding box query in {bbox * 1000:.3f} ms, "
+          f"scan of all the points in {scan * 1000:.2f} ms")
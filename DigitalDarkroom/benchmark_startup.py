@@ -0,0 +1,65 @@
+"""
+Benchmark of the start-up time of DigitalDarkroom (time to first prompt).
+
+Launches run_program.py with `python -X importtime`, measures the time until the
+main menu is printed, quits the program, and lists the slowest imports.
+Run from the DigitalDarkroom folder:
+    python benchmark_startup.py [--repeat N] [--top N]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+import config
+
+PROMPT = b"What do you want to do?"
+
+def time_to_first_prompt():
+    """ Runs the program once and returns the time to first prompt (s) and the importtime report.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-X", "importtime", "-u", "run_program.py"],
+                               cwd = config.program_path, stdin = subprocess.PIPE,
+                               stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+    output = b""
+    while PROMPT not in output:
+        data = process.stdout.read1(4096)
+        if not data:
+            raise RuntimeError("The program stopped before displaying the menu")
+        output += data
+    elapsed = time.perf_counter() - start
+    _, importtime = process.communicate(b"q\n")
+    return elapsed, importtime.decode()
+
+def slowest_imports(importtime, top):
+    """ Returns the top-level imports with the largest cumulative import time (us).
+    """
+    imports = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = len(name) - len(name.lstrip())
+        if depth <= 1:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse = True)[:top]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the start-up time of DigitalDarkroom")
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--top", type = int, default = 10)
+    args = parser.parse_args()
+
+    os.environ.setdefault("HOME", os.path.expanduser("~"))
+    times = []
+    for _ in range(args.repeat):
+        elapsed, importtime = time_to_first_prompt()
+        times.append(elapsed)
+
+    print(f"Time to first prompt: median {1000 * statistics.median(times):.0f} ms, "
+          f"min {1000 * min(times):.0f} ms over {args.repeat} runs\n")
+    print(f"{'Cumulative ms':>14}  Module")
+    for cumulative, name in slowest_imports(importtime, args.top):
+        print(f"{cumulative / 1000:>14.1f}  {name}")
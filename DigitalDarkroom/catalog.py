@@ -0,0 +1,183 @@
+"""
+Module to look up the images of the database by their event and file name.
+
+The image database is indexed by a stable integer ID. The file of an image is
+given by its Event and Filename columns and there is one image per event and
+file name, so images of different events can have the same file name and
+renaming an image or an event only changes columns, never the index.
+
+The IDs are found from the event and file name (or from the file name alone)
+with dictionaries built once from the database. The dictionaries are built
+again when config.DB is replaced or changes size; code that adds images or
+renames them in place (Event or Filename) calls refresh with their IDs.
+
+Classes
+-------
+ImageKeys
+    Dictionaries of the IDs of the images by event and file name.
+
+Functions
+---------
+get_keys
+    Function to get the dictionaries of the IDs of config.DB.
+
+refresh
+    Function to record new or renamed images in the dictionaries.
+
+find_image
+    Function to get the ID of the image of an event with a file name.
+
+find_by_name
+    Function to get the IDs of the images with a file name (in any event).
+
+image_path
+    Function to get the path to the file of an image.
+
+label
+    Function to get the event and file name of an image for messages.
+
+next_ids
+    Function to get the IDs of new images.
+"""
+import os
+import config
+
+class ImageKeys():
+    """ Dictionaries of the IDs of the images of a database.
+
+    Attributes
+    ----------
+    ids : dict
+        the ID of each (event, file name).
+    names : dict
+        the IDs of the images of each file name.
+    db : pandas.DataFrame
+        the database the dictionaries were built from.
+    length : int
+        the number of images of the database when they were last updated.
+    """
+
+    def __init__(self, db):
+        self.ids = {}
+        self.names = {}
+        for image_id, event, filename in zip(db.index, db["Event"], db["Filename"]):
+            self.add(image_id, event, filename)
+        self.db = db
+        self.length = len(db)
+
+    def add(self, image_id, event, filename):
+        """ Records the event and file name of an image.
+        """
+        self.ids[(event, filename)] = image_id
+        image_ids = self.names.setdefault(filename, [])
+        if image_id not in image_ids:
+            image_ids.append(image_id)
+
+# Dictionaries of config.DB, built at the first lookup
+default_keys = None
+
+def get_keys():
+    """ Returns the dictionaries of the IDs of config.DB (built again if config.DB changed).
+    """
+    global default_keys
+    if default_keys is None or default_keys.db is not config.DB or default_keys.length != len(config.DB):
+        default_keys = ImageKeys(config.DB)
+    return default_keys
+
+def refresh(image_ids, previous = None):
+    """ Records new or renamed images of config.DB in the dictionaries, so that
+    they are not built again.
+
+    Parameters
+    ----------
+    image_ids : list
+        the IDs of the images added or renamed in config.DB.
+    previous : pandas.DataFrame
+        the database replaced by config.DB when the images were added (optional,
+        the dictionaries are only kept if they were up to date with it).
+    """
+    keys = default_keys
+    if keys is None:
+        return
+    if previous is None:
+        if keys.db is not config.DB:
+            return
+    elif keys.db is not previous or keys.length != len(previous):
+        return
+    rows = config.DB.loc[list(image_ids), ["Event", "Filename"]]
+    for image_id, event, filename in zip(rows.index, rows["Event"], rows["Filename"]):
+        keys.add(image_id, event, filename)
+    keys.db = config.DB
+    keys.length = len(config.DB)
+
+def matches(image_id, event, filename):
+    """ Checks that an image of config.DB still has an event and a file name.
+    """
+    return (image_id in config.DB.index and config.DB.at[image_id, "Filename"] == filename
+            and (event is None or config.DB.at[image_id, "Event"] == event))
+
+def find_image(event, filename):
+    """ Returns the ID of the image of an event with a file name.
+
+    Parameters
+    ----------
+    event : str
+        the name of the event.
+    filename : str
+        the name of the image file.
+
+    Returns
+    -------
+    int
+        the ID of the image, or None if it is not in the database.
+    """
+    image_id = get_keys().ids.get((event, filename))
+    if image_id is None or matches(image_id, event, filename):
+        return image_id
+
+    # The image was renamed or removed since the dictionaries were built
+    global default_keys
+    default_keys = None
+    return get_keys().ids.get((event, filename))
+
+def find_by_name(filename):
+    """ Returns the IDs of the images with a file name, in any event.
+    """
+    image_ids = get_keys().names.get(filename, [])
+    found = [image_id for image_id in image_ids if matches(image_id, None, filename)]
+    if len(found) == len(image_ids):
+        return found
+    global default_keys
+    default_keys = None
+    return list(get_keys().names.get(filename, []))
+
+def image_path(image_id):
+    """ Returns the path to the file of an image of the database.
+    """
+    return os.path.join(config.images_path, config.DB.at[image_id, "Event"], config.DB.at[image_id, "Filename"])
+
+def label(image_id):
+    """ Returns the event and file name of an image (Event/Filename) to show to the user.
+    """
+    return os.path.join(config.DB.at[image_id, "Event"], config.DB.at[image_id, "Filename"])
+
+def next_ids(count, db = None):
+    """ Returns the IDs of new images (after the largest ID of the database, so the
+    ID of a removed image is only given again if it was the largest).
+
+    Parameters
+    ----------
+    count : int
+        the number of IDs.
+    db : pandas.DataFrame
+        the image database (default: config.DB).
+
+    Returns
+    -------
+    list
+        the new IDs.
+    """
+    if db is None:
+        db = config.DB
+    start = int(db.index.max()) + 1 if len(db.index) else 1
+    return list(range(start, start + count))
@@ -1,11 +1,121 @@
 """ This module contains the global variables of the program.
 """
 import os
-import pandas as pd
 
 # Define constant global variables for program paths
 program_path = os.path.dirname(os.path.realpath(__file__))
 images_path = os.path.join(program_path, "Images")
+db_path = os.path.join(program_path, "image_DB.pkl")
+sqlite_path = os.path.join(program_path, "image_DB.sqlite")
 
-# Get the image database from pickle file
-DB = pd.read_pickle(os.path.join(program_path, "image_DB.pkl"))
\ No newline at end of file
+# Pickle database: previous versions kept (image_DB.pkl.1, .2, ...) and number of
+# changes written to the journal (image_DB.pkl.journal) before the pickle file is rewritten
+db_snapshots = 3
+journal_checkpoint = 1000
+
+# Write the image database every N uploaded images or T seconds during an upload
+checkpoint_files = 200
+checkpoint_seconds = 30
+
+# Number of threads reading image metadata and copying files during an upload,
+# and maximum number of images in the upload pipeline at once
+ingest_workers = min(8, (os.cpu_count() or 1) * 2)
+copy_workers = 4
+ingest_queue_size = 64
+
+# Geocoder used for new locations: 'nominatim' (online), 'offline' (countries of the
+# world map only) or 'offline-first' (countries of the world map, then online)
+geocoder = "nominatim"
+
+# Geocoding cache: entries expire after 90 days, at most 10000 locations are kept
+geocode_cache_path = os.path.join(program_path, "geocode_cache.sqlite")
+geocode_cache_ttl = 90 * 24 * 3600
+geocode_cache_size = 10000
+
+# Requests per second sent to the geocoder for a batch of locations,
+# number of retries of a failed request and delay before the first retry (doubled each time)
+geocode_rate = 1.0
+geocode_retries = 3
+geocode_backoff = 1.0
+
+# Thumbnail cache: display scales (1/20 for the panorama, 1/4 for the diaporama),
+# maximum disk size in bytes and creation during uploads (otherwise at first display)
+thumbnails_path = os.path.join(program_path, "Thumbnails")
+thumbnail_scales = (20, 4)
+thumbnail_budget = 500 * 1024 ** 2
+thumbnails_at_upload = False
+
+# Threads decoding the images of the next and previous display pages,
+# and maximum number of decoded images kept in memory (8 panorama pages)
+prefetch_workers = 4
+prefetch_tiles = 120
+
+# Contact sheets of events: columns and rows of images per sheet (a sheet is
+# written when full, so a whole event is never held in memory) and cell size in pixels
+contact_sheets_path = os.path.join(program_path, "Contact_sheets")
+contact_sheet_columns = 10
+contact_sheet_rows = 12
+contact_sheet_cell = (240, 200)
+
+# Non-destructive edits: downscaling factor of the previews of an edit recipe and
+# number of intermediate results (recipe prefixes) kept in memory while editing
+recipe_preview_scale = 4
+recipe_cache_size = 16
+
+# Batch edits: processes rendering the edited images and number of chunks
+# per process (the images are spread over the chunks by file size)
+batch_workers = os.cpu_count() or 1
+batch_chunks_per_worker = 4
+
+# Edits of large images: images above tile_threshold pixels are filtered and enhanced
+# in tiles of tile_size x tile_size pixels, processed by tile_workers threads
+tile_threshold = 24 * 10 ** 6
+tile_size = 1024
+tile_workers = os.cpu_count() or 1
+
+# Near-duplicate images: maximum number of different bits (out of 64) of their difference hashes
+duplicate_distance = 6
+
+# Watch mode: folders whose new images are uploaded automatically (path of the folder ->
+# name of the event), seconds between two polls of the folders and of the Images tree,
+# and seconds a file or event folder must stay unchanged before it is processed
+watch_folders = {}
+watch_interval = 2.0
+watch_settle = 5.0
+
+# Watch mode: seconds between two listings of the files of every event folder, to find
+# the images rewritten in place (None: not checked, each listing reads the size and
+# modification time of every file of the library)
+watch_check_interval = None
+
+# Spatial index of the image locations: size of the grid cells in degrees (about 28 km)
+spatial_cell = 0.25
+
+# World map: the nearby images are drawn as one marker, about N markers across the view at any zoom
+map_cluster_cells = 32
+
+# Queries: distance in km of a near: term without a distance (near:"Kyoto" => near:"Kyoto" 10km)
+query_radius = 10
+
+def __getattr__(name):
+    """ Opens the storage and loads the image database on first access of
+    config.STORAGE or config.DB, so that importing config is instant.
+    The SQLite catalogue is used if migrated, otherwise the pickle file.
+    """
+    global STORAGE, DB
+    if name == "STORAGE":
+        import storage
+        STORAGE = storage.open_storage(db_path, sqlite_path)
+        return STORAGE
+    if name == "DB":
+
+        # Use the storage already opened (or replaced) if there is one
+        storage = globals()["STORAGE"] if "STORAGE" in globals() else __getattr__("STORAGE")
+        DB = storage.load()
+        return DB
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
+
+def is_loaded():
+    """ Returns True if the image database has been loaded during this session.
+    """
+    return "DB" in globals()
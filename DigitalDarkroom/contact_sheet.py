@@ -0,0 +1,176 @@
+"""
+Module to export contact sheets (mosaics of captioned thumbnails) of whole events.
+
+The images are drawn strip by strip: only the thumbnails of one row are decoded
+at a time and a sheet is written to disk as soon as it is full, so the memory used
+does not depend on the number of images of the event.
+
+Functions
+---------
+load_cell
+    Function to get the downscaled image (with its edits) fitting in a cell of a contact sheet.
+
+write_contact_sheets
+    Function to tile a list of images into one or more contact sheet files.
+
+export_event
+    Function to export the contact sheets of an event of the database.
+
+export_contact_sheets
+    Function to export the contact sheets of an event chosen by the user.
+"""
+import os
+import config
+import recipes
+import thumbnails
+from PIL import Image, ImageDraw, ImageFont
+from metadata_reader import (ORIENTATION, orient)
+
+# Height in pixels of the caption band under each image
+CAPTION_HEIGHT = 16
+
+def load_cell(image_path, cell_size, use_cache = True, operations = None):
+    """ Returns an image downscaled to fit in a cell of a contact sheet, with its edits.
+
+    Parameters
+    ----------
+    image_path : str
+        the path to the image.
+    cell_size : tuple
+        the maximum width and height of the image.
+    use_cache : bool
+        take the panorama thumbnail from the thumbnail cache (created if needed)
+        or decode the original image without storing a thumbnail.
+    operations : list
+        the edit recipe of the image (applied to the downscaled image, as in the display).
+
+    Returns
+    -------
+    PIL.Image
+        the downscaled image.
+    """
+    if use_cache:
+        tile = thumbnails.get_thumbnail(image_path, config.thumbnail_scales[0])
+    else:
+        # Image.thumbnail decodes JPEG images directly at reduced size (draft mode)
+        with Image.open(image_path) as image:
+            orientation = image.getexif().get(ORIENTATION, 1)
+            image.thumbnail(cell_size)
+            tile = orient(image, orientation)
+    if operations:
+        tile = recipes.apply_recipe(tile, operations)
+    if tile.size[0] > cell_size[0] or tile.size[1] > cell_size[1]:
+        tile = tile.copy()
+        tile.thumbnail(cell_size)
+    return tile.convert("RGB")
+
+def write_contact_sheets(image_paths, output_prefix, captions = None, edits = None,
+                         columns = config.contact_sheet_columns, rows = config.contact_sheet_rows,
+                         cell_size = config.contact_sheet_cell, use_cache = True):
+    """ Tiles images into contact sheets of columns x rows images with captions.
+
+    Parameters
+    ----------
+    image_paths : list
+        the paths to the images, in the order of the sheets.
+    output_prefix : str
+        the path of the sheets without extension. Sheets are numbered: prefix_001.jpg, ...
+    captions : list
+        the caption of each image (default: the file names).
+    edits : list
+        the edit recipe of each image (default: no edits).
+    columns, rows : int
+        the number of images per row and the number of rows of a sheet.
+    cell_size : tuple
+        the width and height in pixels of the image area of a cell.
+    use_cache : bool
+        use the thumbnail cache to get the downscaled images.
+
+    Returns
+    -------
+    list
+        the paths to the written sheets.
+    """
+    if captions is None:
+        captions = [os.path.basename(path) for path in image_paths]
+    font = ImageFont.load_default()
+    cell_width, cell_height = cell_size[0], cell_size[1] + CAPTION_HEIGHT
+    per_sheet = columns * rows
+    sheet_paths = []
+
+    for first in range(0, len(image_paths), per_sheet):
+
+        # The last sheet only has the rows it needs
+        number_rows = -(-min(per_sheet, len(image_paths) - first) // columns)
+        sheet = Image.new("RGB", (columns * cell_width, number_rows * cell_height), "white")
+        draw = ImageDraw.Draw(sheet)
+
+        # Decode and paste one strip (row) of images at a time
+        for row in range(number_rows):
+            start = first + row * columns
+            for column, index in enumerate(range(start, min(start + columns, len(image_paths)))):
+                left, top = column * cell_width, row * cell_height
+                try:
+                    tile = load_cell(image_paths[index], cell_size, use_cache,
+                                     edits[index] if edits is not None else None)
+                    sheet.paste(tile, (left + (cell_size[0] - tile.size[0]) // 2,
+                                       top + (cell_size[1] - tile.size[1]) // 2))
+                except OSError:
+
+                    # Keep the caption of files that are missing or not images
+                    draw.rectangle((left + 2, top + 2, left + cell_size[0] - 3, top + cell_size[1] - 3),
+                                   outline = "grey")
+                draw.text((left + cell_width // 2, top + cell_size[1] + CAPTION_HEIGHT // 2),
+                          str(captions[index]), fill = "black", font = font, anchor = "mm")
+
+        sheet_path = f"{output_prefix}_{len(sheet_paths) + 1:03d}.jpg"
+        sheet.save(sheet_path, "JPEG", quality = 90)
+        sheet_paths.append(sheet_path)
+    return sheet_paths
+
+def export_event(event, output_path = config.contact_sheets_path, use_cache = True):
+    """ Exports the contact sheets of all the images of an event, ordered by date,
+    with the edits stored as recipes.
+
+    Parameters
+    ----------
+    event : str
+        the name of the event.
+    output_path : str
+        the folder where the sheets are written (as <event>_001.jpg, ...).
+    use_cache : bool
+        use the thumbnail cache to get the downscaled images.
+
+    Returns
+    -------
+    list
+        the paths to the written sheets.
+    """
+    images = config.DB[config.DB["Event"] == event]
+    if "Date" in images.columns:
+        images = images.sort_values("Date", na_position = "last", kind = "stable")
+    image_paths = [os.path.join(config.images_path, event, filename) for filename in images["Filename"]]
+    os.makedirs(output_path, exist_ok = True)
+    return write_contact_sheets(image_paths, os.path.join(output_path, event),
+                                captions = list(images["Filename"]),
+                                edits = [recipes.get_recipe(image_id) for image_id in images.index],
+                                use_cache = use_cache)
+
+def export_contact_sheets():
+    """ Asks the user for an event and exports its contact sheets.
+    """
+    from display_images import get_event
+
+    event = ""
+    while event == "":
+        event = os.path.basename(get_event())
+        if event == "":
+            print("Please enter the name of an event...\n")
+    sheet_paths = export_event(event)
+    if sheet_paths:
+        print(f"{len(sheet_paths)} contact sheet(s) saved in {config.contact_sheets_path}:")
+        for sheet_path in sheet_paths:
+            print(os.path.basename(sheet_path))
+        print()
+    else:
+        print("There are no images in this event...\n")
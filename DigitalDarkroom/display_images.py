@@ -6,8 +6,26 @@ Functions
 get_event
     Function to get the path of a specific event chosen by the user.
 
+get_image_path
+    Function to get the path to an image of the database.
+
+image_title
+    Function to get the title of an image in the display.
+
+tune_enhancement
+    Function to choose the factor of an enhancement with a slider.
+
+invalidate_tiles
+    Function to forget the decoded display images of changed image files.
+
+load_tile
+    Function to get the downscaled image to display, prefetched if possible.
+
+prefetch_neighbours
+    Function to decode the images of the next and previous pages in the background.
+
 save_image
-    Function to save an edited image.
+    Function to save the edits of an image (as a recipe or as a new image).
 
 preview
     Function to preview an edited image before saving the changes.
@@ -40,17 +58,32 @@ display_panorama
 select_image
     Function to select an image for editing. Called by a pick event on the figure.
 
+select_grid_image
+    Function to select an image for editing by clicking on the panorama.
+
 """
 import os
 import config
+import catalog
+import query
 import numpy as np
 import pandas as pd
 import edit_images as imedit
+import recipes
+import rotation
+import rescan
+from prefetch import Prefetcher
+from panorama_grid import GridRenderer
+from enhance import FastEnhancer
 import matplotlib.pyplot as plt
 import matplotlib.cbook as cbk
 from matplotlib.text import Text
+from matplotlib.widgets import Slider
 from matplotlib.backend_bases import NavigationToolbar2
-from PIL import Image, UnidentifiedImageError
+from PIL import UnidentifiedImageError
+
+# Background decoder of the images of the neighbouring pages, created at the first display
+prefetcher = None
 
 def get_event():
     """ Prompts the user to enter the event from which images will be displayed.
@@ -84,55 +117,81 @@ def get_event():
             
     return event
 
-def save_image(edited_image, image_name):
-    """ Allows to save an edited image in DigitalDarkroom.
+def get_image_path(image_id):
+    """ Returns the path to an image of the database.
     
     Parameters
     ----------
-    edited_image : PIL.Image
-        the edited image to save
-    image_name : str
-        the name of the original image
+    image_id : int
+        the ID of the image.
+    
+    Returns
+    -------
+    str
+        the absolute path to the image file in its event folder.
+    """
+    return catalog.image_path(image_id)
+
+def save_image(image_id, operations):
+    """ Allows to save the edits of an image in DigitalDarkroom.
+    
+    Parameters
+    ----------
+    image_id : int
+        the ID of the original image
+    operations : list
+        the edit recipe of the image
     """
     
     # Ask user for confirmation
     answer = False
     while not answer:
-        answer = input("Would you like to replace the original or"
+        answer = input("Would you like to keep editing, replace the original or"
                         " save the edited image as a new image?"
-                        " (R/Replace or S/Save or Q/Quit)\n").lower()
+                        " (K/Keep editing or R/Replace or S/Save or Q/Quit)\n").lower()
         print()
 
-        if answer in ["s", "save"]:
+        if answer in ["k", "keep", "keep editing"]:
+            return
+
+        elif answer in ["s", "save"]:
             
             # Create new name for the edited image
-            name_components = image_name.split(".")
-            edited_image_name = name_components[0] + "_2." + name_components[1]
-            duplicate = 3
-            while edited_image_name in config.DB.index:
-                edited_image_name = name_components[0] + f"_{duplicate}." + name_components[1]
-                duplicate += 1
+            edited_image_name = recipes.copy_name(image_id)
             
-            # Save image file in Images
-            event = config.DB.loc[image_name, "Event"]
-            edited_image.save(os.path.join(config.images_path, event, edited_image_name))
+            # Render the edits at full resolution in a new image file in Images
+            event = config.DB.loc[image_id, "Event"]
+            edited_image = recipes.export(image_id, operations,
+                                          os.path.join(config.images_path, event, edited_image_name))
                 
-            # Update DB
-            new_row = config.DB.loc[image_name].copy()
+            # Update DB (the edits are part of the new file, which gets a new ID)
+            edited_image_id = catalog.next_ids(1)[0]
+            new_row = config.DB.loc[image_id].copy()
+            new_row["Filename"] = edited_image_name
             new_row["Edited"] = True
-            config.DB.loc[edited_image_name] = new_row
-            config.DB.to_pickle(os.path.join(config.program_path, "image_DB.pkl"))
+            if "Recipe" in new_row.index:
+                new_row["Recipe"] = None
+            if "Width" in new_row.index:
+                new_row["Width"], new_row["Height"] = edited_image.size
+            config.DB.loc[edited_image_id] = new_row
+            catalog.refresh([edited_image_id])
+            rescan.update_signatures([edited_image_id])
+            config.STORAGE.save_rows(config.DB, [edited_image_id])
             answer = True
 
         elif answer in ["r", "replace"]:
             
-            # Replace image file in Images
-            event = config.DB.loc[image_name, "Event"]
-            edited_image.save(os.path.join(config.images_path, event, image_name))
-                
-            # Update DB
-            config.DB.loc[image_name, "Edited"] = True
-            config.DB.to_pickle(os.path.join(config.program_path, "image_DB.pkl"))
+            # A rotation alone is applied to the file (losslessly for JPEG images)
+            operations = recipes.fuse(operations)
+            if len(operations) == 1 and operations[0][0] == "rotate":
+                if "Recipe" in config.DB.columns:
+                    config.DB.loc[image_id, "Recipe"] = None
+                rotation.rotate_images([image_id], operations[0][1])
+                invalidate_tiles([image_id])
+            
+            # Otherwise store the edits in DB, the original file is kept unchanged
+            else:
+                recipes.set_recipe(image_id, operations)
             
         elif answer in ["q", "quit"]:
             raise SystemExit
@@ -141,15 +200,17 @@ def save_image(edited_image, image_name):
             answer = False
     raise SystemExit
     
-def preview(edited_image, image_name):
+def preview(edited_image, image_id, operations):
     """ Preview edited changes of an image.
     
     Parameters
     ----------
     edited_image : PIL.Image 
-        the edited image to preview
-    image_name : str
-        the name of the original image
+        the edited image to preview (rendered on a downscaled copy)
+    image_id : int
+        the ID of the original image
+    operations : list
+        the edit recipe of the image
     """ 
     
     # Initialise a new figure of fixed size
@@ -166,7 +227,118 @@ def preview(edited_image, image_name):
     
     # Save the edited image
     plt.rcParams['toolbar'] = toolbar
-    save_image(edited_image, image_name)
+    save_image(image_id, operations)
+
+def tune_enhancement(image, enhancer, name):
+    """ Displays an image with a slider to choose the factor of an enhancement.
+    The enhancement is precomputed once, so moving the slider only blends arrays.
+    
+    Parameters
+    ----------
+    image : PIL.Image
+        the image to preview (downscaled copy).
+    enhancer : class
+        the enhancement of PIL.ImageEnhance.
+    name : str
+        the name of the enhancement shown next to the slider.
+    
+    Returns
+    -------
+    float
+        the factor chosen when the figure is closed.
+    """
+    engine = FastEnhancer(image, enhancer)
+    
+    # Initialise a new figure of fixed size
+    toolbar = plt.rcParams['toolbar']
+    plt.rcParams['toolbar'] = 'None'
+    figure = plt.figure()
+    fig_manager = plt.get_current_fig_manager()
+    fig_manager.resize(2500, 1500)
+    
+    # Preview the enhanced image and update it when the slider moves
+    axis = figure.add_axes([0, 0.1, 1, 0.9])
+    artist = axis.imshow(engine.enhance_array(1.0), cmap = "gray" if image.mode == "L" else None)
+    axis.axis('off')
+    slider = Slider(figure.add_axes([0.2, 0.03, 0.6, 0.03]), name.capitalize(), 0.0, 3.0, valinit = 1.0)
+    
+    def update(factor):
+        """ Shows the image enhanced with the factor of the slider.
+        """
+        artist.set_data(engine.enhance_array(factor))
+        figure.canvas.draw_idle()
+    
+    slider.on_changed(update)
+    plt.show()
+    plt.rcParams['toolbar'] = toolbar
+    return round(slider.val, 2)
+
+def image_title(image_id):
+    """ Returns the title of an image in the display (its file name).
+    """
+    return f"{config.DB.at[image_id, 'Filename']}"
+
+def invalidate_tiles(image_ids):
+    """ Forgets the decoded display images of images whose file has changed.
+    
+    Parameters
+    ----------
+    image_ids : list
+        the IDs of the images.
+    """
+    if prefetcher is not None:
+        for image_id in image_ids:
+            prefetcher.invalidate(get_image_path(image_id))
+
+def load_tile(image_id, scale):
+    """ Returns the downscaled image to display with its edits, decoded in advance
+    if it was prefetched.
+    
+    Parameters
+    ----------
+    image_id : int
+        the ID of the image.
+    scale : int
+        the downscaling factor (20 for the panorama, 4 for the diaporama).
+    
+    Returns
+    -------
+    PIL.Image
+        the downscaled image.
+    """
+    global prefetcher
+    if prefetcher is None:
+        prefetcher = Prefetcher()
+    tile = prefetcher.get(get_image_path(image_id), scale)
+    
+    # Show the image with its edits (the original file is never changed)
+    operations = recipes.get_recipe(image_id)
+    if operations:
+        tile = recipes.apply_recipe(tile, operations)
+    return tile
+
+def prefetch_neighbours(image_stack, scale):
+    """ Starts decoding the images of the previous and next positions of the image stack
+    in the background, while the current one is displayed.
+    
+    Parameters
+    ----------
+    image_stack : matplotlib.cbook.Stack
+        the stack of images (diaporama) or of groups of images (panorama).
+    scale : int
+        the downscaling factor of the display.
+    """
+    global prefetcher
+    if prefetcher is None:
+        prefetcher = Prefetcher()
+    image_ids = []
+    for position in (image_stack._pos + 1, image_stack._pos - 1):
+        if 0 <= position < len(image_stack._elements):
+            element = image_stack._elements[position]
+            image_ids.extend([element] if np.ndim(element) == 0 else element)
+    image_paths = [get_image_path(image_id) for image_id in image_ids
+                   if image_id is not None and image_id in config.DB.index]
+    prefetcher.prefetch(image_paths, scale)
 
 def update_view(self):
     """ Updates image display from the current position in the image stack. 
@@ -181,42 +353,10 @@ def update_view(self):
         return
     else:
         
-        # Update the panorama display
+        # Update the panorama display in place (same figure, one image artist)
         if NavigationToolbar2.view == "panorama":
-            plt.close('all')
-            figure, axes = plt.subplots(3, 5)
-            fig_manager = plt.get_current_fig_manager()
-            fig_manager.resize(2500, 1500)
-            
-            # Create an empty image to fill the gaps of the panorama
-            empty_image = Image.new("1", (600, 480), 1)
-            for index, image_name in enumerate(current):
-                i = int(index / 5)
-                j = int(index % 5)
-                if image_name is None:
-                    axes[i, j].imshow(empty_image)
-                else:
-                    
-                    # Handle the case where the filepath is not an image 
-                    try:
-                        image = Image.open(os.path.join(config.images_path, config.DB.loc[image_name, "Event"], image_name))
-                        height = int(image.size[0] / 20)
-                        width = int(image.size[1] / 20)
-                        axes[i, j].imshow(image.resize((height, width)))
-                        
-                        # Activate selecting the image by picking the title or not
-                        if NavigationToolbar2.picker:
-                            axes[i, j].set_title(f"{image_name}", fontsize=7).set_picker(True)
-                        else:
-                            axes[i, j].set_title(f"{image_name}", fontsize=7)
-                            
-                    except UnidentifiedImageError:
-                        axes[i, j].imshow(empty_image)
-                axes[i, j].set_axis_off()
-                
-            if NavigationToolbar2.picker:
-                plt.connect(s = "pick_event", func = select_image)
-            plt.show()
+            NavigationToolbar2.grid.render(current, lambda image_id: load_tile(image_id, 20), caption = image_title)
+            prefetch_neighbours(self.image_stack, 20)
         
         # Update the diaporama display
         else:
@@ -226,18 +366,16 @@ def update_view(self):
             fig_manager.resize(2500, 1500)
             
             try:
-                image = Image.open(os.path.join(config.images_path, config.DB.loc[current, "Event"], current))
-                height = int(image.size[0] / 4)
-                width = int(image.size[1] / 4)
-                plt.imshow(image.resize((height, width)))
+                plt.imshow(load_tile(current, 4))
                 
                 # Activate selecting the image by picking the title or not
                 if NavigationToolbar2.picker:
                     plt.connect(s = "pick_event", func = select_image)
-                    plt.title(f"{current}", fontsize=7, picker = True)
+                    plt.title(image_title(current), fontsize=7, picker = True)
                 else:
-                    plt.title(f"{current}", fontsize=7)
+                    plt.title(image_title(current), fontsize=7)
                 plt.axis('off')
+                prefetch_neighbours(self.image_stack, 4)
                 plt.show()
             except UnidentifiedImageError:
                 pass
@@ -291,7 +429,7 @@ def display_diaporama(images, picker):
     Parameters
     ----------
     images : list
-        the list of images to display in diaporama
+        the list of the IDs of the images to display in diaporama
         
     picker : bool
         specify if the images can be picked or not on the display.
@@ -306,12 +444,10 @@ def display_diaporama(images, picker):
     NavigationToolbar2.image_stack = image_stack
 
     # Start the image display
-    image = Image.open(os.path.join(config.images_path, config.DB.loc[images[0], "Event"], images[0])) 
-    height = int(image.size[0] / 4)
-    width = int(image.size[1] / 4)
-    plt.imshow(image.resize((height, width)))
-    plt.title(f"{images[0]}", fontsize=7, picker = True)
+    plt.imshow(load_tile(images[0], 4))
+    plt.title(image_title(images[0]), fontsize=7, picker = True)
     plt.axis("off")
+    prefetch_neighbours(image_stack, 4)
     plt.show()
     
 def display_panorama(images, picker):
@@ -320,7 +456,7 @@ def display_panorama(images, picker):
     Parameters
     ----------
     images : list
-        the nested list with groups of images to display in panorama
+        the list of the IDs of the images to display in panorama
 
     picker : bool
         specify if the images can be picked or not on the display.
@@ -331,9 +467,6 @@ def display_panorama(images, picker):
     # Fill the gaps such that the image list is a multiple of 15
     number_gaps = 15 - (len(images) % 15)
     
-    # Create an empty image to fill the gaps of the panorama
-    empty_image = Image.new("1", (600, 480), 1)
-    
     # Create a nested list with elements of 15 images  
     group_images = list(np.concatenate((
         np.array(images), np.repeat((None), number_gaps))).reshape(int(len(images) / 15) + 1, 15))
@@ -344,32 +477,27 @@ def display_panorama(images, picker):
     image_stack._pos = 0
     NavigationToolbar2.image_stack = image_stack
     
-    # Start the panorama display (15 images in 3 rows and 5 columns)
-    axes = figure.subplots(3, 5)
-    for index, image_name in enumerate(group_images[0]):
-        i = int(index / 5)
-        j = int(index % 5)
-        if image_name is None:
-            axes[i, j].imshow(empty_image)
-        else:
-            try:
-                image = Image.open(os.path.join(config.images_path, config.DB.loc[image_name, "Event"], image_name))
-                height = int(image.size[0] / 20)
-                width = int(image.size[1] / 20)
-                axes[i, j].imshow(image.resize((height, width)))
-                axes[i, j].set_title(f"{image_name}", fontsize=7).set_picker(True)
-            except UnidentifiedImageError:
-                axes[i, j].imshow(empty_image)
-        axes[i, j].set_axis_off()
+    # Start the panorama display (15 images in 3 rows and 5 columns) in a single image
+    axis = figure.add_axes([0, 0, 1, 1])
+    NavigationToolbar2.grid = GridRenderer(axis, rows = 3, columns = 5)
+    NavigationToolbar2.grid.render(group_images[0], lambda image_id: load_tile(image_id, 20), caption = image_title)
+    
+    # If picking mode, allow selecting the image by clicking on it
+    if picker:
+        plt.connect(s = "button_press_event", func = select_grid_image)
+    prefetch_neighbours(image_stack, 20)
     plt.show()
     
-def display(picker = False):
+def display(picker = False, images = None):
     """ Asks the user if the display must be a diaporama or panorama and launches the display.
     
     Parameters
     ----------
     picker : bool
         specify if the images can be picked or not on the display.
+    images : list
+        the IDs of the images to display, e.g. found by query.find_images
+        (default: the images of an event chosen by the user).
     """
     
     # Launch either diaporama or panorama display
@@ -383,10 +511,13 @@ def display(picker = False):
             raise SystemExit
         elif answer in ["d", "diaporama", "p", "panorama"]:
 
-            # Load images to display
-            event_path = get_event()
-            event = os.path.basename(event_path)
-            images = list(config.DB[config.DB["Event"] == event].index)
+            # Load the images of an event (all the images if no event is chosen)
+            if images is None:
+                event_path = get_event()
+                if os.path.normpath(event_path) == os.path.normpath(config.images_path):
+                    images = query.get_index().ids.tolist()
+                else:
+                    images = query.find_images([("equal", "Event", os.path.basename(event_path))])
             
             # Save toolbar default navigation functions 
             back = NavigationToolbar2.back
@@ -408,7 +539,7 @@ def display(picker = False):
             answer = False
 
 def select_image(pick_event):
-    """ Returns the image name that has been picked by user.
+    """ Edits the image whose title has been picked by user.
     
     Parameters
     ----------
@@ -417,11 +548,33 @@ def select_image(pick_event):
     """
     if isinstance(pick_event.artist, Text):
         plt.close('all')
-        title = pick_event.artist
-        image = title.get_text()
+
+        # The title shows the file name, the image is the current one of the stack
+        image = NavigationToolbar2.image_stack()
         try:
             imedit.edit(image)
         except SystemExit:
             pass
     else:
-        raise SystemExit
\ No newline at end of file
+        raise SystemExit
+
+def select_grid_image(mouse_event):
+    """ Edits the image that has been clicked by the user in the panorama.
+    
+    Parameters
+    ----------
+    mouse_event : matplotlib.backend_bases.MouseEvent
+        the click on the figure.
+    """
+    # Ignore the clicks of the zoom and pan tools
+    toolbar = mouse_event.canvas.toolbar
+    if toolbar is not None and toolbar.mode:
+        return
+    image = NavigationToolbar2.grid.name_at(mouse_event.xdata, mouse_event.ydata)
+    if image is None or mouse_event.inaxes is not NavigationToolbar2.grid.axis:
+        return
+    plt.close('all')
+    try:
+        imedit.edit(image)
+    except SystemExit:
+        pass
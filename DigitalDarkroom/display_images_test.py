@@ -9,7 +9,7 @@ class TestGettingEvent(unittest.TestCase):
     @patch("display_images.input")
     def test_get_event(self, mocked_input):
         # Test cases where input is an event (wrong event name and correct event name)
-        event = config.DB["Event"][0]
+        event = config.DB["Event"].iloc[0]
         mocked_input.side_effect = ["not_event", event]
         self.assertEqual(get_event(), os.path.join(config.images_path, event))
         
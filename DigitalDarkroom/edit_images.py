@@ -4,7 +4,7 @@ Module to edit images and apply different enhancing filters.
 Functions
 ---------
 select_image
-    Function to select which image to edit.
+    Function to select which image (or event) to edit.
     
 filter_image
     Function to apply filters for contour, edge enhancement, blurring and detail enhancement.
@@ -16,14 +16,19 @@ rotate_image
     Function to rotate an image by 90, 180 or 270 degrees.
 
 edit
-    Function to select the editing option.
+    Function to select the editing option and build the edit recipe of the image.
+
+edit_event
+    Function to apply the same edits to all the images of an event.
 """
 
 # Import the required libraries
 import os
 import sys
 import config
-from PIL import (Image, ImageEnhance, ImageFilter)
+import catalog
+import recipes
+import batch_edit
 import display_images as implay
 
 def select_image():
@@ -31,15 +36,16 @@ def select_image():
     
     Returns
     -------
-    image : str
-        the image name to edit.
+    image : int
+        the ID of the image to edit.
     """
     # Ask user how to select the image to edit
     answer = False
     while not answer:
         answer = input("Would you like to pick a specific image in the display"
-                        " or enter the name of a particular image?"
-                       " (P/Pick or N/Name or Q/Quit)\n").lower().strip()
+                        " or enter the name of a particular image"
+                       " or edit all the images of an event?"
+                       " (P/Pick or N/Name or A/All or Q/Quit)\n").lower().strip()
         print()
  
         if answer in ["p", "pick"]:
@@ -49,11 +55,27 @@ def select_image():
             image = input("Enter the name of the image: (Q/Quit)\n")
                 
             # Check that image exists in program database
-            if image not in config.DB.index:
+            image_ids = catalog.find_by_name(image)
+            if not image_ids:
                 print("The image could not be found...\n")
                 answer = False
+            elif len(image_ids) == 1:
+                edit(image_ids[0])
+
+            # The same file name in several events
             else:
-                edit(image)
+                events = {config.DB.at[image_id, "Event"]: image_id for image_id in image_ids}
+                print("The image is in the events:", ", ".join(sorted(events)))
+                event = input("Enter the name of the event:\n").strip()
+                print()
+                if event not in events:
+                    print("The image could not be found...\n")
+                    answer = False
+                else:
+                    edit(events[event])
+
+        elif answer in ["a", "all"]:
+            edit_event()
         
         elif answer in ["q", "quit"]:
             raise SystemExit      
@@ -62,16 +84,13 @@ def select_image():
             answer = False
             
 
-def filter_image(img, image_name):
+def filter_image():
     """ Let the user select a filter from different options to apply to the image
     
-    Parameters
-    ----------
-    img : PIL.Image
-        the image to apply filter on.
-    
-    image_name : str
-        the name of the original image
+    Returns
+    -------
+    tuple
+        the filter operation to add to the edit recipe (None if not found).
     """
     func_input = input("What type of image filtering would you like to do?\n"
                        "- Changing the contour => type 'c'\n"
@@ -81,39 +100,39 @@ def filter_image(img, image_name):
                        "- Quit the program => type 'Q' or 'quit'\n").lower().strip()
     
     # Define dictionary with the functions the user can use
-    func_map = {'c':ImageFilter.CONTOUR,
-                'e':ImageFilter.EDGE_ENHANCE,
-                'b':ImageFilter.BLUR,
-                'd':ImageFilter.DETAIL}
+    func_map = {'c':"contour",
+                'e':"edge",
+                'b':"blur",
+                'd':"detail"}
     
     if func_input.strip() == 'quit' or func_input.strip() == 'q':
         print('goodbye!')
         sys.exit()
 
     if func_input.strip() in func_map.keys():
-        func = func_map[func_input]
-        im2 = img.filter(func)
-        implay.preview(im2, image_name) 
+        return ("filter", func_map[func_input.strip()])
     
     else:
         print("Sorry, the option could not be found!")
 
 
-def enhance_image(img, image_name):
+def enhance_image(preview = None):
     """ Function to let the user apply different image enhancement options
     
     Parameters
     ----------
-    img : PIL.Image
-        the image to apply filter on.
+    preview : PIL.Image
+        the current preview of the image, to tune the effect with a slider (optional).
     
-    image_name : str
-        the name of the original image.
+    Returns
+    -------
+    tuple
+        the enhancement operation to add to the edit recipe.
     """
-    func_map = {'s':ImageEnhance.Sharpness,
-                'b':ImageEnhance.Brightness,
-                'col':ImageEnhance.Color,
-                'con':ImageEnhance.Contrast}
+    func_map = {'s':"sharpness",
+                'b':"brightness",
+                'col':"color",
+                'con':"contrast"}
     
     func_input = input("What type of image enhancement would you like to adjust?\n"
                        "Sharpening => type 's'\n"
@@ -131,31 +150,30 @@ def enhance_image(img, image_name):
                    "- smaller than 1 for a reducing effect\n"
                    "- larger than 1 to increase the effect\n"
                    "- or 1 for the original\n"
-                   "- or press 'q' or write 'quit' to exit\n")
+                   + ("- or 't' to tune the effect with a slider\n" if preview is not None else "")
+                   + "- or press 'q' or write 'quit' to exit\n")
     
     if func_input.strip() in ["q", "quit"] or effect.strip() in ["q", "quit"]:
         print('goodbye!')
         sys.exit()
     
-    curr_sharp = func_map[func_input](img)
-    img_sharped = curr_sharp.enhance(float(effect))
-    implay.preview(img_sharped, image_name)
+    name = func_map[func_input.strip()]
+    if preview is not None and effect.strip().lower() in ["t", "tune"]:
+        return ("enhance", name, implay.tune_enhancement(preview, recipes.ENHANCERS[name], name))
+    return ("enhance", name, float(effect))
 
-def rotate_image(img, image_name):
+def rotate_image():
     """ Function to let the user rotate an image.
     
-    Parameters
-    ----------
-    img : PIL.Image
-        the image to rotate.
-    
-    image_name : str
-        the name of the original image.
+    Returns
+    -------
+    tuple
+        the rotation operation to add to the edit recipe.
     """
 
-    func_map = {'90':Image.ROTATE_90,
-                '180':Image.ROTATE_180,
-                '270':Image.ROTATE_270}
+    func_map = {'90':90,
+                '180':180,
+                '270':270}
     
     func_input = input("How many degrees would you like to rotate the image?\n"
                        "Type 90, 180 or 270\n")
@@ -166,20 +184,20 @@ def rotate_image(img, image_name):
             print('goodbye!')
             sys.exit()
 
-    img_transposed = img.transpose(func_map[func_input])
-    implay.preview(img_transposed, image_name)    
+    return ("rotate", func_map[func_input.strip()])
 
-def edit(image_name):
+def edit(image_id):
     """ Function to handle user input for image editing.
+    The edits are added to the edit recipe of the image and previewed on a
+    downscaled copy, the original file is not changed.
     
     Parameters
     ----------
-    image_name : str
-        the image name to edit.
+    image_id : int
+        the ID of the image to edit.
     """
-    # Load the image
-    event_path = os.path.join(config.images_path, config.DB.loc[image_name, "Event"])
-    image = Image.open(os.path.join(event_path, image_name))
+    # Start from the edits already stored for the image
+    operations = recipes.get_recipe(image_id)
 
     quit_editing = False
     while not quit_editing:
@@ -189,19 +207,88 @@ def edit(image_name):
         next_task = input("- Filter an image  => type 'F' or 'filter'\n"
                           "- Enhance an image => type 'E' or 'enhance'\n"
                           "- Rotate image => type 'R' or 'rotate'\n"
+                          "- Undo the last edit => type 'U' or 'undo'\n"
                           "- Go back to the main program => type 'Q' or 'quit'\n").lower()
         
+        operation = None
         if next_task in ["f", "filter"]:
-            filter_image(image, image_name)
+            operation = filter_image()
             
         elif next_task in ["e", "enhance"]:
-            enhance_image(image, image_name)
+            operation = enhance_image(recipes.render(image_id, operations))
 
         elif next_task in ["r", "rotate"]:
-            rotate_image(image, image_name)
+            operation = rotate_image()
+
+        elif next_task in ["u", "undo"]:
+            if operations:
+                operations = operations[:-1]
+                implay.preview(recipes.render(image_id, operations), image_id, operations)
+            else:
+                print("There is no edit to undo...\n")
+
+        elif next_task in ["q", "quit"]:
+            raise SystemExit
 
+        else:
+            print("Error! Please enter one of the valid options as displayed...")
+
+        # Preview the recipe with the new edit
+        if operation is not None:
+            operations = recipes.fuse(operations + [operation])
+            implay.preview(recipes.render(image_id, operations), image_id, operations)
+
+def edit_event():
+    """ Function to apply the same edits to all the images of an event.
+    The edits are chosen once and the images are edited in parallel.
+    """
+    event = os.path.basename(implay.get_event())
+    if event == "":
+        print("Please enter the name of an event...\n")
+        return
+
+    # Build the edit recipe
+    operations = []
+    done = False
+    while not done:
+        print(f"Edits to apply: {operations if operations else 'none'}")
+        next_task = input("- Filter the images  => type 'F' or 'filter'\n"
+                          "- Enhance the images => type 'E' or 'enhance'\n"
+                          "- Rotate the images => type 'R' or 'rotate'\n"
+                          "- Apply the edits => type 'A' or 'apply'\n"
+                          "- Go back to the main program => type 'Q' or 'quit'\n").lower()
+        operation = None
+        if next_task in ["f", "filter"]:
+            operation = filter_image()
+        elif next_task in ["e", "enhance"]:
+            operation = enhance_image()
+        elif next_task in ["r", "rotate"]:
+            operation = rotate_image()
+        elif next_task in ["a", "apply"]:
+            done = True
         elif next_task in ["q", "quit"]:
             raise SystemExit
+        else:
+            print("Error! Please enter one of the valid options as displayed...")
+        if operation is not None:
+            operations = recipes.fuse(operations + [operation])
+
+    if not operations:
+        raise SystemExit
 
+    # Edit the originals (edits stored in DB) or save edited copies
+    answer = False
+    while not answer:
+        answer = input("Would you like to replace the originals or save the edited images as new images?"
+                       " (R/Replace or S/Save or Q/Quit)\n").lower().strip()
+        print()
+        if answer in ["r", "replace", "s", "save"]:
+            edited = batch_edit.batch_edit(batch_edit.select_images(event = event), operations,
+                                           copies = answer in ["s", "save"])
+            implay.invalidate_tiles(edited)
+        elif answer in ["q", "quit"]:
+            raise SystemExit
         else:
-            print("Error! Please enter one of the valid options as displayed...")
\ No newline at end of file
+            print("Error! Please enter one of the valid options as displayed...")
+            answer = False
+    raise SystemExit
@@ -0,0 +1,467 @@
+"""
+Module to look up the coordinates of locations with a persistent cache.
+
+The locations already looked up are stored on disk (SQLite, keyed by the
+normalised location name), so a repeated location is resolved without any network
+request. The geocoder used on a cache miss can be replaced: the public Nominatim
+service, or a local gazetteer for offline use and tests.
+
+Classes
+-------
+NominatimGeocoder
+    Geocoder using the public Nominatim service (geopy).
+
+Gazetteer
+    Local geocoder looking up location names in a table, e.g. the countries of the world map.
+
+OfflineFirstGeocoder
+    Geocoder trying a list of geocoders in order (e.g. the gazetteer before Nominatim).
+
+GeocodeCache
+    Persistent cache of looked up locations with expiry and size limit.
+
+TokenBucket
+    Rate limiter for the requests to the geocoding service.
+
+GeocodeQueue
+    Background worker resolving a batch of locations with rate limit and retries.
+
+Functions
+---------
+normalise
+    Function to normalise a location name (case, spaces) to use it as cache key.
+
+geocode
+    Function to get the coordinates of a location through the cache.
+
+set_geocoder
+    Function to replace the geocoder used on cache misses.
+"""
+import os
+import re
+import time
+import queue
+import struct
+import sqlite3
+import threading
+from collections import OrderedDict
+import config
+
+def normalise(query):
+    """ Normalises a location name: case-insensitive, single spaces, no space before commas.
+
+    Parameters
+    ----------
+    query : str
+        the location name. Example: '  Hochschulstrasse 4 ,  Bern'
+
+    Returns
+    -------
+    str
+        the normalised name. Example: 'hochschulstrasse 4, bern'
+    """
+    query = re.sub(r"\s+", " ", query.strip().casefold())
+    return re.sub(r"\s*,\s*", ", ", query)
+
+class NominatimGeocoder():
+    """ Geocoder using the public Nominatim service through geopy.
+    """
+
+    def __init__(self, user_agent = "DigitalDarkroom"):
+        from geopy.geocoders import Nominatim
+        self.geolocator = Nominatim(user_agent = user_agent)
+
+    def geocode(self, query):
+        """ Returns the (latitude, longitude) of a location or None if it was not found.
+        Network errors are raised.
+        """
+        location = self.geolocator.geocode(query)
+        if location is None:
+            return None
+        return (location.latitude, location.longitude)
+
+class Gazetteer():
+    """ Local geocoder looking up location names in a table.
+
+    Attributes
+    ----------
+    entries : dict
+        the (latitude, longitude) of each normalised location name.
+    """
+
+    def __init__(self, entries):
+        self.entries = {normalise(name): coords for name, coords in entries.items()}
+
+    def geocode(self, query):
+        """ Returns the (latitude, longitude) of a location or None if it is not in the table.
+        """
+        return self.entries.get(normalise(query))
+
+    @classmethod
+    def from_worldmap(cls, path = None):
+        """ Creates a gazetteer of the countries of the world map shapefile.
+        The label point of each country is used, under its common, long, formal
+        and translated names and its ISO code.
+
+        Parameters
+        ----------
+        path : str
+            the path to the shapefile attribute table (worldmap.dbf by default).
+        """
+        if path is None:
+            path = os.path.join(config.program_path, "worldmap.dbf")
+        name_fields = ["NAME", "NAME_LONG", "ADMIN", "FORMAL_EN", "NAME_EN", "NAME_DE",
+                       "NAME_FR", "NAME_IT", "ISO_A2", "ISO_A3"]
+        entries = {}
+        for record in read_dbf(path):
+            try:
+                coords = (float(record["LABEL_Y"]), float(record["LABEL_X"]))
+            except (KeyError, ValueError):
+                continue
+            for field in name_fields:
+                name = record.get(field, "")
+                if name and name not in ("-99", "-1") and normalise(name) not in entries:
+                    entries[name] = coords
+        return cls(entries)
+
+class OfflineFirstGeocoder():
+    """ Geocoder trying several geocoders in order until one finds the location.
+
+    Attributes
+    ----------
+    geocoders : list
+        the geocoders, the local ones first.
+    """
+
+    def __init__(self, geocoders):
+        self.geocoders = geocoders
+
+    def geocode(self, query):
+        """ Returns the (latitude, longitude) of the first geocoder finding the location.
+        """
+        for geocoder in self.geocoders:
+            coords = geocoder.geocode(query)
+            if coords is not None:
+                return coords
+        return None
+
+def read_dbf(path):
+    """ Reads the records of a dBase table (attribute table of a shapefile).
+
+    Parameters
+    ----------
+    path : str
+        the path to the .dbf file.
+
+    Yields
+    ------
+    dict
+        the field values (stripped strings) of each record.
+    """
+    with open(path, "rb") as file:
+        count, header_length, record_length = struct.unpack("<4xIHH20x", file.read(32))
+        fields = []
+        while True:
+            descriptor = file.read(32)
+            if descriptor[0] == 0x0D:
+                break
+            fields.append((descriptor[:11].split(b"\0")[0].decode("ascii"), descriptor[16]))
+        file.seek(header_length)
+        for _ in range(count):
+            record = file.read(record_length)
+
+            # Skip records marked as deleted
+            if record[:1] == b"*":
+                continue
+            values = {}
+            position = 1
+            for name, length in fields:
+                values[name] = record[position:position + length].split(b"\0")[0].decode("utf-8", "replace").strip()
+                position += length
+            yield values
+
+class GeocodeCache():
+    """ Persistent cache of the coordinates of looked up locations.
+    Locations that were not found are cached too.
+
+    Attributes
+    ----------
+    path : str
+        the path to the SQLite cache file.
+    ttl : float
+        the number of seconds after which an entry expires.
+    max_entries : int
+        the maximum number of entries, the least recently used are evicted.
+    """
+
+    def __init__(self, path, ttl = config.geocode_cache_ttl, max_entries = config.geocode_cache_size):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.connection = sqlite3.connect(path, check_same_thread = False)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS geocodes (query TEXT PRIMARY KEY, "
+                                    "latitude REAL, longitude REAL, created REAL, last_used REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS geocodes_last_used ON geocodes (last_used)")
+        self.count = self.connection.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+
+    def get(self, query):
+        """ Returns the cached result of a location.
+
+        Parameters
+        ----------
+        query : str
+            the location name.
+
+        Returns
+        -------
+        found : bool
+            True if the location is in the cache and has not expired.
+        coords : tuple
+            the (latitude, longitude) or None if the location was not found by the geocoder.
+        """
+        key = normalise(query)
+        now = time.time()
+        with self.lock:
+
+            # Locations used during this session are kept in memory
+            if key in self.memory:
+                created, coords = self.memory[key]
+                if now - created < self.ttl:
+                    self.memory.move_to_end(key)
+                    return True, coords
+                del self.memory[key]
+            row = self.connection.execute("SELECT latitude, longitude, created FROM geocodes WHERE query = ?",
+                                          (key,)).fetchone()
+            if row is None:
+                return False, None
+            latitude, longitude, created = row
+            with self.connection:
+                if now - created >= self.ttl:
+                    self.connection.execute("DELETE FROM geocodes WHERE query = ?", (key,))
+                    self.count -= 1
+                    return False, None
+                self.connection.execute("UPDATE geocodes SET last_used = ? WHERE query = ?", (now, key))
+            coords = None if latitude is None else (latitude, longitude)
+            self.remember(key, created, coords)
+            return True, coords
+
+    def put(self, query, coords):
+        """ Stores the result of a location and evicts the least recently used entries if full.
+
+        Parameters
+        ----------
+        query : str
+            the location name.
+        coords : tuple
+            the (latitude, longitude) or None if the location was not found.
+        """
+        key = normalise(query)
+        now = time.time()
+        latitude, longitude = coords if coords is not None else (None, None)
+        with self.lock, self.connection:
+            exists = self.connection.execute("SELECT 1 FROM geocodes WHERE query = ?", (key,)).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?)",
+                                    (key, latitude, longitude, now, now))
+            if not exists:
+                self.count += 1
+            if self.count > self.max_entries:
+                evicted = self.count - int(0.9 * self.max_entries)
+                self.connection.execute("DELETE FROM geocodes WHERE query IN (SELECT query FROM geocodes "
+                                        "ORDER BY last_used LIMIT ?)", (evicted,))
+                self.count -= evicted
+                self.memory.clear()
+            self.remember(key, now, coords)
+
+    def remember(self, key, created, coords):
+        """ Keeps an entry in memory (bounded by the cache size).
+        """
+        self.memory[key] = (created, coords)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last = False)
+
+# Geocoder and cache used by geocode, created when first needed
+default_geocoder = None
+default_cache = None
+
+def set_geocoder(geocoder, cache = None):
+    """ Replaces the geocoder (and optionally the cache) used by geocode.
+
+    Parameters
+    ----------
+    geocoder : object
+        any object with a method geocode(query) returning (latitude, longitude) or None.
+    cache : GeocodeCache
+        the cache to use (optional).
+    """
+    global default_geocoder, default_cache
+    default_geocoder = geocoder
+    if cache is not None:
+        default_cache = cache
+
+def get_geocoder():
+    """ Returns the geocoder chosen in config.geocoder ('nominatim', 'offline' or 'offline-first').
+    """
+    global default_geocoder
+    if default_geocoder is None:
+        if config.geocoder == "offline":
+            default_geocoder = Gazetteer.from_worldmap()
+        elif config.geocoder == "offline-first":
+            default_geocoder = OfflineFirstGeocoder([Gazetteer.from_worldmap(), NominatimGeocoder()])
+        else:
+            default_geocoder = NominatimGeocoder()
+    return default_geocoder
+
+def get_cache():
+    """ Returns the geocoding cache stored in config.geocode_cache_path.
+    """
+    global default_cache
+    if default_cache is None:
+        default_cache = GeocodeCache(config.geocode_cache_path)
+    return default_cache
+
+def geocode(query):
+    """ Gets the coordinates of a location, from the cache if it was already looked up.
+
+    Parameters
+    ----------
+    query : str
+        the name of a country, city, village or an address.
+
+    Returns
+    -------
+    tuple
+        the (latitude, longitude) or None if the location was not found.
+    """
+    cache = get_cache()
+    found, coords = cache.get(query)
+    if not found:
+        coords = get_geocoder().geocode(query)
+        cache.put(query, coords)
+    return coords
+
+class TokenBucket():
+    """ Token bucket rate limiter: at most `rate` requests per second on average,
+    with bursts of at most `capacity` requests.
+    """
+
+    def __init__(self, rate, capacity = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ Waits until a request is allowed.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class GeocodeQueue():
+    """ Background worker resolving locations while the program continues.
+    The locations are deduplicated, the cached ones are resolved immediately and the
+    others are sent to the geocoder at a limited rate, with retries and exponential
+    backoff on errors.
+
+    Attributes
+    ----------
+    rate : float
+        the maximum number of geocoder requests per second.
+    retries : int
+        the number of retries of a failed request.
+    backoff : float
+        the delay in seconds before the first retry, doubled at each retry.
+    results : dict
+        the (latitude, longitude) or None of each resolved normalised location.
+    """
+
+    def __init__(self, rate = config.geocode_rate, retries = config.geocode_retries,
+                 backoff = config.geocode_backoff):
+        self.bucket = TokenBucket(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.results = {}
+        self.submitted = set()
+        self.queries = queue.Queue()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def submit(self, query):
+        """ Adds a location to resolve (ignored if already submitted).
+        """
+        key = normalise(query)
+        if key not in self.submitted:
+            self.submitted.add(key)
+            self.queries.put(query)
+
+    def run(self):
+        """ Resolves the submitted locations one after the other (worker thread).
+        """
+        while True:
+            query = self.queries.get()
+            if query is None:
+                self.queries.task_done()
+                return
+            self.results[normalise(query)] = self.resolve(query)
+            self.queries.task_done()
+
+    def resolve(self, query):
+        """ Returns the coordinates of a location from the cache or the rate limited geocoder.
+        """
+        cache = get_cache()
+        found, coords = cache.get(query)
+        if found:
+            return coords
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                coords = get_geocoder().geocode(query)
+            except Exception as error:
+                if attempt == self.retries:
+                    print(f"Error! The location '{query}' could not be found: {error}")
+                    return None
+                time.sleep(self.backoff * 2 ** attempt)
+            else:
+                cache.put(query, coords)
+                return coords
+
+    def wait(self):
+        """ Waits until all the submitted locations are resolved and stops the worker.
+
+        Returns
+        -------
+        dict
+            the (latitude, longitude) or None of each normalised location.
+        """
+        self.queries.put(None)
+        self.queries.join()
+        self.thread.join()
+        return self.results
+
+    def stop(self):
+        """ Stops the worker without resolving the locations not yet sent to the geocoder.
+        """
+        while True:
+            try:
+                self.queries.get_nowait()
+            except queue.Empty:
+                break
+            self.queries.task_done()
+        self.queries.put(None)
+
+    def get(self, query):
+        """ Returns the coordinates of a resolved location (None if not found).
+        """
+        return self.results.get(normalise(query))
@@ -0,0 +1,370 @@
+"""
+Module to find duplicate and near-duplicate images.
+
+Each image has two hashes stored in the database:
+- Hash: a BLAKE2b hash of the bytes of the file (identical files),
+- DHash: a 64-bit difference hash of the image decoded at a small size
+  (the same picture resized, recompressed or slightly edited).
+
+The difference hashes are kept in a BK-tree, so the images within a Hamming
+distance of a hash are found without comparing it with every image.
+
+Classes
+-------
+BKTree
+    Tree of hashes searched by Hamming distance.
+
+HashIndex
+    Index of the hashes of the images of the database.
+
+ContentHashes
+    Dictionary of the IDs of the images of the database by content hash.
+
+Functions
+---------
+content_hash
+    Function to compute the BLAKE2b hash of a file.
+
+dhash
+    Function to compute the difference hash of an image file.
+
+get_hashes
+    Function to get the dictionary of the content hashes of config.DB.
+
+refresh_hashes
+    Function to record new or changed content hashes in the dictionary.
+
+find_identical
+    Function to get the ID of an image of the database identical to a file.
+
+update_hashes
+    Function to compute the missing hashes of images of the database.
+
+find_duplicates
+    Function to group the duplicate and near-duplicate images of the database.
+
+report_duplicates
+    Function to print the groups of duplicate images for the user.
+"""
+import hashlib
+import threading
+import numpy as np
+import config
+import catalog
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from metadata_reader import (ORIENTATION, orient)
+
+# Size of the blocks of a file read for its content hash
+CHUNK_SIZE = 1 << 20
+
+def content_hash(path):
+    """ Returns the BLAKE2b hash of the bytes of a file (hexadecimal).
+    """
+    digest = hashlib.blake2b(digest_size = 16)
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def dhash(path):
+    """ Returns the difference hash of an image (64 bits as 16 hexadecimal digits).
+
+    The image is decoded at a small size (JPEG images at 1/8 in draft mode),
+    turned as displayed, reduced to 9 x 8 grey pixels and each bit tells if a
+    pixel is brighter than its right neighbour.
+    """
+    with Image.open(path) as image:
+        orientation = image.getexif().get(ORIENTATION, 1)
+        image.draft("L", (64, 64))
+        proxy = orient(image.convert("L"), orientation).resize((9, 8), Image.Resampling.BOX)
+    pixels = np.asarray(proxy, dtype = np.int16)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes().hex()
+
+def hamming(first, second):
+    """ Returns the number of different bits of two difference hashes.
+    """
+    return (int(first, 16) ^ int(second, 16)).bit_count()
+
+class BKTree():
+    """ Burkhard-Keller tree of difference hashes.
+
+    Each node has children by their distance to the node, so a search only
+    visits the children whose distance is within max_distance of the distance
+    between the node and the searched hash (triangle inequality).
+
+    Attributes
+    ----------
+    root : list
+        the root node [hash, items, children] (None if the tree is empty).
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        """ Adds an item (image ID) with its hash.
+        """
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            if distance not in node[2]:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = node[2][distance]
+
+    def search(self, value, max_distance):
+        """ Returns the (distance, item) of the items whose hash is within max_distance.
+        """
+        found = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    nodes.append(child)
+        return found
+
+class HashIndex():
+    """ Index of the hashes of images: a dictionary of the content hashes and a
+    BK-tree of the difference hashes. Images can be added from several threads.
+
+    Attributes
+    ----------
+    hashes : dict
+        the ID of an image for each content hash.
+    tree : BKTree
+        the tree of the difference hashes.
+    """
+
+    def __init__(self, db = None):
+        """
+        Parameters
+        ----------
+        db : pandas.DataFrame
+            the image database with Hash and DHash columns (optional).
+        """
+        self.hashes = {}
+        self.tree = BKTree()
+        self.lock = threading.Lock()
+        if db is not None and {"Hash", "DHash"} <= set(db.columns):
+            for image_id, hash_value, dhash_value in zip(db.index, db["Hash"], db["DHash"]):
+                self.add(image_id, hash_value, dhash_value)
+
+    def add(self, image_id, hash_value, dhash_value):
+        """ Adds the hashes of an image (missing hashes are ignored).
+        """
+        with self.lock:
+            if isinstance(hash_value, str):
+                self.hashes.setdefault(hash_value, image_id)
+            if isinstance(dhash_value, str):
+                self.tree.add(dhash_value, image_id)
+
+    def claim(self, item, hash_value, dhash_value):
+        """ Adds the hashes of a new image unless the same file is already indexed.
+
+        Parameters
+        ----------
+        item : object
+            the item of the new image (its path while it is uploaded, it has no ID yet).
+
+        Returns
+        -------
+        object
+            the ID (or item) of the identical image, or None if the image was added.
+        """
+        with self.lock:
+            if hash_value in self.hashes:
+                return self.hashes[hash_value]
+            self.hashes[hash_value] = item
+            self.tree.add(dhash_value, item)
+        return None
+
+    def similar(self, dhash_value, max_distance = None):
+        """ Returns the IDs of the images within max_distance of a difference hash,
+        the closest first.
+        """
+        if max_distance is None:
+            max_distance = config.duplicate_distance
+        with self.lock:
+            found = self.tree.search(dhash_value, max_distance)
+        return [item for _, item in sorted(found, key = lambda pair: pair[0])]
+
+class ContentHashes():
+    """ Dictionary of the IDs of the images of a database by content hash, so that an
+    upload finds the files already in the database without reading the Hash column.
+
+    Attributes
+    ----------
+    ids : dict
+        the ID of an image for each content hash.
+    db : pandas.DataFrame
+        the database the dictionary is up to date with.
+    length : int
+        the number of images of the database when it was last updated.
+    """
+
+    def __init__(self, db):
+        self.ids = {}
+        if "Hash" in db.columns:
+            for image_id, hash_value in zip(db.index, db["Hash"]):
+                self.add(image_id, hash_value)
+        self.db = db
+        self.length = len(db)
+
+    def add(self, image_id, hash_value):
+        """ Records the content hash of an image (missing hashes are ignored).
+        """
+        if isinstance(hash_value, str):
+            self.ids.setdefault(hash_value, image_id)
+
+    def find(self, hash_value):
+        """ Returns the ID of the image with a content hash, or None. An image whose
+        hash changed since it was recorded is not returned.
+        """
+        image_id = self.ids.get(hash_value)
+        db = self.db
+        if image_id is None or image_id not in db.index or db.at[image_id, "Hash"] != hash_value:
+            return None
+        return image_id
+
+# Content hashes of config.DB, built at the first lookup
+default_hashes = None
+
+def get_hashes():
+    """ Returns the dictionary of the content hashes of config.DB (built again if config.DB changed).
+    """
+    global default_hashes
+    if default_hashes is None or default_hashes.db is not config.DB or default_hashes.length != len(config.DB):
+        default_hashes = ContentHashes(config.DB)
+    return default_hashes
+
+def refresh_hashes(image_ids, previous = None):
+    """ Records the content hashes of new images or of images hashed in place, so
+    that the dictionary is not built again.
+
+    Parameters
+    ----------
+    image_ids : list
+        the IDs of the images of config.DB.
+    previous : pandas.DataFrame
+        the database replaced by config.DB when the images were added (optional,
+        the dictionary is only kept if it was up to date with it).
+    """
+    hashes = default_hashes
+    if hashes is None:
+        return
+    if previous is None:
+        if hashes.db is not config.DB:
+            return
+    elif hashes.db is not previous or hashes.length != len(previous):
+        return
+    if "Hash" in config.DB.columns:
+        for image_id, hash_value in zip(image_ids, config.DB.loc[list(image_ids), "Hash"]):
+            hashes.add(image_id, hash_value)
+    hashes.db = config.DB
+    hashes.length = len(config.DB)
+
+def find_identical(hash_value):
+    """ Returns the ID of an image of config.DB with a content hash (an identical file), or None.
+    """
+    global default_hashes
+    hashes = get_hashes()
+    image_id = hashes.find(hash_value)
+    if image_id is None and hash_value in hashes.ids:
+
+        # The image was changed or removed since the dictionary was built
+        default_hashes = None
+        image_id = get_hashes().find(hash_value)
+    return image_id
+
+def update_hashes(workers = config.ingest_workers):
+    """ Computes the hashes of the images of the database that have none and
+    writes them with a single write.
+
+    Returns
+    -------
+    list
+        the IDs of the images that could not be read.
+    """
+    for column in ("Hash", "DHash"):
+        if column not in config.DB.columns:
+            config.DB[column] = None
+    missing = config.DB.index[config.DB["Hash"].isna() | config.DB["DHash"].isna()]
+
+    def read(image_id):
+        path = catalog.image_path(image_id)
+        try:
+            return content_hash(path), dhash(path)
+        except (OSError, ValueError):
+            return None
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        hashes = dict(zip(missing, pool.map(read, missing)))
+
+    computed = [image_id for image_id, pair in hashes.items() if pair is not None]
+    if computed:
+        config.DB.loc[computed, ["Hash", "DHash"]] = [hashes[image_id] for image_id in computed]
+        config.STORAGE.save_rows(config.DB, computed)
+        refresh_hashes(computed)
+    return [image_id for image_id, pair in hashes.items() if pair is None]
+
+def find_duplicates(max_distance = None):
+    """ Groups the images of the database that are identical or look the same.
+
+    Parameters
+    ----------
+    max_distance : int
+        the maximum number of different bits of the difference hashes of two
+        similar images (default: config.duplicate_distance).
+
+    Returns
+    -------
+    list
+        the groups (lists of image IDs, at least 2) ordered by ID.
+    """
+    if max_distance is None:
+        max_distance = config.duplicate_distance
+    update_hashes()
+    hashed = config.DB[config.DB["Hash"].notna() & config.DB["DHash"].notna()]
+    index = HashIndex(hashed)
+
+    # Join the images found within max_distance (and the identical files) into groups
+    parents = {image_id: image_id for image_id in hashed.index}
+    def root(image_id):
+        while parents[image_id] != image_id:
+            parents[image_id] = parents[parents[image_id]]
+            image_id = parents[image_id]
+        return image_id
+    for image_id, hash_value, dhash_value in zip(hashed.index, hashed["Hash"], hashed["DHash"]):
+        for other in index.similar(dhash_value, max_distance) + [index.hashes[hash_value]]:
+            parents[root(other)] = root(image_id)
+
+    groups = {}
+    for image_id in parents:
+        groups.setdefault(root(image_id), []).append(image_id)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+def report_duplicates():
+    """ Prints the groups of duplicate and near-duplicate images of the library.
+    """
+    print("Looking for duplicate images...\n")
+    groups = find_duplicates()
+    if not groups:
+        print("No duplicate images were found.\n")
+        return
+    for number, group in enumerate(groups, 1):
+        hashes = config.DB.loc[group, "Hash"]
+        print(f"Group {number}:")
+        for image_id in group:
+            identical = "=" if (hashes == hashes[image_id]).sum() > 1 else "~"
+            print(f"  {identical} {catalog.label(image_id)}")
+    print("\n= identical files, ~ similar images\n")
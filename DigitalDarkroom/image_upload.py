@@ -29,11 +29,13 @@ choose_file_type
 
 import os
 import config
-import glob
 import config
+import catalog
 import numpy as np
 import pandas as pd
-from organise_images import (get_coords, extract_metadata_upload)
+from organise_images import (get_coords, extract_metadata_upload, location_images_db)
+from geocoding import GeocodeQueue
+from ingest import (IngestSession, discover_files, ingest_files)
 
 class Event():
     """ The Event class that corresponds to a set of images.
@@ -163,15 +165,59 @@ def choose_file_type(source, dest):
                 print()
                 coords_group = get_coords(group_location)
 
-    # copy whole tree (with subdirs), glob.glob("path/to/dir/*.*") to get list of all filenames
-    for full_file_name in glob.glob(os.path.join(source, file_extension)):
-        file_name = os.path.basename(full_file_name)
+    # The database is written at checkpoints, images of a previous interrupted upload are skipped
+    pattern = os.path.join(source, file_extension)
+    locations = {}
+    names = {}
+    geocode_queue = GeocodeQueue() if ans_single else None
+    try:
+        with IngestSession() as session:
+            file_paths = discover_files(pattern)
+
+            # Ask the location of each image first, the locations are looked up in the background
+            if ans_single:
+                file_paths = list(file_paths)
+                for full_file_name in file_paths:
+                    file_name = os.path.basename(full_file_name)
+                    if session.is_ingested(file_name, dest, full_file_name):
+                        continue
+                    print(f'Image name: {file_name}')
+                    location = input("Enter the location name you want to add to this image"
+                                     " (Press enter to skip):\n").strip()
+                    if location:
+                        locations[full_file_name] = location
+                        geocode_queue.submit(location)
+
+            # Read and copy the images in parallel (an image can get a new name in the event)
+            copied, skipped = ingest_files(file_paths, dest, session, coords = coords_group, names = names)
+
+        # Wait for the locations (the worker stops even if no location was entered)
+        if geocode_queue is not None:
+            if locations:
+                print("Looking up the locations...")
+            geocode_queue.wait()
+    finally:
+
+        # Interrupted upload: stop the worker without looking up the remaining locations
+        if geocode_queue is not None and geocode_queue.thread.is_alive():
+            geocode_queue.stop()
 
-        # Copy only files from given directory
-        if os.path.isfile(full_file_name): 
-            extract_metadata_upload(full_file_name, dest, file_name, add_geo = ans_geo, single = ans_single, coords = coords_group)
+    # Add the locations of the images in one write
+    if locations:
+        image_coords = {}
+        event = os.path.basename(os.path.normpath(dest))
+        for full_file_name, location in locations.items():
+            coords = geocode_queue.get(location)
+            image_id = catalog.find_image(event, names[full_file_name]) if full_file_name in names else None
+            if coords is None:
+                print(f"The location '{location}' of {os.path.basename(full_file_name)} could not be found.")
+            elif image_id is not None:
+                image_coords[image_id] = (coords[0], coords[1], location)
+        location_images_db(image_coords)
 
-    print("Images have been copied!\n") 
+    if skipped:
+        print(f"{skipped} images were already uploaded and have been skipped.")
+    print(f"{copied} images have been copied!\n")
 
 def upload_images():
     """ Uploads images from specified folder by the user in Digital Darkroom.
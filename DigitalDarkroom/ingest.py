@@ -0,0 +1,350 @@
+"""
+Module to ingest uploaded images into the DigitalDarkroom database in batches.
+
+Classes
+-------
+IngestSession
+    A transactional session that collects the new database rows of an upload
+    and writes them to the database at checkpoints.
+
+Functions
+---------
+discover_files
+    Function to list the files to upload that match a glob pattern.
+
+new_name
+    Function to get a file name not used in an event folder.
+
+ingest_files
+    Function to extract the metadata of images and copy them in parallel.
+"""
+import os
+import glob
+import time
+import queue
+import shutil
+import filecmp
+import threading
+import config
+import catalog
+import hashing
+import spatial
+import thumbnails
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from PIL import UnidentifiedImageError
+
+class IngestSession():
+    """ A transactional ingest session for the image database.
+
+    The rows of the uploaded images are collected in memory and merged into
+    config.DB in one concatenation at each checkpoint. A checkpoint is made every
+    `checkpoint_files` images or `checkpoint_seconds` seconds and when the session
+    is committed, so an interrupted upload loses at most one checkpoint.
+
+    Attributes
+    ----------
+    checkpoint_files : int
+        the number of new rows after which a checkpoint is made.
+    checkpoint_seconds : float
+        the number of seconds after which a checkpoint is made.
+    pending : dict
+        the new rows (by event and image name) that are not yet in the database.
+    """
+
+    def __init__(self, checkpoint_files = config.checkpoint_files,
+                 checkpoint_seconds = config.checkpoint_seconds):
+        self.checkpoint_files = checkpoint_files
+        self.checkpoint_seconds = checkpoint_seconds
+        self.pending = {}
+        self.last_checkpoint = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        # The pending rows belong to files that were already copied, keep them even on error
+        self.commit()
+        return False
+
+    def is_ingested(self, image_name, dest, source = None):
+        """ Checks if an image was already ingested in the event by a previous checkpoint.
+        Used to resume an interrupted upload.
+
+        Parameters
+        ----------
+        image_name : str
+            the name of the image.
+        dest : str
+            the path to the event folder the image is uploaded to.
+        source : str
+            the path to the file to upload (optional): the image is only ingested if
+            the file of the event is identical (cameras give the same names to different images).
+
+        Returns
+        -------
+        bool
+            True if the image is in the database for that event and was copied.
+        """
+        event = os.path.basename(os.path.normpath(dest))
+        path = os.path.join(dest, image_name)
+        return (catalog.find_image(event, image_name) is not None and os.path.isfile(path)
+                and (source is None or filecmp.cmp(source, path, shallow = False)))
+
+    def add(self, image_name, row):
+        """ Adds the row of a new image to the session and makes a checkpoint if due.
+
+        Parameters
+        ----------
+        image_name : str
+            the name of the image.
+        row : dict
+            the metadata of the image with the database columns as keys (with the Event).
+        """
+        row["Filename"] = image_name
+        self.pending[(row["Event"], image_name)] = row
+        if (len(self.pending) >= self.checkpoint_files
+            or time.monotonic() - self.last_checkpoint >= self.checkpoint_seconds):
+            self.checkpoint()
+
+    def checkpoint(self):
+        """ Merges the pending rows into the database and writes them to the storage.
+        """
+        self.last_checkpoint = time.monotonic()
+        if not self.pending:
+            return
+
+        # Images uploaded again keep their ID and their row is replaced
+        image_ids = [catalog.find_image(event, image_name) for event, image_name in self.pending]
+        new_ids = iter(catalog.next_ids(image_ids.count(None)))
+        image_ids = [next(new_ids) if image_id is None else image_id for image_id in image_ids]
+        new_rows = pd.DataFrame(list(self.pending.values()), index = pd.Index(image_ids, name = "ID"))
+
+        previous = config.DB
+        config.DB = pd.concat([config.DB.drop(image_ids, errors = "ignore"), new_rows])
+        config.STORAGE.save_rows(config.DB, image_ids)
+        catalog.refresh(image_ids, previous)
+        hashing.refresh_hashes(image_ids, previous)
+        spatial.refresh(image_ids, previous)
+        self.pending = {}
+
+    def commit(self):
+        """ Writes all the remaining rows to the database.
+        """
+        self.checkpoint()
+
+
+def discover_files(pattern):
+    """ Lists lazily the files that match a glob pattern (file discovery stage).
+
+    Parameters
+    ----------
+    pattern : str
+        the glob pattern of the files to upload. Example: Documents/MyPhotos/*.jpg
+
+    Yields
+    ------
+    str
+        the path to a file matching the pattern.
+    """
+    for path in glob.iglob(pattern):
+        if os.path.isfile(path):
+            yield path
+
+def new_name(dest, filename, taken = (), source = None):
+    """ Returns the name under which a new image is copied in an event folder: its
+    file name, or name_2.jpg, name_3.jpg, ... if the name is used by another image.
+
+    Parameters
+    ----------
+    dest : str
+        the path to the event folder.
+    filename : str
+        the name of the file to copy.
+    taken : set
+        other file names of the event that cannot be used (besides the images of the
+        database and the files of the folder).
+    source : str
+        the path to the file to copy (optional): the name of a file of the folder
+        identical to it is returned (the file was already copied).
+
+    Returns
+    -------
+    str
+        the first file name not used in the event by another image.
+    """
+    event = os.path.basename(os.path.normpath(dest))
+    stem, extension = os.path.splitext(filename)
+    name = filename
+    number = 2
+    while True:
+        path = os.path.join(dest, name)
+        if name not in taken:
+            if os.path.isfile(path):
+                if source is not None and filecmp.cmp(source, path, shallow = False):
+                    return name
+            elif not os.path.exists(path) and catalog.find_image(event, name) is None:
+                return name
+        name = f"{stem}_{number}{extension}"
+        number += 1
+
+def ingest_files(file_paths, dest, session, coords = None, workers = config.ingest_workers,
+                 copy_workers = config.copy_workers, max_in_flight = config.ingest_queue_size,
+                 skip_duplicates = True, names = None):
+    """ Uploads images with a pipeline: metadata extraction and file copy run in thread pools
+    while the new rows are merged into the ingest session by the calling thread only.
+    A file whose name is already taken in the event by a different image is copied
+    under a new name (name_2.jpg, name_3.jpg, ...).
+
+    Parameters
+    ----------
+    file_paths : iterable
+        the paths to the images to upload.
+    dest : str
+        the path to the event folder where the images are copied.
+    session : IngestSession
+        the session collecting the new database rows.
+    coords : tuple
+        the latitude, longitude and location name to add to all images (optional).
+    workers : int
+        the number of threads reading the image headers and exif data.
+    copy_workers : int
+        the number of threads copying the files.
+    max_in_flight : int
+        the maximum number of images being processed at once. The file discovery
+        waits when it is reached (backpressure).
+    skip_duplicates : bool
+        do not copy the files identical to an image of the database or of the upload
+        (same content hash).
+    names : dict
+        filled with the name given in the event to each copied file, by path (optional).
+
+    Returns
+    -------
+    copied : int
+        the number of images that have been uploaded.
+    skipped : int
+        the number of images skipped because already uploaded or identical to another image.
+    """
+    from organise_images import image_metadata
+
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    results = queue.Queue()
+    event = os.path.basename(os.path.normpath(dest))
+
+    # Names of the event given to the files of this upload
+    claimed = set()
+    names_lock = threading.Lock()
+
+    # Content hashes of the database (kept between uploads) and of the files of this upload
+    known_hashes = hashing.get_hashes() if skip_duplicates else None
+    hash_index = hashing.HashIndex() if skip_duplicates else None
+
+    def claim_name(full_file_name, filename):
+        # Returns the name of the file in the event, or None if it is already uploaded
+        with names_lock:
+            name = new_name(dest, filename, claimed, full_file_name)
+
+            # The same file: uploaded, or copied before an interrupted checkpoint (its row is added)
+            if os.path.isfile(os.path.join(dest, name)) and catalog.find_image(event, name) is not None:
+                return None
+            claimed.add(name)
+        return name
+
+    def copy_file(full_file_name, row):
+        try:
+            shutil.copy2(full_file_name, os.path.join(dest, row["Filename"]))
+            if config.thumbnails_at_upload:
+                thumbnails.generate(os.path.join(dest, row["Filename"]))
+            results.put((full_file_name, row, None))
+        except Exception as error:
+            results.put((full_file_name, None, error))
+        finally:
+            in_flight.release()
+
+    def read_file(full_file_name, filename):
+        try:
+            row = image_metadata(full_file_name, dest, filename)
+        except Exception as error:
+            results.put((full_file_name, None, error))
+            in_flight.release()
+            return
+
+        # Identical files are found before they are copied
+        if hash_index is not None:
+            original = known_hashes.find(row["Hash"])
+            if original is None:
+                original = hash_index.claim(os.path.join(row["Event"], filename), row["Hash"], row["DHash"])
+            if original is not None:
+                if not isinstance(original, str):
+                    original = catalog.label(original)
+                results.put((full_file_name, None, FileExistsError(f"identical to {original}")))
+                in_flight.release()
+                return
+
+        # Cameras give the same names to different images: another image of the event is never replaced
+        row["Filename"] = claim_name(full_file_name, filename)
+        if row["Filename"] is None:
+            results.put((full_file_name, None, FileExistsError("already uploaded")))
+            in_flight.release()
+            return
+        if coords:
+            row.update(zip(["Latitude", "Longitude", "Location"], coords))
+        copy_pool.submit(copy_file, full_file_name, row)
+
+    def merge(block):
+        # Single writer: only the calling thread adds rows to the session
+        merged = 0
+        copied = 0
+        duplicates = 0
+        while True:
+            try:
+                full_file_name, row, error = results.get(block = block and merged == 0)
+            except queue.Empty:
+                return merged, copied, duplicates
+            merged += 1
+            filename = os.path.basename(full_file_name)
+            if row is None:
+                if isinstance(error, UnidentifiedImageError):
+                    print(f"Not an image: {filename}")
+                elif isinstance(error, FileExistsError):
+                    print(f"Already in DigitalDarkroom: {filename} ({error})")
+                    duplicates += 1
+                else:
+                    print(f"Error! {filename} could not be uploaded: {error}")
+            else:
+                if row["Filename"] != filename:
+                    print(f"{filename} is uploaded as {row['Filename']} (the name is used by another image)")
+                if names is not None:
+                    names[full_file_name] = row["Filename"]
+                session.add(row["Filename"], row)
+                copied += 1
+
+    submitted = 0
+    done = 0
+    copied = 0
+    skipped = 0
+    with ThreadPoolExecutor(max_workers = copy_workers) as copy_pool, \
+         ThreadPoolExecutor(max_workers = workers) as read_pool:
+        for full_file_name in file_paths:
+            filename = os.path.basename(full_file_name)
+            if session.is_ingested(filename, dest, full_file_name):
+                skipped += 1
+                continue
+            in_flight.acquire()
+            read_pool.submit(read_file, full_file_name, filename)
+            submitted += 1
+            merged, new, duplicates = merge(block = False)
+            done += merged
+            copied += new
+            skipped += duplicates
+
+        # Wait for the images still in the pipeline
+        while done < submitted:
+            merged, new, duplicates = merge(block = True)
+            done += merged
+            copied += new
+            skipped += duplicates
+
+    return copied, skipped
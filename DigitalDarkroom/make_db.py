@@ -1,7 +1,7 @@
 import os
 import pandas as pd
 import config
-config.DB = pd.DataFrame(columns = ['Event', 'Format', 'Width', 'Height','Megapixels','Channels'
+config.DB = pd.DataFrame(columns = ['Filename', 'Event', 'Format', 'Width', 'Height','Megapixels','Channels'
 ,'Mode','Timestamp', 'Creation','Date_Time','Date','Edited','Latitude','Longitude',
-'Location'])
-config.DB.to_pickle(os.path.join(config.program_path, "image_DB.pkl")) 
+'Location','Size','Mtime','Hash','DHash'], index = pd.Index([], name = 'ID'))
+config.STORAGE.save(config.DB)
@@ -0,0 +1,180 @@
+"""
+Module to group the image locations of the world map into clusters of markers.
+
+The map is divided into square grids of cells, each zoom level halving the cells
+of the previous one (level z: 2**z cells over 360 degrees). All the clusters are
+computed once when the map is opened: the points are sorted by the Z-order
+(Morton) code of their cell at the finest level, so that the points of a cell
+at any level are contiguous and the cells of a level are the runs of equal
+codes shifted by 2 bits per level above it.
+
+The map draws one marker per cluster of the level that gives about
+config.map_cluster_cells cells across the view, so the number of markers (and
+the time to draw them) does not depend on the number of images.
+
+Classes
+-------
+MarkerClusters
+    Clusters of the image locations at every zoom level.
+
+Functions
+---------
+spread_bits
+    Function to insert a zero bit between the bits of integers.
+
+morton_codes
+    Function to get the Z-order codes of grid cells.
+"""
+import numpy as np
+import config
+
+# Finest zoom level: cells of 360 / 2**20 degrees (about 40 m)
+MAX_LEVEL = 20
+
+def spread_bits(values):
+    """ Inserts a zero bit between the bits of integers of at most 32 bits (abc => 0a0b0c).
+    """
+    values = np.asarray(values, dtype = np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+def morton_codes(columns, rows):
+    """ Returns the Z-order codes of grid cells (bits of the column and row interleaved).
+    """
+    return spread_bits(columns) | (spread_bits(rows) << np.uint64(1))
+
+class MarkerClusters():
+    """ Clusters of the image locations at every zoom level of the map.
+
+    Attributes
+    ----------
+    ids, latitudes, longitudes : numpy.ndarray
+        the IDs and coordinates of the images, sorted by Z-order code.
+    levels : list
+        for each zoom level, the (position of the first image, number of images,
+        mean latitude, mean longitude) of each cluster, as numpy arrays.
+    level : int
+        the zoom level of the clusters in view.
+    shown : numpy.ndarray
+        the numbers of the clusters in view (markers of the last call to view).
+    """
+
+    def __init__(self, image_ids, latitudes, longitudes, max_level = MAX_LEVEL):
+        image_ids = np.asarray(image_ids, dtype = np.int64)
+        latitudes = np.asarray(latitudes, dtype = float)
+        longitudes = np.asarray(longitudes, dtype = float)
+
+        # Sort the images by the Z-order code of their cell at the finest level
+        # (the latitudes use the same cell size, in the lower half of the grid)
+        cells = 2 ** max_level
+        columns = np.clip(((longitudes + 180) / 360 * cells).astype(np.int64), 0, cells - 1)
+        rows = np.clip(((latitudes + 90) / 360 * cells).astype(np.int64), 0, cells - 1)
+        codes = morton_codes(columns, rows)
+        order = np.argsort(codes, kind = "stable")
+        self.ids, self.latitudes, self.longitudes = image_ids[order], latitudes[order], longitudes[order]
+        codes = codes[order]
+
+        # The clusters of each level are the runs of equal codes without their last bits
+        self.levels = []
+        for level in range(max_level + 1):
+            prefixes = codes >> np.uint64(2 * (max_level - level))
+            starts = np.flatnonzero(np.r_[True, prefixes[1:] != prefixes[:-1]]) if len(codes) else np.array([], dtype = np.int64)
+            counts = np.diff(np.r_[starts, len(codes)])
+            if len(codes):
+                cluster_latitudes = np.add.reduceat(self.latitudes, starts) / counts
+                cluster_longitudes = np.add.reduceat(self.longitudes, starts) / counts
+            else:
+                cluster_latitudes = cluster_longitudes = np.array([])
+            self.levels.append((starts, counts, cluster_latitudes, cluster_longitudes))
+        self.level = 0
+        self.shown = np.array([], dtype = np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def zoom_level(self, west, east, cells = config.map_cluster_cells):
+        """ Returns the zoom level with about `cells` cells across a view from west to east (degrees).
+        """
+        width = min(max(east - west, 1e-9), 360)
+        level = int(np.ceil(np.log2(360 * cells / width)))
+        return min(max(level, 0), len(self.levels) - 1)
+
+    def view(self, south, west, north, east, cells = config.map_cluster_cells):
+        """ Returns the markers of the clusters in a view of the map and records them for picking.
+
+        Parameters
+        ----------
+        south, west, north, east : float
+            the limits of the view (degrees).
+        cells : int
+            the approximate number of clusters across the view.
+
+        Returns
+        -------
+        tuple
+            the longitudes, latitudes and number of images of the clusters in view (numpy arrays).
+        """
+        self.level = self.zoom_level(west, east, cells)
+        _, counts, latitudes, longitudes = self.levels[self.level]
+        inside = (latitudes >= south) & (latitudes <= north) & (longitudes >= west) & (longitudes <= east)
+        self.shown = np.flatnonzero(inside)
+        return longitudes[self.shown], latitudes[self.shown], counts[self.shown]
+
+    def members(self, markers):
+        """ Returns the IDs of the images of clusters in view.
+
+        Parameters
+        ----------
+        markers : list
+            the positions of the markers among those returned by the last call to view
+            (e.g. the `ind` of a matplotlib pick event).
+
+        Returns
+        -------
+        list
+            the sorted IDs of the images of the clusters.
+        """
+        starts, counts, _, _ = self.levels[self.level]
+        clusters = self.shown[np.asarray(markers, dtype = np.int64)]
+        return sorted(image_id for cluster in clusters
+                      for image_id in self.ids[starts[cluster]:starts[cluster] + counts[cluster]].tolist())
+
+    def cells(self, markers):
+        """ Returns the bounding boxes of the cells of clusters in view, so that their
+        images can be looked up in the spatial index. The east and north edges are
+        just inside the cells (except at the edges of the grid), so that an image on
+        the edge of two cells is only in one of them, as in the clusters.
+
+        Parameters
+        ----------
+        markers : list
+            the positions of the markers among those returned by the last call to view.
+
+        Returns
+        -------
+        list
+            the (south, west, north, east) limits of the cells (degrees).
+        """
+        starts = self.levels[self.level][0][self.shown[np.asarray(markers, dtype = np.int64)]]
+        shift = len(self.levels) - 1 - self.level
+        size = 360 / 2 ** self.level
+
+        # Cell of the first image of each cluster, from its cell at the finest level
+        cells = 2 ** (len(self.levels) - 1)
+        columns = np.clip(((self.longitudes[starts] + 180) / 360 * cells).astype(np.int64), 0, cells - 1) >> shift
+        rows = np.clip(((self.latitudes[starts] + 90) / 360 * cells).astype(np.int64), 0, cells - 1) >> shift
+        boxes = []
+        for column, row in zip(columns.tolist(), rows.tolist()):
+            south, west = row * size - 90, column * size - 180
+            north, east = south + size, west + size
+            boxes.append((south, west, north if north > 90 else np.nextafter(north, south),
+                          east if east >= 180 else np.nextafter(east, west)))
+        return boxes
+
+    @staticmethod
+    def marker_sizes(counts):
+        """ Returns the areas (points^2) of the markers of clusters, growing with the logarithm of their number of images.
+        """
+        return (5 + 3 * np.log2(np.asarray(counts, dtype = float))) ** 2
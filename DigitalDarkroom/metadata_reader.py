@@ -0,0 +1,275 @@
+"""
+Module to read the metadata of images without decoding their pixel data.
+
+JPEG files are parsed directly: only the segment headers, the Exif APP1 segment
+(TIFF IFDs) and the start of frame segment are read. Other formats fall back to PIL.
+
+Functions
+---------
+read_metadata
+    Function to read the format, size, mode, dates, orientation and GPS position of an image.
+
+read_jpeg_metadata
+    Function to read the metadata from the headers of a JPEG file.
+
+read_tiff_ifds
+    Function to read the IFD0, Exif and GPS tags of a TIFF structure (Exif block).
+
+orient
+    Function to turn decoded pixels the way the exif orientation says the image is displayed.
+
+displayed_size
+    Function to get the width and height of an image as displayed (exif orientation applied).
+"""
+import struct
+from PIL import Image
+
+# TIFF tags used by DigitalDarkroom
+ORIENTATION = 0x0112
+DATE_TIME = 0x0132
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+DATE_TIME_ORIGINAL = 0x9003
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+
+# Size in bytes and struct format of the TIFF field types
+TIFF_TYPES = {1: (1, "B"), 2: (1, "s"), 3: (2, "H"), 4: (4, "L"), 5: (8, "LL"),
+              7: (1, "B"), 9: (4, "l"), 10: (8, "ll")}
+
+# Transposition displaying the pixels of an image for each exif orientation (1: none)
+ORIENTATION_TRANSPOSES = {2: Image.Transpose.FLIP_LEFT_RIGHT,
+                          3: Image.Transpose.ROTATE_180,
+                          4: Image.Transpose.FLIP_TOP_BOTTOM,
+                          5: Image.Transpose.TRANSPOSE,
+                          6: Image.Transpose.ROTATE_270,
+                          7: Image.Transpose.TRANSVERSE,
+                          8: Image.Transpose.ROTATE_90}
+
+# JPEG start of frame markers (baseline, progressive, lossless, arithmetic...)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Image mode for the number of colour components in a JPEG frame
+JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+
+def orient(image, orientation = None):
+    """ Transposes the pixels of an image as given by its exif orientation.
+
+    Parameters
+    ----------
+    image : PIL.Image
+        the image (decoded pixels as stored in the file).
+    orientation : int
+        the exif orientation (default: read from the image).
+
+    Returns
+    -------
+    PIL.Image
+        the image as it must be displayed (the same object if it is not turned).
+    """
+    if orientation is None:
+        orientation = image.getexif().get(ORIENTATION, 1)
+    if orientation in ORIENTATION_TRANSPOSES:
+        return image.transpose(ORIENTATION_TRANSPOSES[orientation])
+    return image
+
+def read_tiff_ifds(data):
+    """ Reads the tags of IFD0 and of the Exif and GPS sub-IFDs from a TIFF structure.
+
+    Parameters
+    ----------
+    data : bytes
+        the TIFF structure, starting with the byte order mark (II or MM).
+
+    Returns
+    -------
+    tags : dict
+        the tag values by tag number (IFD0 and Exif IFD).
+    gps : dict
+        the tag values of the GPS IFD by tag number.
+    offsets : dict
+        the position of the value of each IFD0 tag in the data.
+    """
+    byte_order = {b"II": "<", b"MM": ">"}[data[:2]]
+    if struct.unpack(byte_order + "H", data[2:4])[0] != 42:
+        raise ValueError("Not a TIFF structure")
+
+    def read_ifd(offset):
+        values = {}
+        positions = {}
+        count = struct.unpack_from(byte_order + "H", data, offset)[0]
+        for index in range(count):
+            entry = offset + 2 + 12 * index
+            tag, field_type, number = struct.unpack_from(byte_order + "HHL", data, entry)
+            if field_type not in TIFF_TYPES:
+                continue
+            size, fmt = TIFF_TYPES[field_type]
+            position = entry + 8
+            if size * number > 4:
+                position = struct.unpack_from(byte_order + "L", data, entry + 8)[0]
+            if position + size * number > len(data):
+                continue
+            if field_type == 2:
+                value = data[position:position + number].split(b"\0")[0].decode("ascii", "replace")
+            else:
+                value = struct.unpack_from(byte_order + fmt * number, data, position)
+                if field_type in (5, 10):
+                    value = tuple(value[i] / value[i + 1] if value[i + 1] else 0.0
+                                  for i in range(0, len(value), 2))
+                if number == 1:
+                    value = value[0]
+            values[tag] = value
+            positions[tag] = position
+        return values, positions
+
+    tags, offsets = read_ifd(struct.unpack(byte_order + "L", data[4:8])[0])
+    gps = {}
+    if EXIF_IFD in tags:
+        tags.update(read_ifd(tags[EXIF_IFD])[0])
+    if GPS_IFD in tags:
+        gps = read_ifd(tags[GPS_IFD])[0]
+    return tags, gps, offsets
+
+def gps_to_degrees(value, reference):
+    """ Converts a GPS position (degrees, minutes, seconds) to signed decimal degrees.
+    """
+    degrees = value[0] + value[1] / 60 + value[2] / 3600
+    if reference in ("S", "W"):
+        degrees = -degrees
+    return degrees
+
+def exif_fields(tags, gps):
+    """ Extracts the fields used by DigitalDarkroom from the exif tags.
+    """
+    fields = {"date_time": tags.get(DATE_TIME),
+              "date_time_original": tags.get(DATE_TIME_ORIGINAL),
+              "orientation": tags.get(ORIENTATION, 1),
+              "latitude": None,
+              "longitude": None}
+    try:
+        fields["latitude"] = gps_to_degrees(gps[GPS_LATITUDE], gps.get(GPS_LATITUDE_REF))
+        fields["longitude"] = gps_to_degrees(gps[GPS_LONGITUDE], gps.get(GPS_LONGITUDE_REF))
+    except (KeyError, TypeError, IndexError):
+        fields["latitude"] = None
+    return fields
+
+def read_jpeg_metadata(file):
+    """ Reads the metadata of a JPEG file from its headers only.
+
+    Parameters
+    ----------
+    file : file object
+        the JPEG file opened in binary mode, positioned at its start.
+
+    Returns
+    -------
+    metadata : dict
+        the format, size, mode, number of channels, dates, orientation and GPS position.
+        The entry 'orientation_offset' is the file position of the orientation value
+        (None if the file has no orientation tag).
+    """
+    if file.read(2) != b"\xff\xd8":
+        raise ValueError("Not a JPEG file")
+    metadata = {"format": "JPEG", "orientation_offset": None, "byte_order": None}
+    metadata.update(exif_fields({}, {}))
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("Corrupted JPEG header")
+
+        # Skip fill bytes
+        while marker[1] == 0xFF:
+            marker = marker[1:] + file.read(1)
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        if code in (0xD9, 0xDA):
+            raise ValueError("No frame header before the image data")
+        length = struct.unpack(">H", file.read(2))[0]
+        start = file.tell()
+
+        # Exif data
+        if code == 0xE1 and metadata["byte_order"] is None:
+            segment = file.read(length - 2)
+            if segment[:6] == b"Exif\0\0":
+                tags, gps, offsets = read_tiff_ifds(segment[6:])
+                metadata.update(exif_fields(tags, gps))
+                metadata["byte_order"] = segment[6:8]
+                if ORIENTATION in offsets:
+                    metadata["orientation_offset"] = start + 6 + offsets[ORIENTATION]
+
+        # Multi picture format (PIL opens such files as MPO)
+        elif code == 0xE2:
+            if file.read(4) == b"MPF\0":
+                metadata["format"] = "MPO"
+
+        # Frame header with the image size
+        elif code in SOF_MARKERS:
+            _, height, width, components = struct.unpack(">BHHB", file.read(6))
+            metadata.update({"width": width,
+                             "height": height,
+                             "mode": JPEG_MODES.get(components, "RGB"),
+                             "channels": components})
+            return metadata
+        file.seek(start + length - 2)
+
+def read_pil_metadata(path):
+    """ Reads the metadata of an image of any format supported by PIL.
+    The pixel data is not decoded and the file is closed afterwards.
+    """
+    with Image.open(path) as img:
+        exif = img.getexif()
+        tags = dict(exif)
+        tags.update(exif.get_ifd(EXIF_IFD))
+        metadata = {"format": img.format,
+                    "width": img.size[0],
+                    "height": img.size[1],
+                    "mode": img.mode,
+                    "channels": len(img.getbands()),
+                    "orientation_offset": None,
+                    "byte_order": None}
+        metadata.update(exif_fields(tags, dict(exif.get_ifd(GPS_IFD))))
+    return metadata
+
+def read_metadata(path):
+    """ Reads the metadata of an image without decoding its pixel data.
+
+    Parameters
+    ----------
+    path : str
+        the path to the image file.
+
+    Returns
+    -------
+    metadata : dict
+        the keys are format, width, height, mode, channels, date_time (exif tag 306),
+        date_time_original, orientation, latitude and longitude (None if missing).
+
+    Raises
+    ------
+    PIL.UnidentifiedImageError
+        if the file is not an image.
+    """
+    with open(path, "rb") as file:
+        if file.read(2) == b"\xff\xd8":
+            file.seek(0)
+            try:
+                return read_jpeg_metadata(file)
+            except (ValueError, KeyError, struct.error):
+                pass
+    return read_pil_metadata(path)
+
+def displayed_size(metadata):
+    """ Returns the (width, height) of an image as it is displayed: the orientations
+    5 to 8 turn the image by a quarter, so the size of the stored frame is swapped.
+
+    Parameters
+    ----------
+    metadata : dict
+        the metadata of the image from read_metadata.
+    """
+    if metadata.get("orientation") in (5, 6, 7, 8):
+        return metadata["height"], metadata["width"]
+    return metadata["width"], metadata["height"]
@@ -8,12 +8,17 @@ Delete events or images
 import os
 import shutil
 import config
+import catalog
+import query
+import spatial
+import geocoding
 from datetime import datetime
-from geopy.geocoders import Nominatim
 import pandas as pd
 import numpy as np
-from PIL import (Image, UnidentifiedImageError)
-from display_images import get_event
+from PIL import UnidentifiedImageError
+from ingest import (IngestSession, new_name)
+from metadata_reader import (read_metadata, displayed_size)
+from hashing import (content_hash, dhash, find_identical)
 
 #######################################################################
 #Extract metadata
@@ -21,7 +26,7 @@ from display_images import get_event
 def date_taken(path_to_event_folder):
     """ Get the date when the picture was taken from the exif data
     """
-    return Image.open(path_to_event_folder).getexif()[306]
+    return read_metadata(path_to_event_folder)["date_time"]
 
 def get_date_from_string(date_str):
     """ Convert string output from exif to date
@@ -32,61 +37,87 @@ def get_date_from_string(date_str):
 
 def get_coords(location_name):
     """Function to get coordinates of a location 
+    Locations already looked up are read from the geocoding cache.
     input: name of a country, city, village or an address
     output: coordinates and location name given by user, tuple
     """
     try:
-        geolocator = Nominatim(user_agent="DigitalDarkroom")
-        location = geolocator.geocode(location_name)
-        #print(location.address)
-        loc = (location.latitude, location.longitude, location_name)
+        latitude, longitude = geocoding.geocode(location_name)
+        loc = (latitude, longitude, location_name)
         return loc
     except:
         print("Something went wrong")
 
 
 
-def extract_metadata_upload(full_file_name, dest, filename, add_geo = False, single = False, coords = None):
+def image_metadata(full_file_name, dest, filename):
+    """ Extract the metadata of an image as a new row of the database image_DB
+    The metadata comes from the file headers, the pixel data is only decoded
+    at a small size for the difference hash (near-duplicates).
+    """
+    metadata = read_metadata(full_file_name)
+    date_time = metadata["date_time"]
+    if date_time is None:
+        date_time = pd.NaT
+        date = pd.NaT
+    else:
+        date = get_date_from_string(date_time)
+    event = os.path.basename(os.path.normpath(dest))
+    width, height = displayed_size(metadata) # Size as displayed (exif orientation)
+    megapixels = width*height/1000000 # Megapixels
+    stat = os.stat(full_file_name)
+    timestamp = stat.st_ctime # Timestamp
+    creation = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+    row = {'Filename':filename,
+           'Event':event,
+           'Format':metadata["format"],
+           'Width':width,
+           'Height':height,
+           'Megapixels':megapixels,
+           'Channels':metadata["channels"],
+           'Mode':metadata["mode"],
+           'Timestamp': timestamp,
+           'Creation':creation,
+           'Date_Time':date_time,
+           'Date': date,
+           'Edited': False,
+           'Size': stat.st_size, # Compared by rescan (the copy keeps the modification time)
+           'Mtime': stat.st_mtime,
+           'Hash': content_hash(full_file_name),
+           'DHash': dhash(full_file_name)}
+
+    # Keep the position recorded by the camera (can be replaced by a location name)
+    if metadata["latitude"] is not None:
+        row.update({'Latitude':metadata["latitude"], 'Longitude':metadata["longitude"]})
+    return row
+
+def extract_metadata_upload(full_file_name, dest, filename, add_geo = False, single = False, coords = None, session = None):
     """ Extract metadata when images are uploaded and include it into the database image_DB
+    The row is added to the ingest session if given, otherwise it is written immediately.
     """
     try:
-        img = Image.open(full_file_name)
-        exifdata = img.getexif()
-        if exifdata is None or 306 not in exifdata.keys():
-            date_time = pd.NaT
-            date = pd.NaT
-        else:
-            date_time = exifdata[306]
-            date = get_date_from_string(date_time)
-        event = os.path.basename(os.path.normpath(dest))
-        megapixels = img.size[0]*img.size[1]/1000000 # Megapixels
-        nr_channels = len(Image.Image.getbands(img)) # Number of channels
-        timestamp = os.path.getctime(full_file_name) # Timestamp
-        creation = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-        new_row = {'Filename':filename,
-                   'Event':event,
-                   'Format':img.format,
-                   'Width':img.size[0],
-                   'Height':img.size[1],
-                   'Megapixels':megapixels,
-                   'Channels':nr_channels,
-                   'Mode':img.mode,
-                   'Timestamp': timestamp,
-                   'Creation':creation,
-                   'Date_Time':date_time,
-                   'Date': date,
-                   'Edited': False}
-        config.DB.loc[filename] = pd.Series(new_row)
+        new_row = image_metadata(full_file_name, dest, filename)
+        if find_identical(new_row["Hash"]) is not None:
+            print(f"Already in DigitalDarkroom: {filename}")
+            return
         if add_geo:
             if single:
                 print(f'Image name: {filename}')
                 new_location = input("Enter the location name you want to add to this image: ")
                 coords = get_coords(new_location)
-                config.DB.loc[filename, ["Latitude", "Longitude", "Location"]] = coords
             if coords:
-                config.DB.loc[filename, ["Latitude", "Longitude", "Location"]] = coords
-        config.DB.to_pickle(os.path.join(config.program_path, "image_DB.pkl")) 
-        shutil.copy(full_file_name, dest)
+                new_row.update(zip(["Latitude", "Longitude", "Location"], coords))
+
+        # Another image of the event with the same name is not replaced
+        name = new_name(dest, filename)
+        if name != filename:
+            print(f"{filename} is uploaded as {name} (the name is used by another image)")
+        shutil.copy2(full_file_name, os.path.join(dest, name))
+        if session is None:
+            with IngestSession() as single_session:
+                single_session.add(name, new_row)
+        else:
+            session.add(name, new_row)
     except UnidentifiedImageError:
         print("Not an image")
 
@@ -104,29 +135,49 @@ def location_event_db(event_name, location_name):
         image_db:       updated database
     """
     coords = get_coords(location_name)
-    config.DB.loc[config.DB.Event ==event_name, ["Latitude", "Longitude", "Location"]] = coords  #location for event
-    config.DB.to_pickle(os.path.join(config.program_path, "image_DB.pkl"))
+    event_rows = config.DB.Event == event_name
+    config.DB.loc[event_rows, ["Latitude", "Longitude", "Location"]] = coords  #location for event
+    config.STORAGE.save_rows(config.DB, config.DB.index[event_rows])
+    spatial.refresh(config.DB.index[event_rows])
     return config.DB
 
 
 
-def location_image_db(image_name, location_name): 
+def location_image_db(image_id, location_name): 
     """Function to change coordinates for all pictures from the same event
     input: 
-        image_name:     image for which coordinates will be added or changed
+        image_id:       ID of the image for which coordinates will be added or changed
         location_name:  Location for which coordinates will be looked up and added to database
     output:
         image_db:       updated database
     """
     coords = get_coords(location_name)
-    config.DB.loc[image_name, ["Latitude", "Longitude", "Location"]] = coords 
-    config.DB.to_pickle(os.path.join(config.program_path, "image_DB.pkl"))
+    config.DB.loc[image_id, ["Latitude", "Longitude", "Location"]] = coords 
+    config.STORAGE.save_rows(config.DB, [image_id])
+    spatial.refresh([image_id])
     print("The location has been changed.")
     return config.DB
 
+def location_images_db(image_coords):
+    """Function to add or change the coordinates of several images in one write
+    input: 
+        image_coords:   dictionary with the image IDs as keys and the
+                        coordinates and location name (tuple) as values
+    output:
+        image_db:       updated database
+    """
+    if image_coords:
+        image_ids = list(image_coords)
+        config.DB.loc[image_ids, ["Latitude", "Longitude", "Location"]] = pd.DataFrame(
+            list(image_coords.values()), index = image_ids, columns = ["Latitude", "Longitude", "Location"])
+        config.STORAGE.save_rows(config.DB, image_ids)
+        spatial.refresh(image_ids)
+    return config.DB
+
 def change_info_event():
     """Function to change the information of an event (name or location)
     """
+    from display_images import get_event
     event_path = get_event()
 
     if os.path.normpath(event_path) == os.path.normpath(config.images_path):
@@ -145,8 +196,11 @@ def change_info_event():
         if change.lower() in ["n", "name"]:
             new_name = input("What should the new name for the event be\n")
             try:
-                config.DB.loc[config.DB.Event ==event, ["Event"]] = new_name  #location for event
-                config.DB.to_pickle(os.path.join(config.program_path, "image_DB.pkl"))
+                event_rows = config.DB.Event == event
+                config.DB.loc[event_rows, ["Event"]] = new_name  #location for event
+                config.STORAGE.save_rows(config.DB, config.DB.index[event_rows])
+                catalog.refresh(config.DB.index[event_rows])
+                query.invalidate()
                 os.rename(os.path.join(config.images_path, event), os.path.join(config.images_path, new_name))
                 break
             except OSError as e:
@@ -170,6 +224,7 @@ def change_info_image():
     """Function to change the name or location of an image
     """
     # get the event path
+    from display_images import get_event
     event_path = get_event()
 
     # list picture names and test if picture exists
@@ -193,7 +248,9 @@ def change_info_image():
         if image_name.lower() in ["q", "quit"]:
             print("You decided not to change the event information.")
             raise SystemExit
+        file_path = os.path.join(event_path, image_name)
         print()
+    image_id = catalog.find_image(os.path.basename(event_path), image_name)
 
     # list options for the changes
     while True:
@@ -204,10 +261,18 @@ def change_info_image():
 
         if change.lower() in ["n", "name"]:
             new_name = input("What should the new name for the image be? \n")
+
+            # The event and file name of an image are unique: another image is never replaced
+            if (catalog.find_image(os.path.basename(event_path), new_name) is not None
+                    or os.path.exists(os.path.join(event_path, new_name))):
+                print(f"Sorry, the event already has an image named {new_name}. Choose another name.\n")
+                continue
             try:
-                config.DB.rename(index={image_name:new_name}, inplace=True)
-                config.DB.to_pickle(config.program_path, "image_DB.pkl")
                 os.rename(file_path, os.path.join(event_path, new_name))
+                if image_id is not None:
+                    config.DB.loc[image_id, "Filename"] = new_name
+                    config.STORAGE.save_rows(config.DB, [image_id])
+                    catalog.refresh([image_id])
                 print("The name has been changed.")
                 break
             except OSError as e:
@@ -216,7 +281,7 @@ def change_info_image():
         if change.lower() in ["l", "location"]:
             location_name = input("Write the name of the location that should be added - "
                                 "A country, city, village or address will do\n")
-            location_image_db(image_name, location_name)
+            location_image_db(image_id, location_name)
 
         if change.lower() in ["q", "quit"]:
             print("You decided not to change the image information.")
@@ -259,15 +324,17 @@ def change_info():
 def del_event():
     """Function to delete an entire event
     """
+    from display_images import get_event
     event_path = get_event()
     if os.path.normpath(event_path) == os.path.normpath(config.images_path):
         print("You decided not to delete the event")
         raise SystemExit
     
     event = os.path.basename(event_path)
-    config.DB = config.DB.drop(config.DB[config.DB.Event == event].index)
+    event_images = config.DB[config.DB.Event == event].index
+    config.DB = config.DB.drop(event_images)
     print("Event deleted from database")
-    config.DB.to_pickle(config.program_path, "image_DB.pkl")
+    config.STORAGE.delete_rows(config.DB, event_images)
     try:
         shutil.rmtree(event_path)
     except OSError as e:
@@ -277,6 +344,7 @@ def del_event():
 def del_file():
     """Function to delete a file within an event 
     """
+    from display_images import get_event
     event_path = get_event()
 
     # list images in event
@@ -305,7 +373,10 @@ def del_file():
     # Try to delete the file
     try:
         os.remove(file_path)
-        config.DB = config.DB.drop(index = file)
+        image_id = catalog.find_image(os.path.basename(event_path), file)
+        if image_id is not None:
+            config.DB = config.DB.drop(index = image_id)
+            config.STORAGE.delete_rows(config.DB, [image_id])
         print("Image has been deleted.")
     except OSError as e:
     # If it fails, inform the user.
@@ -0,0 +1,119 @@
+"""
+Module to render a page of the panorama display as a single image.
+
+The images of a page are pasted into one RGB buffer (a grid of 3 rows and 5
+columns) shown with a single imshow. Turning a page updates the buffer and the
+captions in place instead of creating a new figure with 15 axes.
+
+Classes
+-------
+GridRenderer
+    Renderer of a grid of images into one matplotlib image artist.
+"""
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+class GridRenderer():
+    """ Renders pages of images as a grid in one image artist of a matplotlib axis.
+
+    Attributes
+    ----------
+    rows : int
+        the number of rows of the grid.
+    columns : int
+        the number of columns of the grid.
+    cell_size : tuple
+        the width and height in pixels of a cell (image and caption).
+    caption_height : int
+        the height in pixels of the caption band at the top of each cell.
+    names : list
+        the images (IDs) currently displayed in each cell (None if empty).
+    """
+
+    def __init__(self, axis, rows = 3, columns = 5, cell_size = (240, 200), caption_height = 20):
+        self.axis = axis
+        self.rows = rows
+        self.columns = columns
+        self.cell_size = cell_size
+        self.caption_height = caption_height
+        self.names = [None] * (rows * columns)
+        self.buffer = np.full((rows * cell_size[1], columns * cell_size[0], 3), 255, dtype = np.uint8)
+        self.artist = axis.imshow(self.buffer, interpolation = "nearest")
+        self.captions = [axis.text((index % columns + 0.5) * cell_size[0],
+                                   (index // columns) * cell_size[1] + caption_height - 4,
+                                   "", fontsize = 7, ha = "center", va = "bottom")
+                         for index in range(rows * columns)]
+        axis.set_axis_off()
+
+    def cell_box(self, index):
+        """ Returns the pixel box (left, top, right, bottom) of the image area of a cell.
+        """
+        left = (index % self.columns) * self.cell_size[0]
+        top = (index // self.columns) * self.cell_size[1] + self.caption_height
+        return left, top, left + self.cell_size[0], top + self.cell_size[1] - self.caption_height
+
+    def render(self, images, load_tile, caption = str):
+        """ Draws a page of images in the grid.
+
+        Parameters
+        ----------
+        images : list
+            the images (IDs) of the page (None for an empty cell).
+        load_tile : function
+            function returning the downscaled image (PIL.Image) of an image.
+        caption : function
+            function returning the caption of an image (default: the image itself).
+        """
+        self.buffer[:] = 255
+        for index in range(self.rows * self.columns):
+            image = images[index] if index < len(images) else None
+            self.names[index] = None
+            self.captions[index].set_text("")
+            if image is None:
+                continue
+
+            # Leave the cell empty if the file is not an image
+            try:
+                tile = load_tile(image)
+            except UnidentifiedImageError:
+                continue
+            self.paste(index, tile)
+            self.names[index] = image
+            self.captions[index].set_text(caption(image))
+        self.artist.set_data(self.buffer)
+        self.axis.figure.canvas.draw_idle()
+
+    def paste(self, index, tile):
+        """ Pastes an image centred in a cell, downscaled to fit if needed.
+        """
+        left, top, right, bottom = self.cell_box(index)
+        width, height = right - left - 4, bottom - top - 4
+        if tile.size[0] > width or tile.size[1] > height:
+            ratio = min(width / tile.size[0], height / tile.size[1])
+            tile = tile.resize((max(1, int(tile.size[0] * ratio)), max(1, int(tile.size[1] * ratio))),
+                               Image.Resampling.BILINEAR)
+        pixels = np.asarray(tile.convert("RGB"))
+        top += (bottom - top - pixels.shape[0]) // 2
+        left += (right - left - pixels.shape[1]) // 2
+        self.buffer[top:top + pixels.shape[0], left:left + pixels.shape[1]] = pixels
+
+    def name_at(self, x, y):
+        """ Returns the image (ID) displayed at a position of the axis.
+
+        Parameters
+        ----------
+        x, y : float
+            the position in data coordinates (pixels of the grid).
+
+        Returns
+        -------
+        object
+            the image or None if there is no image at that position.
+        """
+        if x is None or y is None or x < 0 or y < 0:
+            return None
+        column = int(x // self.cell_size[0])
+        row = int(y // self.cell_size[1])
+        if column >= self.columns or row >= self.rows:
+            return None
+        return self.names[row * self.columns + column]
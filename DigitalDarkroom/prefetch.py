@@ -0,0 +1,101 @@
+"""
+Module to decode the images of the next and previous display pages in the background.
+
+Classes
+-------
+Prefetcher
+    Thread pool decoding thumbnails ahead of the display, with an in-memory LRU of tiles.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import config
+import thumbnails
+
+class Prefetcher():
+    """ Decodes thumbnails in background threads while the user looks at the current page.
+    Prefetch requests that are no longer needed (e.g. after skipping several pages
+    quickly) are cancelled if they have not started yet.
+
+    Attributes
+    ----------
+    capacity : int
+        the maximum number of decoded tiles kept in memory.
+    tiles : OrderedDict
+        the decoded tiles by (image path, scale), least recently used first.
+    """
+
+    def __init__(self, workers = config.prefetch_workers, capacity = config.prefetch_tiles):
+        self.pool = ThreadPoolExecutor(max_workers = workers)
+        self.capacity = capacity
+        self.tiles = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def load(self, key):
+        """ Decodes a tile and keeps it in memory (run by the worker threads).
+        """
+        try:
+            tile = thumbnails.get_thumbnail(*key)
+        except Exception:
+            with self.lock:
+                self.pending.pop(key, None)
+            raise
+        with self.lock:
+            self.tiles[key] = tile
+            self.tiles.move_to_end(key)
+            while len(self.tiles) > self.capacity:
+                self.tiles.popitem(last = False)
+            self.pending.pop(key, None)
+        return tile
+
+    def get(self, image_path, scale):
+        """ Returns the tile of an image, decoded now if it was not prefetched.
+
+        Parameters
+        ----------
+        image_path : str
+            the path to the image.
+        scale : int
+            the downscaling factor of the tile.
+
+        Returns
+        -------
+        PIL.Image
+            the tile.
+        """
+        key = (image_path, scale)
+        with self.lock:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                return self.tiles[key]
+            future = self.pending.get(key)
+        if future is not None and not future.cancelled():
+            return future.result()
+        return self.load(key)
+
+    def prefetch(self, image_paths, scale):
+        """ Decodes the tiles of images in the background and cancels the other waiting requests.
+
+        Parameters
+        ----------
+        image_paths : list
+            the paths to the images that will probably be displayed next.
+        scale : int
+            the downscaling factor of the tiles.
+        """
+        wanted = {(path, scale) for path in image_paths}
+        with self.lock:
+            for key, future in list(self.pending.items()):
+                if key not in wanted and future.cancel():
+                    del self.pending[key]
+            for key in wanted:
+                if key not in self.tiles and key not in self.pending:
+                    self.pending[key] = self.pool.submit(self.load, key)
+
+    def invalidate(self, image_path):
+        """ Forgets the tiles of an image, e.g. when the original is replaced.
+        """
+        with self.lock:
+            for key in [key for key in self.tiles if key[0] == image_path]:
+                del self.tiles[key]
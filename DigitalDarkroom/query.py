@@ -0,0 +1,342 @@
+"""
+Module to find the images of the database matching a query.
+
+A query is a list of terms that must all match, for example:
+    date:2019-01..2019-06 event:Japan mp>12 near:"Kyoto" 50km
+
+The IDs matching each term are read from indexes built once from the database:
+sorted arrays of the dates and megapixels (a range is two binary searches) and
+dictionaries of the IDs of each event, format and mode. The sets of IDs are
+intersected, smallest first, before any row of the database is read. The
+images of a `near:` term are found with the spatial index (spatial.py).
+
+The indexes are built again when config.DB is replaced or changes size; code
+that changes the indexed columns in place calls invalidate.
+
+Query terms
+-----------
+date:2019-01..2019-06
+    images taken from January to June 2019 (a year, a month or a day, the end is
+    included). 'date:2019', 'date:2019-03..' and 'date:..2019-03-15' also work.
+event:Japan, format:JPEG, mode:RGB
+    images of an event, file format or colour mode (case-insensitive).
+mp>12, mp>=12, mp<12, mp<=12, mp=12, mp:8..12
+    images by number of megapixels.
+near:"Kyoto" 50km, near:35.01,135.77 500m
+    images located within a distance of a place or of coordinates
+    (default distance: config.query_radius km).
+
+Classes
+-------
+QueryIndex
+    Sorted and inverted indexes of the columns of an image database.
+
+Functions
+---------
+parse_period
+    Function to get the first day and the day after the end of a year, month or day.
+
+parse_query
+    Function to split a query into terms.
+
+get_index
+    Function to get the indexes of config.DB.
+
+invalidate
+    Function to build the indexes again at the next query.
+
+find_images
+    Function to get the IDs of the images matching a query.
+
+search
+    Function to ask the user for a query and display the matching images.
+"""
+import re
+import shlex
+import numpy as np
+import pandas as pd
+import config
+import spatial
+
+# Columns indexed by sorted values (ranges) and by value (equality)
+SORTED_COLUMNS = ("Date", "Megapixels")
+INVERTED_COLUMNS = ("Event", "Format", "Mode")
+
+# Field of the query terms for each column
+FIELDS = {"date": "Date", "mp": "Megapixels", "event": "Event", "format": "Format", "mode": "Mode"}
+
+def column_values(db, column):
+    """ Returns the values of a sorted column as a numpy array: days (datetime64, NaT
+    if unknown) for Date, floats (NaN if unknown) for the others.
+    """
+    if column not in db.columns:
+        values = pd.Series(np.nan, index = db.index)
+    else:
+        values = db[column]
+    if column == "Date":
+
+        # The dates extracted at upload are 0-d numpy arrays
+        if values.dtype.kind != "M":
+            values = pd.to_datetime(pd.Series([value[()] if isinstance(value, np.ndarray) else value
+                                               for value in values], dtype = object), errors = "coerce")
+        return values.to_numpy().astype("datetime64[D]")
+    return pd.to_numeric(values, errors = "coerce").to_numpy(dtype = float)
+
+class QueryIndex():
+    """ Sorted and inverted indexes of the columns of an image database.
+
+    Attributes
+    ----------
+    sorted : dict
+        the sorted known values of each column of SORTED_COLUMNS and the IDs in the same order.
+    inverted : dict
+        the sorted IDs of each value (case-folded) of each column of INVERTED_COLUMNS.
+    ids : numpy.ndarray
+        the sorted IDs of all the images.
+    db : pandas.DataFrame
+        the database the indexes were built from.
+    length : int
+        the number of images of the database.
+    """
+
+    def __init__(self, db):
+        ids = db.index.to_numpy(dtype = np.int64)
+        self.ids = np.sort(ids)
+        self.sorted = {}
+        for column in SORTED_COLUMNS:
+            values = column_values(db, column)
+            known = ~np.isnat(values) if values.dtype.kind == "M" else ~np.isnan(values)
+            order = np.argsort(values[known], kind = "stable")
+            self.sorted[column] = (values[known][order], ids[known][order])
+        self.inverted = {}
+        for column in INVERTED_COLUMNS:
+            groups = {}
+            if column in db.columns:
+                for image_id, value in zip(ids, db[column]):
+                    if isinstance(value, str):
+                        groups.setdefault(value.casefold(), []).append(image_id)
+            self.inverted[column] = {value: np.sort(np.array(image_ids, dtype = np.int64))
+                                     for value, image_ids in groups.items()}
+        self.db = db
+        self.length = len(db)
+
+    def range(self, column, low, high, include_low = True, include_high = True):
+        """ Returns the sorted IDs of the images whose value of a column is in a range.
+
+        Parameters
+        ----------
+        column : str
+            a column of SORTED_COLUMNS.
+        low, high : float or numpy.datetime64
+            the bounds of the range (None: no bound).
+        include_low, include_high : bool
+            include the images whose value is equal to a bound.
+
+        Returns
+        -------
+        numpy.ndarray
+            the IDs.
+        """
+        values, ids = self.sorted[column]
+        start = 0 if low is None else np.searchsorted(values, low, side = "left" if include_low else "right")
+        stop = len(values) if high is None else np.searchsorted(values, high, side = "right" if include_high else "left")
+        return np.sort(ids[start:stop])
+
+    def equal(self, column, value):
+        """ Returns the sorted IDs of the images with a value (case-insensitive) of a column of INVERTED_COLUMNS.
+        """
+        return self.inverted[column].get(value.casefold(), np.array([], dtype = np.int64))
+
+def parse_period(text):
+    """ Returns the first day of a year, month or day and the day after its end.
+
+    Parameters
+    ----------
+    text : str
+        the period. Example: '2019', '2019-06' or '2019-06-15'
+
+    Returns
+    -------
+    tuple
+        the (first day, day after the end) as numpy.datetime64 days.
+    """
+    if not re.fullmatch(r"\d{4}(-\d{2}){0,2}", text):
+        raise ValueError(f"'{text}' is not a year, month or day (Example: 2019, 2019-06 or 2019-06-15)")
+    period = np.datetime64(text)
+    return period.astype("datetime64[D]"), (period + 1).astype("datetime64[D]")
+
+def parse_number(text):
+    """ Returns the number of a query term, or raises ValueError with a message for the user.
+    """
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"'{text}' is not a number") from None
+
+def parse_query(text):
+    """ Splits a query into terms.
+
+    Parameters
+    ----------
+    text : str
+        the query. Example: 'date:2019-01..2019-06 event:Japan mp>12 near:"Kyoto" 50km'
+
+    Returns
+    -------
+    list
+        the terms: ("range", column, low, high, include_low, include_high),
+        ("equal", column, value) or ("near", place, radius in km), where
+        place is a name or (latitude, longitude).
+
+    Raises
+    ------
+    ValueError
+        if a term is not valid (the message is shown to the user).
+    """
+    try:
+        tokens = shlex.split(text)
+    except ValueError as error:
+        raise ValueError(f"The query could not be read: {error}") from None
+    terms = []
+    position = 0
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        field, separator, value = token.partition(":")
+        field = field.lower()
+
+        # Comparisons of the megapixels: mp>12, mp<=8, ...
+        comparison = re.fullmatch(r"mp\s*(>=|<=|>|<|=)\s*(.+)", token, re.IGNORECASE)
+        if comparison:
+            operator, number = comparison.group(1), parse_number(comparison.group(2))
+            if operator == "=":
+                terms.append(("range", "Megapixels", number, number, True, True))
+            elif operator.startswith(">"):
+                terms.append(("range", "Megapixels", number, None, operator == ">=", True))
+            else:
+                terms.append(("range", "Megapixels", None, number, True, operator == "<="))
+            continue
+        if not separator or not value:
+            raise ValueError(f"'{token}' is not a query term (Example: event:Japan)")
+
+        if field == "date":
+            start, dots, end = value.partition("..")
+            low = parse_period(start)[0] if start else None
+            high = parse_period(end if dots else start)[1] if (end or not dots) else None
+            terms.append(("range", "Date", low, high, True, False))
+        elif field == "mp":
+            low, dots, high = value.partition("..")
+            low = parse_number(low) if low else None
+            high = (parse_number(high) if high else None) if dots else low
+            terms.append(("range", "Megapixels", low, high, True, True))
+        elif field in ("event", "format", "mode"):
+            terms.append(("equal", FIELDS[field], value))
+        elif field == "near":
+
+            # A place name or coordinates, then an optional distance (50km, 500m)
+            coords = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*", value)
+            place = (float(coords.group(1)), float(coords.group(2))) if coords else value
+            radius = config.query_radius
+            if position < len(tokens):
+                distance = re.fullmatch(r"(\d+(?:\.\d+)?)\s*(km|m)", tokens[position], re.IGNORECASE)
+                if distance:
+                    radius = float(distance.group(1)) / (1000 if distance.group(2).lower() == "m" else 1)
+                    position += 1
+            terms.append(("near", place, radius))
+        else:
+            raise ValueError(f"'{field}' is not a query field (date, event, mp, format, mode or near)")
+    return terms
+
+# Indexes of config.DB, built at the first query
+default_index = None
+
+def get_index():
+    """ Returns the indexes of config.DB (built again if config.DB changed).
+    """
+    global default_index
+    if default_index is None or default_index.db is not config.DB or default_index.length != len(config.DB):
+        default_index = QueryIndex(config.DB)
+    return default_index
+
+def invalidate():
+    """ Builds the indexes again at the next query, called after the indexed
+    columns (Date, Megapixels, Event, Format, Mode) are changed in place.
+    """
+    global default_index
+    default_index = None
+
+def find_images(query):
+    """ Returns the IDs of the images of config.DB matching a query.
+
+    Parameters
+    ----------
+    query : str or list
+        the query, or its terms as returned by parse_query.
+
+    Returns
+    -------
+    list
+        the IDs of the matching images, in increasing order.
+
+    Raises
+    ------
+    ValueError
+        if the query is not valid or a place is not found (or the geocoder cannot be reached).
+    """
+    terms = parse_query(query) if isinstance(query, str) else list(query)
+    index = get_index()
+
+    # Get the IDs of each term from the indexes
+    candidates = []
+    for term in terms:
+        if term[0] == "range":
+            candidates.append(index.range(*term[1:]))
+        elif term[0] == "equal":
+            candidates.append(index.equal(*term[1:]))
+        else:
+            _, place, radius = term
+            if isinstance(place, str):
+                import geocoding
+                from geopy.exc import GeopyError
+                try:
+                    coords = geocoding.geocode(place)
+                except GeopyError as error:
+                    raise ValueError(f"The place '{place}' could not be looked up: {error}") from None
+                if coords is None:
+                    raise ValueError(f"The place '{place}' was not found")
+                place = coords
+            candidates.append(spatial.get_index().radius(place[0], place[1], radius))
+
+    # Intersect them, the smallest sets first
+    image_ids = index.ids
+    for ids in sorted(candidates, key = len):
+        image_ids = np.intersect1d(image_ids, ids, assume_unique = True)
+        if not len(image_ids):
+            return []
+    return image_ids.tolist()
+
+def search(picker = False):
+    """ Asks the user for a query and displays the matching images in a diaporama or panorama.
+
+    Parameters
+    ----------
+    picker : bool
+        specify if the images can be picked or not on the display.
+    """
+    while True:
+        text = input("Enter a query (Example: date:2019-01..2019-06 event:Japan mp>12 near:\"Kyoto\" 50km)"
+                     " or Q/Quit:\n").strip()
+        print()
+        if text.lower() in ["q", "quit"]:
+            raise SystemExit
+        try:
+            image_ids = find_images(text)
+        except ValueError as error:
+            print(f"Error! {error}\n")
+            continue
+        print(f"{len(image_ids)} images found\n")
+        if image_ids:
+            break
+
+    import display_images
+    display_images.display(picker, images = image_ids)
@@ -0,0 +1,325 @@
+"""
+Module to edit images non-destructively with edit recipes.
+
+A recipe is the ordered list of the edit operations of an image, stored as JSON
+in the "Recipe" column of the image database. The original file is never
+rewritten: recipes are rendered on a downscaled copy of the image for the
+previews and the display, and at full resolution only when the edited image is
+exported. An operation is a tuple:
+    ("filter", name)              name in FILTERS
+    ("enhance", name, factor)     name in ENHANCERS
+    ("rotate", degrees)           degrees in ROTATIONS (counter-clockwise)
+
+Classes
+-------
+RecipeRenderer
+    Renderer of recipes keeping the intermediate results of recipe prefixes.
+
+Functions
+---------
+fuse
+    Function to merge consecutive rotations of a recipe into one.
+
+apply_recipe
+    Function to apply the operations of a recipe to an image.
+
+get_recipe
+    Function to get the recipe of an image of the database.
+
+set_recipe
+    Function to store the recipe of an image in the database.
+
+set_recipes
+    Function to store the recipes of several images in the database at once.
+
+render
+    Function to render the preview of a recipe for an image of the database.
+
+copy_name
+    Function to get the name of a new edited copy of an image.
+
+export
+    Function to render a recipe at full resolution and save it as a new file.
+"""
+import os
+import json
+from collections import OrderedDict
+import config
+import catalog
+import tiling
+import thumbnails
+from metadata_reader import orient
+from storage import atomic_file
+from PIL import (Image, ImageEnhance, ImageFilter)
+
+FILTERS = {"contour": ImageFilter.CONTOUR,
+           "edge": ImageFilter.EDGE_ENHANCE,
+           "blur": ImageFilter.BLUR,
+           "detail": ImageFilter.DETAIL}
+ENHANCERS = {"sharpness": ImageEnhance.Sharpness,
+             "brightness": ImageEnhance.Brightness,
+             "color": ImageEnhance.Color,
+             "contrast": ImageEnhance.Contrast}
+ROTATIONS = {90: Image.Transpose.ROTATE_90,
+             180: Image.Transpose.ROTATE_180,
+             270: Image.Transpose.ROTATE_270}
+
+def fuse(operations):
+    """ Merges consecutive rotations into a single one (or none for a full turn).
+
+    Parameters
+    ----------
+    operations : list
+        the operations of the recipe.
+
+    Returns
+    -------
+    list
+        the operations (as tuples) with at most one rotation between two other operations.
+    """
+    fused = []
+    for operation in operations:
+        operation = tuple(operation)
+        if operation[0] != "rotate":
+            fused.append(operation)
+            continue
+        angle = operation[1]
+        if fused and fused[-1][0] == "rotate":
+            angle += fused.pop()[1]
+        if angle % 360:
+            fused.append(("rotate", angle % 360))
+    return fused
+
+def apply_operation(image, operation):
+    """ Applies one operation of a recipe to an image.
+    Filters and enhancements of images larger than config.tile_threshold pixels
+    are applied tile by tile to limit the memory used.
+    """
+    large = image.size[0] * image.size[1] > config.tile_threshold
+    if operation[0] == "filter":
+        if large:
+            return tiling.filter_tiled(image, FILTERS[operation[1]], config.tile_size, config.tile_workers)
+        return image.filter(FILTERS[operation[1]])
+    if operation[0] == "enhance":
+        if large:
+            return tiling.enhance_tiled(image, ENHANCERS[operation[1]], operation[2],
+                                        config.tile_size, config.tile_workers)
+        return ENHANCERS[operation[1]](image).enhance(operation[2])
+    if operation[0] == "rotate":
+        return image.transpose(ROTATIONS[operation[1]])
+    raise ValueError(f"Unknown edit operation: {operation}")
+
+def apply_recipe(image, operations):
+    """ Applies the operations of a recipe to an image.
+
+    Parameters
+    ----------
+    image : PIL.Image
+        the image (original or downscaled).
+    operations : list
+        the operations of the recipe.
+
+    Returns
+    -------
+    PIL.Image
+        the edited image.
+    """
+    for operation in fuse(operations):
+        image = apply_operation(image, operation)
+    return image
+
+class RecipeRenderer():
+    """ Renders recipes and keeps the intermediate results of the last recipe prefixes,
+    so adding an operation to a recipe only applies that operation.
+
+    Attributes
+    ----------
+    capacity : int
+        the maximum number of intermediate results kept in memory.
+    results : OrderedDict
+        the results by (image path, modification time, scale, recipe prefix),
+        least recently used first.
+    """
+
+    def __init__(self, capacity = config.recipe_cache_size):
+        self.capacity = capacity
+        self.results = OrderedDict()
+
+    def store(self, key, image):
+        """ Keeps an intermediate result and forgets the least recently used ones.
+        """
+        self.results[key] = image
+        self.results.move_to_end(key)
+        while len(self.results) > self.capacity:
+            self.results.popitem(last = False)
+
+    def render(self, image_path, operations, scale = config.recipe_preview_scale):
+        """ Renders a recipe on an image.
+
+        Parameters
+        ----------
+        image_path : str
+            the path to the original image.
+        operations : list
+            the operations of the recipe.
+        scale : int
+            the downscaling factor (1 for full resolution, not kept in memory).
+            The image is first turned as given by its exif orientation.
+
+        Returns
+        -------
+        PIL.Image
+            the edited image.
+        """
+        operations = fuse(operations)
+        if scale == 1:
+            with Image.open(image_path) as image:
+                image.load()
+                return apply_recipe(orient(image), operations)
+
+        # Start from the longest prefix of the recipe already rendered
+        base_key = (image_path, os.stat(image_path).st_mtime_ns, scale)
+        for done in range(len(operations), -1, -1):
+            image = self.results.get(base_key + (tuple(operations[:done]),))
+            if image is not None:
+                self.results.move_to_end(base_key + (tuple(operations[:done]),))
+                break
+        else:
+            done = 0
+            image = thumbnails.get_thumbnail(image_path, scale)
+            self.store(base_key + ((),), image)
+
+        for index in range(done, len(operations)):
+            image = apply_operation(image, operations[index])
+            self.store(base_key + (tuple(operations[:index + 1]),), image)
+        return image
+
+# Renderer used by the module functions, created when first needed
+default_renderer = None
+
+def get_renderer():
+    """ Returns the renderer of the edit previews.
+    """
+    global default_renderer
+    if default_renderer is None:
+        default_renderer = RecipeRenderer()
+    return default_renderer
+
+def get_recipe(image_id):
+    """ Returns the recipe of an image of the database.
+
+    Parameters
+    ----------
+    image_id : int
+        the ID of the image.
+
+    Returns
+    -------
+    list
+        the operations of the recipe (empty if the image was not edited).
+    """
+    if "Recipe" not in config.DB.columns:
+        return []
+    recipe = config.DB.loc[image_id, "Recipe"]
+    if not isinstance(recipe, str) or recipe == "":
+        return []
+    return fuse(json.loads(recipe))
+
+def set_recipe(image_id, operations):
+    """ Stores the recipe of an image in the database (the original file is not changed).
+
+    Parameters
+    ----------
+    image_id : int
+        the ID of the image.
+    operations : list
+        the operations of the recipe.
+    """
+    set_recipes({image_id: operations})
+
+def set_recipes(image_recipes):
+    """ Stores the recipes of several images in the database with a single write.
+
+    Parameters
+    ----------
+    image_recipes : dict
+        the operations of the recipe by image ID.
+    """
+    if "Recipe" not in config.DB.columns:
+        config.DB["Recipe"] = None
+    for image_id, operations in image_recipes.items():
+        operations = fuse(operations)
+        config.DB.loc[image_id, "Recipe"] = json.dumps(operations) if operations else None
+        config.DB.loc[image_id, "Edited"] = bool(operations)
+    config.STORAGE.save_rows(config.DB, list(image_recipes))
+
+def copy_name(image_id, taken = ()):
+    """ Returns the file name of a new edited copy of an image: name_2.jpg, name_3.jpg, ...
+
+    Parameters
+    ----------
+    image_id : int
+        the ID of the original image.
+    taken : set
+        other file names of the event that cannot be used (besides the images of the database).
+
+    Returns
+    -------
+    str
+        the first file name not used in the event of the image.
+    """
+    event = config.DB.at[image_id, "Event"]
+    name_components = config.DB.at[image_id, "Filename"].split(".")
+    edited_image_name = name_components[0] + "_2." + name_components[1]
+    duplicate = 3
+    while catalog.find_image(event, edited_image_name) is not None or edited_image_name in taken:
+        edited_image_name = name_components[0] + f"_{duplicate}." + name_components[1]
+        duplicate += 1
+    return edited_image_name
+
+def original_path(image_id):
+    """ Returns the path to the original file of an image of the database.
+    """
+    return catalog.image_path(image_id)
+
+def render(image_id, operations, scale = config.recipe_preview_scale):
+    """ Renders a recipe on a downscaled copy of an image for a preview.
+
+    Parameters
+    ----------
+    image_id : int
+        the ID of the image.
+    operations : list
+        the operations of the recipe.
+    scale : int
+        the downscaling factor of the preview.
+
+    Returns
+    -------
+    PIL.Image
+        the edited image.
+    """
+    return get_renderer().render(original_path(image_id), operations, scale)
+
+def export(image_id, operations, output_path):
+    """ Renders a recipe at full resolution from the original and saves it.
+
+    Parameters
+    ----------
+    image_id : int
+        the ID of the original image.
+    operations : list
+        the operations of the recipe.
+    output_path : str
+        the path of the new file.
+
+    Returns
+    -------
+    PIL.Image
+        the edited image.
+    """
+    edited_image = get_renderer().render(original_path(image_id), operations, scale = 1)
+    image_format = Image.registered_extensions().get(os.path.splitext(output_path)[1].lower())
+    with atomic_file(output_path) as file:
+        edited_image.save(file, image_format, quality = 95)
+    return edited_image
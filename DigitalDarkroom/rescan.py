@@ -0,0 +1,261 @@
+"""
+Module to reconcile the image database with the files of the Images folder.
+
+The event folders are listed with os.scandir and the size and modification time
+of each file are compared with the Size and Mtime columns of the database, so
+the metadata is only extracted again for new or changed files. The rows of
+missing files are removed in one write.
+
+Functions
+---------
+file_signature
+    Function to get the size and modification time of a file.
+
+update_signatures
+    Function to store the size and modification time of images in the database.
+
+is_image_file
+    Function to check if a file name has the extension of an image format.
+
+scan_library
+    Function to list the images of the event folders with their size and modification time.
+
+rescan
+    Function to update the database with the new, changed, moved and deleted files.
+
+rescan_library
+    Function to rescan the Images folder and print a summary for the user.
+"""
+import os
+import numpy as np
+import pandas as pd
+import config
+import catalog
+import hashing
+import query
+from concurrent.futures import ThreadPoolExecutor
+from PIL import (Image, UnidentifiedImageError)
+
+# Columns of the database read from the file (the others are set by the user)
+FILE_COLUMNS = ["Format", "Width", "Height", "Megapixels", "Channels", "Mode", "Timestamp",
+                "Creation", "Date_Time", "Date", "Size", "Mtime", "Hash", "DHash"]
+
+def file_signature(path):
+    """ Returns the size in bytes and the modification time (seconds) of a file.
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+def update_signatures(image_ids):
+    """ Stores the size and modification time of the files of images in config.DB
+    after they are written, and clears their hashes (computed again when
+    duplicates are searched). The rows are not saved to the storage.
+
+    Parameters
+    ----------
+    image_ids : list
+        the IDs of the images.
+    """
+    image_ids = list(image_ids)
+    if not image_ids:
+        return
+    signatures = [file_signature(catalog.image_path(image_id)) for image_id in image_ids]
+    for column in ("Size", "Mtime"):
+        if column not in config.DB.columns:
+            config.DB[column] = np.nan
+    config.DB.loc[image_ids, ["Size", "Mtime"]] = signatures
+    for column in ("Hash", "DHash"):
+        if column in config.DB.columns:
+            config.DB.loc[image_ids, column] = None
+
+def is_image_file(filename):
+    """ Returns True if the file name has the extension of an image format known to PIL.
+    Hidden files and the temporary files of interrupted writes are ignored.
+    """
+    if filename.startswith("."):
+        return False
+    return os.path.splitext(filename)[1].lower() in Image.registered_extensions()
+
+def scan_library(images_path, events = None):
+    """ Lists the image files of the event folders (one level under images_path).
+
+    Parameters
+    ----------
+    images_path : str
+        the path to the Images folder.
+    events : list
+        the names of the event folders to list (default: all).
+
+    Returns
+    -------
+    pandas.DataFrame
+        the Event, Filename, Size and Mtime of each file.
+    """
+    names, folders, sizes, mtimes = [], [], [], []
+    with os.scandir(images_path) as event_entries:
+        for event_entry in event_entries:
+            if not event_entry.is_dir() or event_entry.name.startswith("."):
+                continue
+            if events is not None and event_entry.name not in events:
+                continue
+            with os.scandir(event_entry.path) as entries:
+                for entry in entries:
+                    if not entry.is_file() or not is_image_file(entry.name):
+                        continue
+                    stat = entry.stat()
+                    names.append(entry.name)
+                    folders.append(event_entry.name)
+                    sizes.append(stat.st_size)
+                    mtimes.append(stat.st_mtime)
+    return pd.DataFrame({"Event": folders, "Filename": names, "Size": sizes, "Mtime": mtimes})
+
+def rescan(images_path = None, events = None, workers = config.ingest_workers):
+    """ Updates the image database with the files of the Images folder.
+
+    New files are added, the metadata of changed files is extracted again
+    (keeping the location, edits and other columns set by the user), files moved
+    to another event folder (same name and signature or content hash) keep their
+    ID and get their new event, and the rows of missing files are removed. Rows without a stored size and modification
+    time (databases created before these columns) only get them: their metadata
+    is kept.
+
+    Parameters
+    ----------
+    images_path : str
+        the path to the Images folder (default: config.images_path).
+    events : list
+        the names of the events to reconcile (default: all). Only the rows of
+        these events and the rows of files moved into their folders are compared.
+    workers : int
+        the number of threads extracting the metadata of new and changed files.
+
+    Returns
+    -------
+    dict
+        the paths (Event/Filename) of the images added, updated, moved and
+        removed, and of the files skipped because they could not be read.
+    """
+    from ingest import IngestSession
+    from organise_images import image_metadata
+
+    if images_path is None:
+        images_path = config.images_path
+    scanned = scan_library(images_path, events)
+    files = pd.MultiIndex.from_arrays([scanned["Event"], scanned["Filename"]])
+    for column in ("Size", "Mtime"):
+        if column not in config.DB.columns:
+            config.DB[column] = np.nan
+    stored = config.DB[["Event", "Filename", "Size", "Mtime"]]
+    if events is not None:
+
+        # Rows of other events can only be images moved into the scanned folders
+        in_events = stored["Event"].isin(list(events)).to_numpy()
+        elsewhere = ~in_events & stored["Filename"].isin(scanned["Filename"]).to_numpy()
+        elsewhere[elsewhere] = [not os.path.isfile(os.path.join(images_path, event, filename)) for event, filename
+                                in zip(stored["Event"][elsewhere], stored["Filename"][elsewhere])]
+        stored = stored[in_events | elsewhere]
+
+    # Rows and files with the same event and file name (unique keys, looked up in a hash table)
+    positions = files.get_indexer(pd.MultiIndex.from_arrays([stored["Event"], stored["Filename"]]))
+    found = positions >= 0
+    matched = dict(zip(stored.index[found], positions[found].tolist()))
+    new = np.setdiff1d(np.arange(len(scanned)), positions[found]).tolist()
+
+    # A new file is a moved image if a missing row has the same file name and the same
+    # signature or content hash (cameras give the same names to different images)
+    vanished = stored[~found]
+    candidates = {}
+    for image_id, filename in zip(vanished.index, vanished["Filename"]):
+        candidates.setdefault(filename, []).append(image_id)
+    new_files = []
+    for position in new:
+        image_ids = candidates.get(scanned["Filename"].iat[position])
+        same = []
+        if image_ids:
+            signature = (scanned["Size"].iat[position], scanned["Mtime"].iat[position])
+            same = [image_id for image_id in image_ids
+                    if (vanished.at[image_id, "Size"], vanished.at[image_id, "Mtime"]) == signature]
+            hashes = config.DB.loc[image_ids, "Hash"] if "Hash" in config.DB.columns else pd.Series(dtype = object)
+            if not same and hashes.map(lambda value: isinstance(value, str)).any():
+                try:
+                    hash_value = hashing.content_hash(os.path.join(images_path, scanned["Event"].iat[position],
+                                                                   scanned["Filename"].iat[position]))
+                except OSError:
+                    hash_value = None
+                same = list(hashes.index[hashes == hash_value])
+        if not same:
+            new_files.append(position)
+            continue
+        image_ids.remove(same[0])
+        matched[same[0]] = position
+
+    old = stored.loc[list(matched)]
+    now = scanned.iloc[list(matched.values())]
+    now.index = old.index
+    old_size = pd.to_numeric(old["Size"], errors = "coerce")
+    old_mtime = pd.to_numeric(old["Mtime"], errors = "coerce")
+    unsigned = old_size.isna() | old_mtime.isna()
+    changed = ~unsigned & ((old_size != now["Size"]) | (old_mtime != now["Mtime"]))
+    moved = old["Event"] != now["Event"]
+
+    # Extract the metadata of the new and changed files in parallel
+    def path(position):
+        return os.path.join(scanned["Event"].iat[position], scanned["Filename"].iat[position])
+    to_read = new_files + [matched[image_id] for image_id in old.index[changed]]
+    def read(position):
+        event_path = os.path.join(images_path, scanned["Event"].iat[position])
+        filename = scanned["Filename"].iat[position]
+        try:
+            return image_metadata(os.path.join(event_path, filename), event_path, filename)
+        except (UnidentifiedImageError, OSError, ValueError) as error:
+            print(f"Error! {path(position)} could not be read: {error}")
+            return None
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        rows = dict(zip(to_read, pool.map(read, to_read)))
+    skipped = [path(position) for position, row in rows.items() if row is None]
+
+    # Update the existing rows in one write
+    updated = [image_id for image_id in old.index[changed] if rows[matched[image_id]] is not None]
+    for image_id in updated:
+        row = rows[matched[image_id]]
+        config.DB.loc[image_id, FILE_COLUMNS] = [row.get(column, np.nan) for column in FILE_COLUMNS]
+    adopted = list(old.index[unsigned])
+    config.DB.loc[adopted, ["Size", "Mtime"]] = now.loc[adopted, ["Size", "Mtime"]].to_numpy()
+    moved = list(old.index[moved & (~changed | old.index.isin(updated))])
+    config.DB.loc[moved, "Event"] = now.loc[moved, "Event"].to_numpy()
+    changes = sorted(set(updated) | set(adopted) | set(moved))
+    if changes:
+        config.STORAGE.save_rows(config.DB, changes)
+        catalog.refresh(moved)
+        hashing.refresh_hashes(updated)
+        query.invalidate()
+
+    # Add the new images in checkpoints, as an upload (before the removals: the IDs of
+    # removed images are not given again)
+    added = [position for position in new_files if rows[position] is not None]
+    with IngestSession() as session:
+        for position in added:
+            session.add(scanned["Filename"].iat[position], rows[position])
+
+    # Remove the rows of missing files in one write
+    removed = [image_id for image_id in vanished.index if image_id not in matched]
+    removed_paths = [catalog.label(image_id) for image_id in removed]
+    if removed:
+        config.DB = config.DB.drop(index = removed)
+        config.STORAGE.delete_rows(config.DB, removed)
+
+    return {"added": [path(position) for position in added],
+            "updated": [catalog.label(image_id) for image_id in updated],
+            "moved": [catalog.label(image_id) for image_id in moved],
+            "removed": removed_paths, "skipped": skipped}
+
+def rescan_library():
+    """ Rescans the Images folder and prints what changed in the database.
+    """
+    print("Scanning the images...\n")
+    result = rescan()
+    print(f"{len(result['added'])} new images added, {len(result['updated'])} changed images updated, "
+          f"{len(result['moved'])} images moved to another event, {len(result['removed'])} missing images removed.")
+    for path in result["skipped"]:
+        print(f"Skipped: {path}")
+    print()
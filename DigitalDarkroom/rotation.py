@@ -0,0 +1,168 @@
+"""
+Module to rotate image files without re-encoding JPEG images.
+
+A JPEG image is rotated by changing its exif orientation tag: the compressed
+data is not touched, so the rotation is lossless and only writes a few bytes
+(the 2 bytes of the tag when it exists, otherwise the Exif segment). Other
+formats are rotated by transposing their pixels.
+
+Functions
+---------
+compose_orientation
+    Function to get the exif orientation of an image after a rotation.
+
+set_jpeg_orientation
+    Function to write the exif orientation of a JPEG file.
+
+rotate_file
+    Function to rotate an image file (losslessly for JPEG images).
+
+rotate_images
+    Function to rotate images of the database and update their size (as displayed).
+"""
+import struct
+import config
+import catalog
+import thumbnails
+from storage import atomic_file
+from rescan import update_signatures
+from PIL import Image
+from metadata_reader import (ORIENTATION, EXIF_IFD, GPS_IFD, read_metadata, orient, displayed_size)
+
+# PIL transpositions of the counter-clockwise rotations
+ROTATIONS = {90: Image.Transpose.ROTATE_90,
+             180: Image.Transpose.ROTATE_180,
+             270: Image.Transpose.ROTATE_270}
+
+def compose_orientation(orientation, degrees):
+    """ Returns the exif orientation displaying an image rotated by some degrees.
+
+    Parameters
+    ----------
+    orientation : int
+        the current exif orientation (1 to 8).
+    degrees : int
+        the counter-clockwise rotation (90, 180 or 270).
+
+    Returns
+    -------
+    int
+        the new exif orientation.
+    """
+    # Compare the orientations on a small image whose pixels are all different
+    sample = Image.frombytes("L", (3, 2), bytes(range(6)))
+    target = orient(sample, orientation).transpose(ROTATIONS[degrees])
+    for candidate in range(1, 9):
+        turned = orient(sample, candidate)
+        if turned.size == target.size and turned.tobytes() == target.tobytes():
+            return candidate
+    raise ValueError(f"Invalid orientation: {orientation}")
+
+def set_jpeg_orientation(path, orientation, metadata = None):
+    """ Writes the exif orientation of a JPEG file without touching the image data.
+
+    Parameters
+    ----------
+    path : str
+        the path to the JPEG file.
+    orientation : int
+        the exif orientation (1 to 8).
+    metadata : dict
+        the metadata of the file from metadata_reader.read_metadata (read if not given).
+    """
+    if metadata is None:
+        metadata = read_metadata(path)
+
+    # Overwrite the value of the existing tag
+    if metadata["orientation_offset"] is not None:
+        byte_order = {b"II": "<", b"MM": ">"}[metadata["byte_order"]]
+        with open(path, "r+b") as file:
+            file.seek(metadata["orientation_offset"])
+            file.write(struct.pack(byte_order + "H", orientation))
+        return
+
+    # Otherwise write a new Exif segment with the tag (keeping the other tags)
+    with Image.open(path) as image:
+        exif = image.getexif()
+        for pointer in (EXIF_IFD, GPS_IFD):
+            if pointer in exif:
+                exif.get_ifd(pointer)
+    exif[ORIENTATION] = orientation
+    payload = exif.tobytes()
+    segment = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+    with open(path, "rb") as file:
+        data = file.read()
+    position = 2
+    while data[position] == 0xFF and data[position + 1] not in (0xDA, 0xD9):
+        length = struct.unpack(">H", data[position + 2:position + 4])[0]
+
+        # Replace the old Exif segment or insert the new one after the JFIF header
+        if data[position + 1] == 0xE1 and data[position + 4:position + 10] == b"Exif\0\0":
+            with atomic_file(path) as file:
+                file.write(data[:position] + segment + data[position + 2 + length:])
+            return
+        if data[position + 1] != 0xE0:
+            break
+        position += 2 + length
+    with atomic_file(path) as file:
+        file.write(data[:position] + segment + data[position:])
+
+def rotate_file(path, degrees):
+    """ Rotates an image file, losslessly for JPEG images (exif orientation).
+
+    Parameters
+    ----------
+    path : str
+        the path to the image.
+    degrees : int
+        the counter-clockwise rotation (90, 180 or 270).
+    """
+    metadata = read_metadata(path)
+    if metadata["format"] in ("JPEG", "MPO"):
+        set_jpeg_orientation(path, compose_orientation(metadata["orientation"], degrees), metadata)
+        return
+
+    # Other formats: transpose the pixels and save in the same format
+    with Image.open(path) as image:
+        image.load()
+        rotated = image.transpose(ROTATIONS[degrees])
+        with atomic_file(path) as file:
+            rotated.save(file, image.format, exif = image.getexif())
+
+def rotate_images(image_ids, degrees):
+    """ Rotates the files of images of the database and updates their size with one write.
+
+    Parameters
+    ----------
+    image_ids : list
+        the IDs of the images.
+    degrees : int
+        the counter-clockwise rotation (90, 180 or 270).
+
+    Returns
+    -------
+    list
+        the IDs of the rotated images.
+    """
+    rotated = []
+    sizes = []
+    for image_id in image_ids:
+        path = catalog.image_path(image_id)
+        try:
+            rotate_file(path, degrees)
+
+            # The size as displayed, read from the rotated file (the stored size may not be up to date)
+            sizes.append(displayed_size(read_metadata(path)))
+        except (OSError, ValueError) as error:
+            print(f"Error! {catalog.label(image_id)} could not be rotated: {error}")
+            continue
+        thumbnails.invalidate(path)
+        rotated.append(image_id)
+
+    if rotated:
+        config.DB.loc[rotated, ["Width", "Height"]] = sizes
+    config.DB.loc[rotated, "Edited"] = True
+    update_signatures(rotated)
+    config.STORAGE.save_rows(config.DB, rotated)
+    return rotated
@@ -1,12 +1,7 @@
+# The program modules are imported when their menu option is chosen,
+# so the menu is displayed without loading pandas, matplotlib, geopandas or geopy
 import os
-import pandas as pd
 import config
-import image_upload as imload 
-import display_images as implay
-import edit_images as imedit
-import organise_images as imchange
-import visualise_map as immap
-import organise_images as imchange
 import zenDD
 
 # Define constant global variables for program paths
@@ -24,6 +19,7 @@ try:
     
 except ModuleNotFoundError:
     print('Welcome to Digital Darkroom!!!\n\n')
+    figlet = False
 
 # Start the program
 try:
@@ -34,56 +30,103 @@ try:
         print("What do you want to do?")
         next_task = input("- Upload new images in Digital Darkroom => type 'U' or 'upload'\n"
                           "- View your images stored in Digital Darkroom => type 'V' or 'view'\n"
+                          "- Export the contact sheets of an event => type 'S' or 'sheets'\n"
                           "- Edit an image stored in one of your event folders => type 'E' or 'edit'\n"
+                          "- Look up images by date, event, place or camera => type 'L' or 'lookup'\n"
                           "- Locate your images on the world map => type 'M' or 'map''\n"
                           "- See the geographical heatmap of your images => 'H' or 'heatmap'\n"
                           "- Change information of an event or image => type 'C' or 'change'\n"
                           "- Delete events or images => type 'D' or 'delete'\n"
+                          "- Find duplicate and near-duplicate images => type 'F' or 'find-duplicates'\n"
+                          "- Rescan the Images folder for added, changed or removed files => type 'R' or 'rescan'\n"
+                          "- Watch the drop folders and the Images folder for new images => type 'W' or 'watch'\n"
                           "- Quit the program => type 'Q' or 'quit'\n").lower().strip()
         print()
 
         if next_task in ["u", "upload"]:
             try:
+                import image_upload as imload
                 imload.upload_images()
             except SystemExit:
                 pass
 
         elif next_task in ["v", "view"]:
             try:
+                import display_images as implay
                 implay.display()
             except SystemExit:
                 pass
 
+        elif next_task in ["l", "lookup"]:
+            try:
+                import query as imquery
+                imquery.search()
+            except SystemExit:
+                pass
+
+        elif next_task in ["s", "sheets"]:
+            try:
+                import contact_sheet as imsheet
+                imsheet.export_contact_sheets()
+            except SystemExit:
+                pass
+
         elif next_task in ["e", "edit"]:
             try:
+                import edit_images as imedit
                 imedit.select_image()
             except SystemExit:
                 pass
 
         elif next_task in ["c", "change"]:
             try:
+                import organise_images as imchange
                 imchange.change_info()
             except SystemExit:
                 pass
 
         elif next_task in ["m", "map"]:
             try:
+                import visualise_map as immap
                 immap.plot_locations()
             except SystemExit:
                 pass
 
         elif next_task in ["h", "heatmap"]:
             try:
+                import visualise_map as immap
                 immap.plot_geo_heatmap()
             except SystemExit:
                 pass
 
         elif next_task in ["d", "delete"]:
             try:
+                import organise_images as imchange
                 imchange.delete()
             except SystemExit:
                 pass
 
+        elif next_task in ["f", "find-duplicates"]:
+            try:
+                import hashing as imhash
+                imhash.report_duplicates()
+            except SystemExit:
+                pass
+
+        elif next_task in ["r", "rescan"]:
+            try:
+                import rescan as imscan
+                imscan.rescan_library()
+            except SystemExit:
+                pass
+
+        elif next_task in ["w", "watch"]:
+            try:
+                import watch as imwatch
+                imwatch.watch()
+            except SystemExit:
+                pass
+
         elif next_task in ["q", "quit"]:
             quit = True
 
@@ -93,8 +136,9 @@ try:
             else:
                 print("Bye, Bye!\n\n")
 
-            # Save the image DB
-            config.DB.to_pickle(os.path.join(config.program_path, "image_DB.pkl"))
+            # Save the image DB (if it has been used)
+            if config.is_loaded():
+                config.STORAGE.flush(config.DB)
 
         else:
             print("Error! Please enter one of the valid options as displayed...")
@@ -0,0 +1,282 @@
+"""
+Module to find the images located in an area of the world map.
+
+The images with coordinates are indexed in a grid of cells of config.spatial_cell
+degrees. The points are kept in numpy arrays sorted by cell, so a bounding box
+is a few binary searches (one per row of cells) and only the points of its cells
+are compared with the coordinates. A radius query looks up the bounding box of
+the circle, then keeps the points within the great-circle distance.
+
+Changed coordinates are recorded without sorting the arrays again: the points
+moved or removed are masked and the new ones are kept in a small list that is
+scanned by the queries, until it is merged into the sorted arrays. The index is
+built again when config.DB is replaced or changes size; code that sets
+coordinates in place (or adds images) calls refresh with their IDs.
+
+Classes
+-------
+SpatialIndex
+    Grid index of the coordinates of images.
+
+Functions
+---------
+haversine
+    Function to get the great-circle distances between coordinates.
+
+coordinates
+    Function to get the IDs and coordinates of the geotagged images of a database.
+
+get_index
+    Function to get the spatial index of config.DB.
+
+refresh
+    Function to record the new or changed coordinates of images in the index.
+"""
+import numpy as np
+import pandas as pd
+import config
+
+# Mean radius of the Earth in kilometres
+EARTH_RADIUS = 6371.0088
+
+def haversine(latitude, longitude, latitudes, longitudes):
+    """ Returns the great-circle distances in km between a point and arrays of coordinates (degrees).
+    """
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    latitudes, longitudes = np.radians(latitudes), np.radians(longitudes)
+    a = (np.sin((latitudes - latitude) / 2) ** 2
+         + np.cos(latitude) * np.cos(latitudes) * np.sin((longitudes - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def coordinates(db, image_ids = None):
+    """ Returns the IDs, latitudes and longitudes (numpy arrays) of the images of a
+    database with valid coordinates (all the images, or the given ones).
+    """
+    if "Latitude" not in db.columns or "Longitude" not in db.columns:
+        return np.array([], dtype = np.int64), np.array([]), np.array([])
+    rows = db[["Latitude", "Longitude"]] if image_ids is None else db.loc[list(image_ids), ["Latitude", "Longitude"]]
+    latitudes = pd.to_numeric(rows["Latitude"], errors = "coerce").to_numpy(dtype = float)
+    longitudes = pd.to_numeric(rows["Longitude"], errors = "coerce").to_numpy(dtype = float)
+    valid = (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+    return rows.index.to_numpy(dtype = np.int64)[valid], latitudes[valid], longitudes[valid]
+
+class SpatialIndex():
+    """ Grid index of the coordinates of images.
+
+    Attributes
+    ----------
+    cell : float
+        the size of the cells in degrees.
+    ids, latitudes, longitudes, keys : numpy.ndarray
+        the sorted points: IDs, coordinates and cell numbers (sorted by cell).
+    positions : dict
+        the position of each ID in the sorted arrays.
+    removed : set
+        the IDs of the sorted points that were moved or removed since the last merge.
+    pending : dict
+        the (latitude, longitude) of the points added or moved since the last merge.
+    merge_size : int
+        the number of changes after which the pending points are merged into the sorted arrays.
+    db : pandas.DataFrame
+        the database the index is up to date with.
+    length : int
+        the number of images of the database.
+    """
+
+    def __init__(self, image_ids = (), latitudes = (), longitudes = (), cell = config.spatial_cell,
+                 merge_size = 1024):
+        self.cell = cell
+        self.rows = int(np.ceil(180 / cell))
+        self.columns = int(np.ceil(360 / cell))
+        self.merge_size = merge_size
+        self.db = None
+        self.length = 0
+        self.build(np.asarray(image_ids, dtype = np.int64), np.asarray(latitudes, dtype = float),
+                   np.asarray(longitudes, dtype = float))
+
+    @classmethod
+    def from_db(cls, db, **kwargs):
+        """ Returns the spatial index of the images of a database with coordinates.
+        """
+        index = cls(*coordinates(db), **kwargs)
+        index.db = db
+        index.length = len(db)
+        return index
+
+    def cell_keys(self, latitudes, longitudes):
+        """ Returns the cell numbers (row * columns + column) of coordinates.
+        """
+        rows = np.minimum(((np.asarray(latitudes) + 90) // self.cell).astype(np.int64), self.rows - 1)
+        columns = np.minimum(((np.asarray(longitudes) + 180) // self.cell).astype(np.int64), self.columns - 1)
+        return rows * self.columns + columns
+
+    def build(self, image_ids, latitudes, longitudes):
+        """ Sorts the points by cell (the pending and removed points are cleared).
+        """
+        keys = self.cell_keys(latitudes, longitudes)
+        order = np.argsort(keys, kind = "stable")
+        self.ids, self.latitudes, self.longitudes, self.keys = (image_ids[order], latitudes[order],
+                                                                longitudes[order], keys[order])
+        self.positions = dict(zip(self.ids.tolist(), range(len(self.ids))))
+        self.removed = set()
+        self.pending = {}
+        self.pending_arrays = None
+
+    def __len__(self):
+        return len(self.ids) - len(self.removed) + len(self.pending)
+
+    def update(self, image_ids, latitudes, longitudes):
+        """ Records the new coordinates of images (NaN: the image has no coordinates anymore).
+        """
+        for image_id, latitude, longitude in zip(image_ids, latitudes, longitudes):
+            image_id = int(image_id)
+            if image_id in self.positions:
+                self.removed.add(image_id)
+            self.pending.pop(image_id, None)
+            if abs(latitude) <= 90 and abs(longitude) <= 180:
+                self.pending[image_id] = (float(latitude), float(longitude))
+        self.pending_arrays = None
+        if len(self.pending) + len(self.removed) > self.merge_size:
+            self.merge()
+
+    def merge(self):
+        """ Merges the pending points into the sorted arrays.
+        """
+        kept = np.ones(len(self.ids), dtype = bool)
+        kept[[self.positions[image_id] for image_id in self.removed]] = False
+        pending_ids, pending_latitudes, pending_longitudes = self.pending_points()
+        self.build(np.concatenate([self.ids[kept], pending_ids]),
+                   np.concatenate([self.latitudes[kept], pending_latitudes]),
+                   np.concatenate([self.longitudes[kept], pending_longitudes]))
+
+    def pending_points(self):
+        """ Returns the IDs, latitudes and longitudes of the pending points as numpy arrays.
+        """
+        if self.pending_arrays is None:
+            self.pending_arrays = (np.fromiter(self.pending, dtype = np.int64, count = len(self.pending)),
+                                   np.array([point[0] for point in self.pending.values()], dtype = float),
+                                   np.array([point[1] for point in self.pending.values()], dtype = float))
+        return self.pending_arrays
+
+    def candidates(self, south, west, north, east):
+        """ Returns the IDs and coordinates of the points of the cells of a bounding box
+        (west > east: the box crosses the antimeridian), including the pending points.
+        """
+        first_row = int(min(max((south + 90) // self.cell, 0), self.rows - 1))
+        last_row = int(min(max((north + 90) // self.cell, 0), self.rows - 1))
+        spans = [(west, east)] if west <= east else [(west, 180), (-180, east)]
+        starts, stops = [], []
+        for span_west, span_east in spans:
+            first_column = int(min(max((span_west + 180) // self.cell, 0), self.columns - 1))
+            last_column = int(min(max((span_east + 180) // self.cell, 0), self.columns - 1))
+            rows = np.arange(first_row, last_row + 1) * self.columns
+            starts.append(np.searchsorted(self.keys, rows + first_column, side = "left"))
+            stops.append(np.searchsorted(self.keys, rows + last_column, side = "right"))
+        starts, stops = np.concatenate(starts), np.concatenate(stops)
+        lengths = stops - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        if self.removed:
+            positions = positions[~np.isin(self.ids[positions], np.fromiter(self.removed, dtype = np.int64))]
+        ids, latitudes, longitudes = self.ids[positions], self.latitudes[positions], self.longitudes[positions]
+        if self.pending:
+            pending_ids, pending_latitudes, pending_longitudes = self.pending_points()
+            ids = np.concatenate([ids, pending_ids])
+            latitudes = np.concatenate([latitudes, pending_latitudes])
+            longitudes = np.concatenate([longitudes, pending_longitudes])
+        return ids, latitudes, longitudes
+
+    def bbox(self, south, west, north, east):
+        """ Returns the IDs of the images in a bounding box.
+
+        Parameters
+        ----------
+        south, north : float
+            the latitudes of the bottom and top edges.
+        west, east : float
+            the longitudes of the left and right edges (west > east if the box crosses the antimeridian).
+
+        Returns
+        -------
+        numpy.ndarray
+            the sorted IDs.
+        """
+        ids, latitudes, longitudes = self.candidates(south, west, north, east)
+        inside = (latitudes >= south) & (latitudes <= north)
+        if west <= east:
+            inside &= (longitudes >= west) & (longitudes <= east)
+        else:
+            inside &= (longitudes >= west) | (longitudes <= east)
+        return np.sort(ids[inside])
+
+    def radius(self, latitude, longitude, radius):
+        """ Returns the IDs of the images within a distance of a point.
+
+        Parameters
+        ----------
+        latitude, longitude : float
+            the coordinates of the point (degrees).
+        radius : float
+            the great-circle distance in km.
+
+        Returns
+        -------
+        numpy.ndarray
+            the sorted IDs.
+        """
+        # Bounding box of the circle (all the longitudes near the poles)
+        angle = np.degrees(radius / EARTH_RADIUS)
+        south, north = max(latitude - angle, -90), min(latitude + angle, 90)
+        if south == -90 or north == 90 or np.cos(np.radians(max(abs(south), abs(north)))) * 180 <= angle:
+            west, east = -180, 180
+        else:
+            spread = angle / np.cos(np.radians(max(abs(south), abs(north))))
+            west, east = longitude - spread, longitude + spread
+            if east - west >= 360:
+                west, east = -180, 180
+            else:
+                west = (west + 180) % 360 - 180
+                east = (east + 180) % 360 - 180
+        ids, latitudes, longitudes = self.candidates(south, west, north, east)
+        return np.sort(ids[haversine(latitude, longitude, latitudes, longitudes) <= radius])
+
+# Spatial index of config.DB, built at the first query
+default_index = None
+
+def get_index():
+    """ Returns the spatial index of config.DB (built again if config.DB changed).
+    """
+    global default_index
+    if default_index is None or default_index.db is not config.DB or default_index.length != len(config.DB):
+        default_index = SpatialIndex.from_db(config.DB)
+    return default_index
+
+def refresh(image_ids, previous = None):
+    """ Records the coordinates of images of config.DB in the spatial index (set,
+    changed or removed in place, or new images), so that it is not built again.
+
+    Parameters
+    ----------
+    image_ids : list
+        the IDs of the images of config.DB whose coordinates were set or changed.
+    previous : pandas.DataFrame
+        the database replaced by config.DB when the images were added (optional,
+        the index is only kept if it was up to date with it).
+    """
+    index = default_index
+    if index is None:
+        return
+    if previous is None:
+        if index.db is not config.DB:
+            return
+    elif index.db is not previous or index.length != len(previous):
+        return
+    image_ids = list(image_ids)
+    if "Latitude" in config.DB.columns and "Longitude" in config.DB.columns:
+        rows = config.DB.loc[image_ids, ["Latitude", "Longitude"]]
+        latitudes = pd.to_numeric(rows["Latitude"], errors = "coerce").to_numpy(dtype = float)
+        longitudes = pd.to_numeric(rows["Longitude"], errors = "coerce").to_numpy(dtype = float)
+    else:
+        latitudes = longitudes = np.full(len(image_ids), np.nan)
+    index.update(image_ids, latitudes, longitudes)
+    index.db = config.DB
+    index.length = len(config.DB)
@@ -0,0 +1,491 @@
+"""
+Module to store the image database of DigitalDarkroom.
+
+The database is used in the program as a pandas DataFrame (config.DB) indexed by
+a stable integer ID, with the event and file name of each image in the Event and
+Filename columns (see catalog). A storage backend loads it and persists its changes: the
+original pickle file with a journal of the changes, or an indexed SQLite
+catalogue updated row by row.
+
+Classes
+-------
+PickleStorage
+    Backend storing the database in a pickle file.
+
+SQLiteStorage
+    Backend storing the database in an indexed SQLite catalogue.
+
+Functions
+---------
+index_by_id
+    Function to convert a database indexed by image names to one indexed by IDs.
+
+by_name
+    Function to tell if a journal record was written when the images were indexed by name.
+
+atomic_file
+    Function to write a file through a synced temporary file renamed over it.
+
+open_storage
+    Function to open the SQLite catalogue if it exists, otherwise the pickle file.
+
+migrate
+    Function to copy the pickle database into a new SQLite catalogue (one shot).
+"""
+import os
+import pickle
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+import pandas as pd
+
+# Columns of the image database and their SQLite types
+COLUMNS = {"Filename": "TEXT",
+           "Event": "TEXT",
+           "Format": "TEXT",
+           "Width": "INTEGER",
+           "Height": "INTEGER",
+           "Megapixels": "REAL",
+           "Channels": "INTEGER",
+           "Mode": "TEXT",
+           "Timestamp": "REAL",
+           "Creation": "TEXT",
+           "Date_Time": "TEXT",
+           "Date": "TEXT",
+           "Edited": "INTEGER",
+           "Latitude": "REAL",
+           "Longitude": "REAL",
+           "Location": "TEXT",
+           "Recipe": "TEXT",
+           "Size": "INTEGER",
+           "Mtime": "REAL",
+           "Hash": "TEXT",
+           "DHash": "TEXT"}
+DATE_COLUMNS = {"Date"}
+BOOLEAN_COLUMNS = {"Edited"}
+
+class PickleStorage():
+    """ Storage of the image database in a pickle file.
+
+    The changes of rows are appended to a journal (write-ahead log) next to the
+    pickle file and replayed when the database is loaded. The whole pickle file
+    is only rewritten every `checkpoint_records` changes and when the program
+    quits after changes. It is written to a temporary file, synced and renamed, so an
+    interrupted write never corrupts it, and the previous versions are kept as
+    snapshots (image_DB.pkl.1 being the most recent).
+
+    Attributes
+    ----------
+    path : str
+        the path to the pickle file.
+    journal_path : str
+        the path to the journal of the changes not yet in the pickle file.
+    snapshots : int
+        the number of previous versions of the pickle file kept.
+    checkpoint_records : int
+        the number of journal records after which the pickle file is rewritten.
+    records : int
+        the number of records in the journal.
+    """
+
+    def __init__(self, path, snapshots = 3, checkpoint_records = 1000):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.snapshots = snapshots
+        self.checkpoint_records = checkpoint_records
+        self.records = 0
+
+    def snapshot_path(self, number):
+        """ Returns the path of a snapshot (1 is the most recent).
+        """
+        return f"{self.path}.{number}"
+
+    def load(self):
+        """ Returns the image database as a DataFrame, with the changes of the journal.
+        If the pickle file cannot be read, the most recent readable snapshot is used.
+        The database is empty if there is no pickle file yet (as a new SQLite catalogue).
+        """
+        if not any(os.path.exists(path) for path in
+                   [self.path] + [self.snapshot_path(number) for number in range(1, self.snapshots + 1)]):
+            return self.replay(pd.DataFrame(columns = list(COLUMNS), index = pd.Index([], name = "ID")))
+        try:
+            db = pd.read_pickle(self.path)
+        except Exception as error:
+            for number in range(1, self.snapshots + 1):
+                try:
+                    db = pd.read_pickle(self.snapshot_path(number))
+                except Exception:
+                    continue
+                print(f"The image database could not be read ({error}), "
+                      f"the snapshot {os.path.basename(self.snapshot_path(number))} is used.")
+                break
+            else:
+                raise
+        db = self.replay(db)
+
+        # Databases indexed by the image names get their IDs in memory (always the
+        # same ones), the file is written with them at the next checkpoint
+        if "Filename" not in db.columns:
+            db = index_by_id(db)
+        return db
+
+    def replay(self, db):
+        """ Applies the records of the journal to the database. A torn last record
+        is cut off the journal, so that the next records are appended after the good ones.
+        """
+        self.records = 0
+        if not os.path.exists(self.journal_path):
+            return db
+        torn = False
+        with open(self.journal_path, "rb") as file:
+            end = 0
+            while True:
+                try:
+                    record = pickle.load(file)
+                except EOFError:
+                    break
+                except Exception:
+
+                    # The last record was not completely written (interrupted program)
+                    torn = True
+                    break
+
+                # The records written since the conversion to IDs apply to the converted database
+                if "Filename" not in db.columns and not by_name(record):
+                    db = index_by_id(db)
+                db = apply_record(db, record)
+                self.records += 1
+                end = file.tell()
+        if torn:
+            os.truncate(self.journal_path, end)
+        return db
+
+    def append(self, db, record):
+        """ Writes a record in the journal, or the whole database if the journal is long.
+        """
+        if not os.path.exists(self.path) or self.records + 1 >= self.checkpoint_records:
+            self.save(db)
+            return
+        with open(self.journal_path, "ab") as file:
+            pickle.dump(record, file, protocol = pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        self.records += 1
+
+    def save(self, db):
+        """ Writes the whole database atomically, keeps the previous version as a
+        snapshot and empties the journal.
+        """
+        with atomic_file(self.path) as file:
+            db.to_pickle(file)
+
+            # Shift the snapshots and keep the current file as the most recent one
+            if self.snapshots and os.path.exists(self.path):
+                for number in range(self.snapshots - 1, 0, -1):
+                    if os.path.exists(self.snapshot_path(number)):
+                        os.replace(self.snapshot_path(number), self.snapshot_path(number + 1))
+                if os.path.exists(self.snapshot_path(1)):
+                    os.remove(self.snapshot_path(1))
+                try:
+                    os.link(self.path, self.snapshot_path(1))
+                except OSError:
+                    shutil.copyfile(self.path, self.snapshot_path(1))
+
+        # The changes of the journal are now in the pickle file
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.records = 0
+
+    def save_rows(self, db, image_ids):
+        """ Writes the rows of the given images (new or changed).
+        """
+        self.append(db, ("rows", db.loc[list(image_ids)]))
+
+    def delete_rows(self, db, image_ids):
+        """ Removes the rows of the given images (already dropped from db).
+        """
+        self.append(db, ("delete", list(image_ids)))
+
+    def flush(self, db):
+        """ Writes the whole database if the journal has changes, called before quitting.
+        A session without changes keeps the pickle file and the snapshots as they are.
+        """
+        if self.records:
+            self.save(db)
+
+def apply_record(db, record):
+    """ Applies a change of the journal of PickleStorage to the database.
+    Applying a record twice gives the same database.
+    """
+    if record[0] == "rows":
+        rows = record[1]
+        order = db.index.append(rows.index[~rows.index.isin(db.index)])
+        return pd.concat([db.drop(rows.index, errors = "ignore"), rows]).reindex(order)
+    if record[0] == "delete":
+        return db.drop(record[1], errors = "ignore")
+
+    # Renames of the journals written when the images were indexed by name
+    if record[0] == "rename" and record[1] in db.index:
+        return db.rename(index = {record[1]: record[2]})
+    return db
+
+def index_by_id(db):
+    """ Converts a database indexed by the image names to a database indexed by IDs
+    (1, 2, ...) with the names in the Filename column.
+
+    Parameters
+    ----------
+    db : pandas.DataFrame
+        the image database indexed by the image names.
+
+    Returns
+    -------
+    pandas.DataFrame
+        the image database indexed by ID.
+    """
+    db = db[~db.index.duplicated(keep = "last")].rename_axis("Filename").reset_index()
+    db.index = pd.Index(range(1, len(db) + 1), name = "ID")
+    return db
+
+def by_name(record):
+    """ Returns True if a record of the journal of PickleStorage was written when the
+    images were indexed by name (rows without Filename column, names or renames).
+    """
+    if record[0] == "rows":
+        return "Filename" not in record[1].columns
+    if record[0] == "delete":
+        return any(isinstance(name, str) for name in record[1])
+    return record[0] == "rename"
+
+@contextlib.contextmanager
+def atomic_file(path):
+    """ Opens a temporary file that replaces the file at path when it is closed.
+    The data is synced to the disk before the rename, so the file at path is either
+    the old or the new version, never a half-written one.
+
+    Parameters
+    ----------
+    path : str
+        the path to the file to write.
+
+    Yields
+    ------
+    file object
+        the temporary file opened in binary mode.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir = folder, suffix = ".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    # Sync the folder so that the rename itself is on the disk
+    if hasattr(os, "O_DIRECTORY"):
+        directory = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+class SQLiteStorage():
+    """ Storage of the image database in an SQLite catalogue with one row per image.
+    The changes are written row by row and the lookups use the indexes on
+    (Event, Filename), which is unique, Date and (Latitude, Longitude).
+
+    Attributes
+    ----------
+    path : str
+        the path to the SQLite file.
+    connection : sqlite3.Connection
+        the connection to the catalogue.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        with self.connection:
+            self.create_table()
+            self.connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS images_file ON images ("Event", "Filename")')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS images_date ON images ("Date")')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS images_location ON images ("Latitude", "Longitude")')
+        self.columns = self.table_columns()
+
+    def create_table(self):
+        """ Creates the images table, or rebuilds a table of a catalogue whose images
+        were identified by their file name (the SQLite rowid becomes the ID).
+        """
+        columns = ", ".join(f'"{name}" {sql_type}' for name, sql_type in COLUMNS.items())
+        old_columns = [row[1] for row in self.connection.execute('PRAGMA table_info(images)').fetchall()]
+        if old_columns and "ID" not in old_columns:
+            self.connection.execute("ALTER TABLE images RENAME TO images_by_name")
+            for index in ("images_event", "images_date", "images_location"):
+                self.connection.execute(f"DROP INDEX IF EXISTS {index}")
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS images ("ID" INTEGER PRIMARY KEY, {columns})')
+        if old_columns and "ID" not in old_columns:
+            extra = [column for column in old_columns if column not in COLUMNS]
+            for column in extra:
+                self.connection.execute(f'ALTER TABLE images ADD COLUMN "{column}"')
+            names = ", ".join(f'"{column}"' for column in old_columns)
+            self.connection.execute(f'INSERT INTO images ("ID", {names}) SELECT rowid, {names} FROM images_by_name')
+            self.connection.execute("DROP TABLE images_by_name")
+
+    def table_columns(self):
+        """ Returns the list of columns of the images table (without ID).
+        """
+        rows = self.connection.execute('PRAGMA table_info(images)').fetchall()
+        return [row[1] for row in rows if row[1] != "ID"]
+
+    def add_columns(self, db):
+        """ Adds the columns of db that are not yet in the table.
+        """
+        for column in db.columns:
+            if column not in self.columns:
+                self.connection.execute(f'ALTER TABLE images ADD COLUMN "{column}" {COLUMNS.get(column, "")}')
+                self.columns.append(column)
+
+    def load(self, where = None, parameters = ()):
+        """ Returns the image database (or the rows matching a condition) as a DataFrame.
+
+        Parameters
+        ----------
+        where : str
+            an SQL condition on the columns (optional). Example: '"Event" = ?'
+        parameters : tuple
+            the values of the condition placeholders.
+        """
+        query = "SELECT * FROM images"
+        if where:
+            query += f" WHERE {where}"
+        db = pd.read_sql_query(query, self.connection, params = parameters, index_col = "ID")
+        for column in DATE_COLUMNS & set(db.columns):
+            db[column] = pd.to_datetime(db[column], errors = "coerce")
+        for column in BOOLEAN_COLUMNS & set(db.columns):
+            db[column] = db[column].map({1: True, 0: False}).astype(object)
+        return db
+
+    def save(self, db):
+        """ Replaces the whole catalogue by db.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM images")
+            self.add_columns(db)
+            self.insert(db, db.index)
+
+    def insert(self, db, image_ids):
+        """ Inserts or updates the rows of the given images. A row with the event and
+        file name of another image raises sqlite3.IntegrityError (it is not replaced).
+        """
+        columns = list(db.columns)
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        names_sql = ", ".join(f'"{column}"' for column in ["ID"] + columns)
+        updates_sql = ", ".join(f'"{column}" = excluded."{column}"' for column in columns)
+        rows = db.loc[list(image_ids), columns]
+        self.connection.executemany(
+            f'INSERT INTO images ({names_sql}) VALUES ({placeholders}) ON CONFLICT ("ID") DO UPDATE SET {updates_sql}',
+            ([int(image_id)] + [to_sql_value(column, value) for column, value in zip(columns, values)]
+             for image_id, values in zip(rows.index, rows.itertuples(index = False))))
+
+    def save_rows(self, db, image_ids):
+        """ Writes the rows of the given images (new or changed).
+        """
+        with self.connection:
+            self.add_columns(db)
+            self.insert(db, image_ids)
+
+    def delete_rows(self, db, image_ids):
+        """ Removes the rows of the given images.
+        """
+        with self.connection:
+            self.connection.executemany('DELETE FROM images WHERE "ID" = ?',
+                                        ((int(image_id),) for image_id in image_ids))
+
+    def flush(self, db):
+        """ Makes sure that all the changes are written, called before quitting.
+        The changes are committed as they are made, so nothing is left to write.
+        """
+        self.connection.commit()
+
+def to_sql_value(column, value):
+    """ Converts a value of the DataFrame to a value that SQLite can store.
+    """
+    if isinstance(value, np.ndarray) and value.ndim == 0:
+        value = value[()]
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    if column in DATE_COLUMNS:
+        return pd.Timestamp(value).strftime("%Y-%m-%d")
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, (str, bytes, int, float)):
+        return value
+    return str(value)
+
+def open_storage(pickle_path, sqlite_path):
+    """ Opens the storage backend of the image database.
+
+    Parameters
+    ----------
+    pickle_path : str
+        the path to the pickle file.
+    sqlite_path : str
+        the path to the SQLite catalogue. It is used if it exists (see migrate).
+
+    Returns
+    -------
+    PickleStorage or SQLiteStorage
+        the storage backend.
+    """
+    if os.path.exists(sqlite_path):
+        return SQLiteStorage(sqlite_path)
+    import config
+    return PickleStorage(pickle_path, config.db_snapshots, config.journal_checkpoint)
+
+def migrate(pickle_path, sqlite_path):
+    """ Copies the database from the pickle file into a new SQLite catalogue.
+    The pickle file is kept as a backup.
+
+    Parameters
+    ----------
+    pickle_path : str
+        the path to the pickle file.
+    sqlite_path : str
+        the path to the SQLite catalogue to create.
+
+    Returns
+    -------
+    int
+        the number of images copied.
+    """
+    if os.path.exists(sqlite_path):
+        raise FileExistsError(f"The catalogue {sqlite_path} already exists")
+    db = PickleStorage(pickle_path).load()
+    db = db.drop_duplicates(["Event", "Filename"], keep = "last")
+    storage = SQLiteStorage(sqlite_path)
+    storage.save(db)
+    storage.connection.close()
+    return len(db)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Migrate the image database to an SQLite catalogue")
+    parser.add_argument("command", choices = ["migrate"])
+    args = parser.parse_args()
+
+    import config
+    count = migrate(config.db_path, config.sqlite_path)
+    print(f"{count} images have been copied into {os.path.basename(config.sqlite_path)}. "
+          "DigitalDarkroom will now use the SQLite catalogue.")
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from PIL import Image
+import config
+import recipes
+from storage import PickleStorage
+from batch_edit import (select_images, make_chunks, batch_edit)
+
+class TestBatchEdit(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.event_path = os.path.join(self.tmp_dir.name, "Images", "Greece")
+        os.makedirs(self.event_path)
+        names = []
+        for index in range(5):
+            name = f"image_{index}.jpg"
+            Image.new("RGB", (40 * (index + 1), 20), (0, 0, 200)).save(os.path.join(self.event_path, name))
+            names.append(name)
+        # The same file name as a copy, in another event
+        db = pd.DataFrame({"Filename": names + ["image_0_2.jpg"], "Event": ["Greece"] * 5 + ["Japan"],
+                           "Edited": [False] * 6, "Height": [20] * 6,
+                           "Width": [40 * (index + 1) for index in range(5)] + [10]},
+                          index = pd.Index(range(1, 7), name = "ID"))
+        self.names = names
+        self.ids = list(range(1, 6))
+        self.patches = [patch.object(config, "images_path", os.path.join(self.tmp_dir.name, "Images")),
+                        patch.object(config, "STORAGE", PickleStorage(os.path.join(self.tmp_dir.name, "image_DB.pkl"))),
+                        patch.object(config, "DB", db)]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_select_images(self):
+        self.assertEqual(select_images(event = "Greece"), self.ids)
+        self.assertEqual(select_images(query = "Width > 170"), [5])
+
+    def test_chunks_are_balanced(self):
+        sizes = [100, 90, 50, 40, 30, 30, 20, 10]
+        paths = []
+        for index, size in enumerate(sizes):
+            paths.append(os.path.join(self.tmp_dir.name, f"file_{index}"))
+            with open(paths[-1], "wb") as file:
+                file.write(b"0" * size)
+        chunks = make_chunks([(path, None, []) for path in paths], 3)
+        totals = sorted(sum(os.path.getsize(task[0]) for task in chunk) for chunk in chunks)
+        self.assertEqual(sum(totals), sum(sizes))
+        self.assertLessEqual(totals[-1] - totals[0], 20)
+        self.assertEqual(len(make_chunks([(paths[0], None, [])], 3)), 1)
+
+    def test_save_copies(self):
+        recipes.set_recipe(1, [("rotate", 90)])
+        edited = batch_edit(self.ids, [("rotate", 180), ("enhance", "brightness", 1.2)], workers = 2)
+        self.assertEqual(sorted(edited), list(range(7, 12)))
+        copies = config.DB.loc[edited].set_index("Filename")
+        self.assertEqual(sorted(copies.index), sorted(name.replace(".jpg", "_2.jpg") for name in self.names))
+        self.assertTrue((copies["Event"] == "Greece").all())
+
+        # The stored recipe is applied before the new operations
+        with Image.open(os.path.join(self.event_path, "image_0_2.jpg")) as image:
+            self.assertEqual(image.size, (20, 40))
+        self.assertEqual((copies.loc["image_0_2.jpg", "Width"], copies.loc["image_0_2.jpg", "Height"]), (20, 40))
+        self.assertTrue(copies.loc["image_4_2.jpg", "Edited"])
+        self.assertEqual(len(config.STORAGE.load()), 11)
+        self.assertFalse([name for name in os.listdir(self.event_path) if name.endswith(".tmp")])
+
+    def test_replace_stores_recipes(self):
+        original = open(os.path.join(self.event_path, "image_1.jpg"), "rb").read()
+        batch_edit(self.ids[:2], [("rotate", 90), ("filter", "blur")], copies = False)
+        self.assertEqual(recipes.get_recipe(2), [("rotate", 90), ("filter", "blur")])
+        self.assertTrue(config.STORAGE.load().loc[1, "Edited"])
+        self.assertEqual(open(os.path.join(self.event_path, "image_1.jpg"), "rb").read(), original)
+
+    def test_replace_rotation_losslessly(self):
+        data = open(os.path.join(self.event_path, "image_1.jpg"), "rb").read()
+        batch_edit(self.ids[:2], [("rotate", 90)], copies = False)
+        self.assertEqual(recipes.get_recipe(2), [])
+        self.assertEqual((config.DB.loc[2, "Width"], config.DB.loc[2, "Height"]), (20, 80))
+
+        # The compressed image data is unchanged
+        rotated = open(os.path.join(self.event_path, "image_1.jpg"), "rb").read()
+        self.assertEqual(rotated[-len(data) + 20:], data[20:])
+
+if __name__ == '__main__':
+    unittest.main()
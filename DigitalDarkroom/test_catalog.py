@@ -0,0 +1,51 @@
+import os
+import unittest
+from unittest.mock import patch
+import pandas as pd
+import config
+import catalog
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        db = pd.DataFrame({"Filename": ["a.jpg", "b.jpg", "a.jpg"], "Event": ["Japan", "Japan", "Greece"]},
+                          index = pd.Index([1, 2, 5], name = "ID"))
+        self.patches = [patch.object(config, "DB", db), patch.object(catalog, "default_keys", None)]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+
+    def test_find_image(self):
+        self.assertEqual(catalog.find_image("Japan", "a.jpg"), 1)
+        self.assertEqual(catalog.find_image("Greece", "a.jpg"), 5)
+        self.assertIsNone(catalog.find_image("Greece", "b.jpg"))
+        self.assertEqual(sorted(catalog.find_by_name("a.jpg")), [1, 5])
+        self.assertEqual(catalog.image_path(5), os.path.join(config.images_path, "Greece", "a.jpg"))
+        self.assertEqual(catalog.label(2), os.path.join("Japan", "b.jpg"))
+
+    def test_renamed_and_new_images(self):
+        keys = catalog.get_keys()
+
+        # Renamed in place and recorded: the dictionaries are kept
+        config.DB.loc[2, "Filename"] = "c.jpg"
+        catalog.refresh([2])
+        self.assertEqual(catalog.find_image("Japan", "c.jpg"), 2)
+        self.assertIs(catalog.get_keys(), keys)
+
+        # Renamed without refresh: the stale entry is found and the dictionaries are built again
+        config.DB.loc[1, "Event"] = "Kyoto"
+        self.assertIsNone(catalog.find_image("Japan", "a.jpg"))
+        self.assertEqual(catalog.find_by_name("a.jpg"), [1, 5])
+        self.assertEqual(catalog.find_image("Kyoto", "a.jpg"), 1)
+
+        # New images get the IDs after the largest one
+        self.assertEqual(catalog.next_ids(2), [6, 7])
+        config.DB = pd.concat([config.DB, pd.DataFrame({"Filename": ["d.jpg"], "Event": ["Japan"]},
+                                                       index = pd.Index([6], name = "ID"))])
+        self.assertEqual(catalog.find_image("Japan", "d.jpg"), 6)
+
+if __name__ == '__main__':
+    unittest.main()
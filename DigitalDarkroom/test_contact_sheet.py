@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from PIL import Image
+import config
+import thumbnails
+from contact_sheet import (write_contact_sheets, export_event)
+
+class TestContactSheet(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.event_path = os.path.join(self.tmp_dir.name, "Images", "Greece")
+        os.makedirs(self.event_path)
+        self.names = []
+        for index in range(7):
+            name = f"image_{index}.jpg"
+            Image.new("RGB", (400, 300), (30 * index, 0, 0)).save(os.path.join(self.event_path, name))
+            self.names.append(name)
+        self.patches = [patch.object(thumbnails, "default_cache",
+                                     thumbnails.ThumbnailCache(os.path.join(self.tmp_dir.name, "Thumbnails"))),
+                        patch.object(config, "images_path", os.path.join(self.tmp_dir.name, "Images"))]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_sheets_are_split(self):
+        paths = [os.path.join(self.event_path, name) for name in self.names]
+        paths.append(os.path.join(self.event_path, "missing.jpg"))
+        sheets = write_contact_sheets(paths, os.path.join(self.tmp_dir.name, "sheet"),
+                                      columns = 3, rows = 2, cell_size = (100, 80), use_cache = False)
+        self.assertEqual([os.path.basename(sheet) for sheet in sheets], ["sheet_001.jpg", "sheet_002.jpg"])
+
+        # The last sheet only has the rows it needs
+        with Image.open(sheets[0]) as sheet:
+            self.assertEqual(sheet.size, (300, 2 * 96))
+        with Image.open(sheets[1]) as sheet:
+            self.assertEqual(sheet.size, (300, 96))
+        self.assertEqual(write_contact_sheets([], os.path.join(self.tmp_dir.name, "empty")), [])
+
+    def test_export_event(self):
+        db = pd.DataFrame({"Filename": self.names + ["other.jpg"], "Event": ["Greece"] * 7 + ["Japan"],
+                           "Date": pd.to_datetime(["2023-01-0" + str(day) for day in range(7, 0, -1)]
+                                                  + ["2023-01-01"])},
+                          index = pd.Index(range(1, 9), name = "ID"))
+        output_path = os.path.join(self.tmp_dir.name, "Contact_sheets")
+        with patch.object(config, "DB", db):
+            sheets = export_event("Greece", output_path = output_path)
+        self.assertEqual(sheets, [os.path.join(output_path, "Greece_001.jpg")])
+
+        # The thumbnail cache is used and images are ordered by date
+        self.assertTrue(thumbnails.default_cache.files())
+        with Image.open(sheets[0]) as sheet:
+            first_cell = sheet.getpixel((config.contact_sheet_cell[0] // 2, config.contact_sheet_cell[1] // 2))
+        self.assertGreater(first_cell[0], 150)
+
+    def test_export_edited_images(self):
+        db = pd.DataFrame({"Filename": self.names[:1], "Event": ["Greece"],
+                           "Recipe": ['[["rotate", 90]]']}, index = pd.Index([1], name = "ID"))
+        output_path = os.path.join(self.tmp_dir.name, "Contact_sheets")
+        with patch.object(config, "DB", db):
+            sheets = export_event("Greece", output_path = output_path, use_cache = False)
+
+        # The image (400x300) is shown turned as in the display: the cell is filled in height, not in width
+        cell_width, cell_height = config.contact_sheet_cell
+        with Image.open(sheets[0]) as sheet:
+            self.assertEqual(sheet.getpixel((2, cell_height // 2)), (255, 255, 255))
+            self.assertNotEqual(sheet.getpixel((cell_width // 2, 2)), (255, 255, 255))
+
+if __name__ == '__main__':
+    unittest.main()
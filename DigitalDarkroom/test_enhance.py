@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+from PIL import Image
+import recipes
+from enhance import FastEnhancer
+
+class TestFastEnhancer(unittest.TestCase):
+
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        self.image = Image.fromarray(generator.integers(0, 256, (120, 170, 3), dtype = np.uint8))
+        self.image_rgba = self.image.convert("RGBA")
+        self.image_rgba.putalpha(Image.fromarray(generator.integers(0, 256, (120, 170), dtype = np.uint8)))
+
+    def test_same_result_as_pil(self):
+        for image in (self.image, self.image_rgba, self.image.convert("L")):
+            for enhancer in recipes.ENHANCERS.values():
+                engine = FastEnhancer(image, enhancer)
+                for factor in (0.0, 0.35, 1.0, 1.3, 2.75, -0.5):
+                    expected = enhancer(image).enhance(factor)
+                    self.assertEqual(engine.enhance(factor).tobytes(), expected.tobytes(),
+                                     f"{enhancer.__name__} {image.mode} {factor}")
+
+    def test_buffers_are_reused(self):
+        engine = FastEnhancer(self.image, recipes.ENHANCERS["brightness"])
+        first = engine.enhance_array(0.5)
+        self.assertIs(engine.enhance_array(1.5), first)
+        self.assertEqual(engine.enhance(1.0).tobytes(), self.image.tobytes())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import geocoding
+import time
+from geocoding import (GeocodeCache, GeocodeQueue, Gazetteer, TokenBucket, normalise)
+from organise_images import get_coords
+
+class CountingGazetteer(Gazetteer):
+    """ Local stand-in for the online geocoder counting the lookups.
+    """
+    lookups = 0
+
+    def geocode(self, query):
+        self.lookups += 1
+        return super().geocode(query)
+
+class FlakyGazetteer(CountingGazetteer):
+    """ Local stand-in failing at the first lookup of each location.
+    """
+    def geocode(self, query):
+        self.failed = getattr(self, "failed", set())
+        if query not in self.failed:
+            self.failed.add(query)
+            raise ConnectionError("Service unavailable")
+        return super().geocode(query)
+
+class TestGeocoding(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "geocode_cache.sqlite")
+        self.gazetteer = CountingGazetteer({"Bern": (46.95, 7.45), "Kyoto": (35.01, 135.77)})
+        self.patches = [patch.object(geocoding, "default_geocoder", self.gazetteer),
+                        patch.object(geocoding, "default_cache", GeocodeCache(self.path))]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_normalise(self):
+        self.assertEqual(normalise("  Hochschulstrasse 4 ,  BERN "), "hochschulstrasse 4, bern")
+
+    def test_repeated_locations_use_cache(self):
+        self.assertEqual(get_coords("Bern"), (46.95, 7.45, "Bern"))
+        self.assertEqual(get_coords(" bern"), (46.95, 7.45, " bern"))
+        self.assertEqual(get_coords("Atlantis"), None)
+        self.assertEqual(get_coords("atlantis"), None)
+        self.assertEqual(self.gazetteer.lookups, 2)
+
+        # The cache is kept on disk
+        cache = GeocodeCache(self.path)
+        self.assertEqual(cache.get("BERN"), (True, (46.95, 7.45)))
+        self.assertEqual(cache.get("Atlantis"), (True, None))
+
+    def test_expiry_and_eviction(self):
+        cache = GeocodeCache(self.path, ttl = 0)
+        cache.put("Bern", (46.95, 7.45))
+        self.assertEqual(cache.get("Bern"), (False, None))
+
+        cache = GeocodeCache(self.path, max_entries = 10)
+        for index in range(12):
+            cache.put(f"place {index}", (0.0, float(index)))
+        self.assertLessEqual(cache.count, 10)
+        self.assertEqual(GeocodeCache(self.path).get("place 0"), (False, None))
+        self.assertEqual(GeocodeCache(self.path).get("place 11"), (True, (0.0, 11.0)))
+
+    def test_worldmap_gazetteer(self):
+        gazetteer = Gazetteer.from_worldmap()
+        self.assertIsNotNone(gazetteer.geocode("Japan"))
+        self.assertEqual(gazetteer.geocode("Switzerland"), gazetteer.geocode("schweiz"))
+        self.assertIsNone(gazetteer.geocode("Atlantis"))
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate = 50)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_queue_deduplicates_and_retries(self):
+        flaky = FlakyGazetteer({"Bern": (46.95, 7.45), "Kyoto": (35.01, 135.77)})
+        geocoding.set_geocoder(flaky)
+        geocode_queue = GeocodeQueue(rate = 100, retries = 2, backoff = 0.01)
+        for location in ["Bern", "bern ", "Kyoto", "Atlantis", "BERN"]:
+            geocode_queue.submit(location)
+        results = geocode_queue.wait()
+        self.assertEqual(len(results), 3)
+        self.assertEqual(geocode_queue.get("Bern"), (46.95, 7.45))
+        self.assertIsNone(geocode_queue.get("Atlantis"))
+
+        # One failed and one successful lookup per location
+        self.assertEqual(flaky.lookups, 3)
+
+    def test_queue_stop(self):
+        geocoding.set_geocoder(Gazetteer({"Bern": (46.95, 7.45)}))
+        geocode_queue = GeocodeQueue(rate = 1)
+        for number in range(5):
+            geocode_queue.submit(f"Place {number}")
+        geocode_queue.stop()
+        geocode_queue.thread.join(timeout = 5)
+        self.assertFalse(geocode_queue.thread.is_alive())
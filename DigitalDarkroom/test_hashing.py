@@ -0,0 +1,106 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageFilter
+import config
+import hashing
+from storage import PickleStorage
+from ingest import (IngestSession, discover_files, ingest_files)
+from hashing import (BKTree, content_hash, dhash, hamming, find_duplicates)
+
+class TestHashing(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.images_path = os.path.join(self.tmp_dir.name, "Images")
+        self.event_path = os.path.join(self.images_path, "Greece")
+        os.makedirs(self.event_path)
+        generator = np.random.default_rng(0)
+        self.image = Image.fromarray(generator.integers(0, 256, (12, 16, 3), dtype = np.uint8)).resize((320, 240))
+        self.patches = [patch.object(config, "images_path", self.images_path),
+                        patch.object(config, "STORAGE", PickleStorage(os.path.join(self.tmp_dir.name, "image_DB.pkl"))),
+                        patch.object(config, "DB", pd.DataFrame(columns = ["Filename", "Event", "Edited"]))]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_bk_tree_search(self):
+        generator = random.Random(0)
+        values = [f"{generator.getrandbits(64):016x}" for _ in range(500)]
+        tree = BKTree()
+        for number, value in enumerate(values):
+            tree.add(value, number)
+        for value in values[:20]:
+            expected = sorted((hamming(value, other), number) for number, other in enumerate(values)
+                              if hamming(value, other) <= 20)
+            self.assertEqual(sorted(tree.search(value, 20)), expected)
+
+    def test_dhash_of_similar_images(self):
+        paths = {}
+        for name, image in (("a.jpg", self.image), ("small.jpg", self.image.resize((160, 120))),
+                            ("blurred.png", self.image.filter(ImageFilter.GaussianBlur(1))),
+                            ("other.jpg", self.image.transpose(Image.Transpose.FLIP_TOP_BOTTOM))):
+            paths[name] = os.path.join(self.event_path, name)
+            image.save(paths[name])
+        hashes = {name: dhash(path) for name, path in paths.items()}
+        self.assertLessEqual(hamming(hashes["a.jpg"], hashes["small.jpg"]), config.duplicate_distance)
+        self.assertLessEqual(hamming(hashes["a.jpg"], hashes["blurred.png"]), config.duplicate_distance)
+        self.assertGreater(hamming(hashes["a.jpg"], hashes["other.jpg"]), config.duplicate_distance)
+        self.assertNotEqual(content_hash(paths["a.jpg"]), content_hash(paths["small.jpg"]))
+
+    def test_upload_skips_identical_files(self):
+        source_path = os.path.join(self.tmp_dir.name, "Card")
+        os.makedirs(source_path)
+        self.image.save(os.path.join(source_path, "IMG_1.jpg"))
+        self.image.save(os.path.join(source_path, "IMG_2.jpg"))
+        self.image.resize((160, 120)).save(os.path.join(source_path, "IMG_3.jpg"))
+        with IngestSession() as session:
+            copied, skipped = ingest_files(sorted(discover_files(os.path.join(source_path, "*.jpg"))),
+                                           self.event_path, session, workers = 1)
+        self.assertEqual((copied, skipped), (2, 1))
+        self.assertEqual(sorted(os.listdir(self.event_path)), ["IMG_1.jpg", "IMG_3.jpg"])
+
+        # Already in the library under another name
+        os.rename(os.path.join(source_path, "IMG_1.jpg"), os.path.join(source_path, "IMG_4.jpg"))
+        with IngestSession() as session:
+            self.assertEqual(ingest_files([os.path.join(source_path, "IMG_4.jpg")], self.event_path, session), (0, 1))
+
+        self.image.transpose(Image.Transpose.FLIP_TOP_BOTTOM).save(os.path.join(self.event_path, "IMG_5.jpg"))
+        config.DB.loc[3] = {"Filename": "IMG_5.jpg", "Event": "Greece", "Edited": False}
+        self.assertEqual(list(config.DB["Filename"]), ["IMG_1.jpg", "IMG_3.jpg", "IMG_5.jpg"])
+        self.assertEqual(find_duplicates(), [[1, 2]])
+        self.assertIsInstance(PickleStorage(config.STORAGE.path).load().loc[3, "DHash"], str)
+
+    def test_find_identical(self):
+        db = pd.DataFrame({"Filename": ["a.jpg", "b.jpg"], "Event": ["Greece", "Greece"], "Hash": ["aa", None]},
+                          index = pd.Index([1, 2], name = "ID"))
+        with patch.object(config, "DB", db), patch.object(hashing, "default_hashes", None):
+            hashes = hashing.get_hashes()
+            self.assertEqual(hashing.find_identical("aa"), 1)
+            self.assertIsNone(hashing.find_identical("bb"))
+
+            # Hashes computed in place and new images are recorded without building the dictionary again
+            config.DB.loc[2, "Hash"] = "bb"
+            hashing.refresh_hashes([2])
+            previous = config.DB
+            config.DB = pd.concat([config.DB, pd.DataFrame({"Filename": ["c.jpg"], "Event": ["Greece"], "Hash": ["cc"]},
+                                                           index = pd.Index([3], name = "ID"))])
+            hashing.refresh_hashes([3], previous)
+            self.assertIs(hashing.get_hashes(), hashes)
+            self.assertEqual((hashing.find_identical("bb"), hashing.find_identical("cc")), (2, 3))
+
+            # An image changed since it was recorded is not identical anymore
+            config.DB.loc[1, "Hash"] = "dd"
+            self.assertIsNone(hashing.find_identical("aa"))
+            self.assertEqual(hashing.find_identical("dd"), 1)
+
+if __name__ == '__main__':
+    unittest.main()
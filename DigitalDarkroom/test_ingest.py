@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from PIL import Image
+import config
+from storage import PickleStorage
+from ingest import (IngestSession, discover_files, ingest_files)
+
+class TestIngestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "image_DB.pkl")
+        self.patches = [patch.object(config, "STORAGE", PickleStorage(self.db_path)),
+                        patch.object(config, "DB", pd.DataFrame(columns = ["Filename", "Event", "Edited"]))]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_checkpoint_every_n_files(self):
+        session = IngestSession(checkpoint_files = 2, checkpoint_seconds = 3600)
+        session.add("a.jpg", {"Event": "Test", "Edited": False})
+        self.assertFalse(os.path.exists(self.db_path))
+        session.add("b.jpg", {"Event": "Test", "Edited": False})
+        self.assertEqual(len(PickleStorage(self.db_path).load()), 2)
+        session.add("c.jpg", {"Event": "Test", "Edited": False})
+        self.assertEqual(len(PickleStorage(self.db_path).load()), 2)
+        session.commit()
+        loaded = PickleStorage(self.db_path).load()
+        self.assertEqual(list(loaded.index), [1, 2, 3])
+        self.assertEqual(list(loaded["Filename"]), ["a.jpg", "b.jpg", "c.jpg"])
+
+    def test_commit_on_error_and_resume(self):
+        event_path = os.path.join(self.tmp_dir.name, "Test")
+        os.makedirs(event_path)
+        open(os.path.join(event_path, "a.jpg"), "w").close()
+        with self.assertRaises(KeyboardInterrupt):
+            with IngestSession(checkpoint_files = 100) as session:
+                session.add("a.jpg", {"Event": "Test", "Edited": False})
+                raise KeyboardInterrupt
+        self.assertEqual(list(config.DB["Filename"]), ["a.jpg"])
+
+        # A rerun skips the ingested images
+        session = IngestSession()
+        self.assertTrue(session.is_ingested("a.jpg", event_path))
+        self.assertFalse(session.is_ingested("b.jpg", event_path))
+
+    def test_upload_again_replaces_row(self):
+        with IngestSession() as session:
+            session.add("a.jpg", {"Event": "Test", "Edited": False})
+        with IngestSession() as session:
+            session.add("a.jpg", {"Event": "Test", "Edited": True})
+        self.assertEqual(list(config.DB.index), [1])
+        self.assertIs(config.DB.loc[1, "Edited"], True)
+
+        # The same file name in another event is another image
+        with IngestSession() as session:
+            session.add("a.jpg", {"Event": "Other", "Edited": False})
+        self.assertEqual(list(config.DB.index), [1, 2])
+        self.assertEqual(list(config.DB["Event"]), ["Test", "Other"])
+
+    def test_ingest_files_in_parallel(self):
+        dest = os.path.join(self.tmp_dir.name, "Greece")
+        os.makedirs(dest)
+        pattern = os.path.join(config.images_path, "Greece", "*.jpg")
+        with IngestSession() as session:
+            copied, skipped = ingest_files(discover_files(pattern), dest, session,
+                                           coords = (37.9, 23.7, "Athens"), workers = 2,
+                                           copy_workers = 2, max_in_flight = 2)
+        self.assertEqual((copied, skipped), (4, 0))
+        self.assertEqual(sorted(config.DB["Filename"]), sorted(os.listdir(dest)))
+        self.assertTrue((config.DB["Location"] == "Athens").all())
+        self.assertTrue((config.DB["Event"] == "Greece").all())
+
+        # Uploading the same folder again skips every image
+        with IngestSession() as session:
+            self.assertEqual(ingest_files(discover_files(pattern), dest, session), (0, 4))
+
+    def test_same_name_from_two_cameras(self):
+        dest = os.path.join(self.tmp_dir.name, "Kyoto")
+        os.makedirs(dest)
+        paths = []
+        for camera, color in (("CameraA", "red"), ("CameraB", "blue"), ("CameraC", "green")):
+            os.makedirs(os.path.join(self.tmp_dir.name, camera))
+            paths.append(os.path.join(self.tmp_dir.name, camera, "IMG_0639.jpg"))
+            Image.new("RGB", (16, 16), color).save(paths[-1])
+        with IngestSession() as session:
+            self.assertEqual(ingest_files(paths[:1], dest, session), (1, 0))
+
+        # Different images with a taken name get new names, also within an upload
+        names = {}
+        with IngestSession() as session:
+            self.assertEqual(ingest_files(paths[1:], dest, session, workers = 2, names = names), (2, 0))
+        self.assertEqual(sorted(os.listdir(dest)), ["IMG_0639.jpg", "IMG_0639_2.jpg", "IMG_0639_3.jpg"])
+        self.assertEqual(sorted(names.values()), ["IMG_0639_2.jpg", "IMG_0639_3.jpg"])
+        for path, name in [(paths[0], "IMG_0639.jpg")] + list(names.items()):
+            with open(path, "rb") as source, open(os.path.join(dest, name), "rb") as copy:
+                self.assertEqual(source.read(), copy.read())
+        self.assertEqual(sorted(config.DB["Filename"]), ["IMG_0639.jpg", "IMG_0639_2.jpg", "IMG_0639_3.jpg"])
+
+        # The same files are skipped
+        session = IngestSession()
+        self.assertTrue(session.is_ingested("IMG_0639.jpg", dest, paths[0]))
+        self.assertFalse(session.is_ingested("IMG_0639.jpg", dest, paths[1]))
+        with IngestSession() as session:
+            self.assertEqual(ingest_files(paths, dest, session, skip_duplicates = False), (0, 3))
+        self.assertEqual(len(os.listdir(dest)), 3)
@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+from map_clusters import (MarkerClusters, morton_codes)
+from spatial import SpatialIndex
+
+class TestMarkerClusters(unittest.TestCase):
+
+    def setUp(self):
+        # Three images in Kyoto, one in Osaka, one in Athens and one on the antimeridian
+        self.clusters = MarkerClusters([1, 2, 3, 4, 5, 6], [35.01, 35.02, 35.011, 34.69, 37.97, -17.0],
+                                       [135.76, 135.77, 135.761, 135.50, 23.72, 180.0])
+
+    def test_morton_codes(self):
+        self.assertEqual(morton_codes([0, 1, 0, 1, 2], [0, 0, 1, 1, 0]).tolist(), [0, 1, 2, 3, 4])
+
+    def test_levels(self):
+        self.assertEqual(len(self.clusters), 6)
+
+        # The whole world is one cluster, the finest level has a cluster per location
+        starts, counts, latitudes, longitudes = self.clusters.levels[0]
+        self.assertEqual(counts.tolist(), [6])
+        self.assertAlmostEqual(latitudes[0], np.mean([35.01, 35.02, 35.011, 34.69, 37.97, -17.0]))
+        self.assertEqual(len(self.clusters.levels[-1][0]), 6)
+
+        # The clusters of a level are split into those of the next one
+        for coarse, fine in zip(self.clusters.levels, self.clusters.levels[1:]):
+            self.assertTrue(set(coarse[0]) <= set(fine[0]))
+            self.assertEqual(coarse[1].sum(), 6)
+
+    def test_view_and_members(self):
+        # The world: Japan is one marker
+        longitudes, latitudes, counts = self.clusters.view(-90, -180, 90, 180, cells = 8)
+        self.assertEqual(sorted(counts.tolist()), [1, 1, 4])
+        japan = counts.tolist().index(4)
+        self.assertEqual(self.clusters.members([japan]), [1, 2, 3, 4])
+
+        # Zoomed on Kansai: Kyoto and Osaka are apart, Athens is out of view
+        longitudes, latitudes, counts = self.clusters.view(34, 135, 36, 136.5, cells = 8)
+        self.assertEqual(sorted(counts.tolist()), [1, 3])
+        self.assertEqual(self.clusters.members(range(len(counts))), [1, 2, 3, 4])
+
+        # The number of markers in view does not depend on the number of images
+        generator = np.random.default_rng(0)
+        clusters = MarkerClusters(np.arange(100000), generator.uniform(-90, 90, 100000),
+                                  generator.uniform(-180, 180, 100000))
+        for view in [(-90, -180, 90, 180), (0, 0, 20, 30), (10, 10, 10.5, 10.5)]:
+            self.assertLessEqual(len(clusters.view(*view, cells = 16)[2]), 33 * 17)
+
+    def test_cells(self):
+        # The images of the cells of the clusters in the spatial index are their members
+        generator = np.random.default_rng(0)
+        ids = np.arange(1, 5001)
+        latitudes = np.round(generator.uniform(-90, 90, len(ids)), 1)
+        longitudes = np.round(generator.uniform(-180, 180, len(ids)), 1)
+        latitudes[:4], longitudes[:4] = [0, 90, -90, 45], [0, 180, -180, 22.5]
+        clusters = MarkerClusters(ids, latitudes, longitudes)
+        index = SpatialIndex(ids, latitudes, longitudes)
+        for view in [(-90, -180, 90, 180), (0, 0, 20, 30), (40, 20, 50, 25)]:
+            for cells in (1, 4, 16):
+                clusters.view(*view, cells = cells)
+                for marker in range(len(clusters.shown)):
+                    self.assertEqual(sorted(index.bbox(*clusters.cells([marker])[0]).tolist()),
+                                     clusters.members([marker]))
+
+    def test_empty(self):
+        clusters = MarkerClusters([], [], [])
+        self.assertEqual(len(clusters.view(-90, -180, 90, 180)[2]), 0)
+        self.assertEqual(clusters.members([]), [])
+
+if __name__ == '__main__':
+    unittest.main()
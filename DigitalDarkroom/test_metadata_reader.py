@@ -0,0 +1,40 @@
+import os
+import glob
+import tempfile
+import unittest
+import config
+from PIL import Image
+from metadata_reader import (read_metadata, read_pil_metadata)
+
+class TestReadMetadata(unittest.TestCase):
+
+    def test_same_as_pil(self):
+        # The header reader returns the same metadata as PIL for the bundled images
+        for path in glob.glob(os.path.join(config.images_path, "*", "*.jpg"))[:10]:
+            metadata = read_metadata(path)
+            expected = read_pil_metadata(path)
+            for key in ["format", "width", "height", "mode", "channels",
+                        "date_time", "date_time_original", "orientation"]:
+                self.assertEqual(metadata[key], expected[key], f"{key} of {path}")
+
+    def test_gps_and_orientation(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "gps.jpg")
+            exif = Image.Exif()
+            exif[0x0112] = 6
+            exif[0x0132] = "2019:04:01 10:00:00"
+            exif.get_ifd(0x8825).update({1: "S", 2: (33.0, 51.0, 36.0), 3: "E", 4: (151.0, 12.0, 36.0)})
+            Image.new("RGB", (64, 48)).save(path, exif = exif)
+            metadata = read_metadata(path)
+        self.assertEqual((metadata["width"], metadata["height"]), (64, 48))
+        self.assertEqual(metadata["orientation"], 6)
+        self.assertEqual(metadata["date_time"], "2019:04:01 10:00:00")
+        self.assertAlmostEqual(metadata["latitude"], -33.86)
+        self.assertAlmostEqual(metadata["longitude"], 151.21)
+
+    def test_fallback_to_pil(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "image.png")
+            Image.new("L", (10, 20)).save(path)
+            metadata = read_metadata(path)
+        self.assertEqual((metadata["format"], metadata["width"], metadata["mode"]), ("PNG", 10, "L"))
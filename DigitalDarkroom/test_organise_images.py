@@ -1,9 +1,27 @@
 from organise_images import *
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
-from organise_images import change_info
+import pandas as pd
+import config
+import geocoding
+from geocoding import GeocodeCache
+from storage import PickleStorage
+from organise_images import (change_info, change_info_image)
 
 class TestExtractMetadata(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher = patch.object(geocoding, "default_cache",
+                                    GeocodeCache(os.path.join(self.tmp_dir.name, "geocode_cache.sqlite")))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
     def test_get_coordinates(self):
         self.assertEqual(get_coords("Bern"), (46.9484742, 7.4521749, "Bern"), "Coordinates don't match") # city
         self.assertEqual(get_coords("Japan"), (36.5748441, 139.2394179, "Japan"), "Coordinates don't match") # country
@@ -18,3 +36,23 @@ class TestChangeInfo(unittest.TestCase):
         self.assertRaises(SystemExit, change_info)
         self.assertRaises(SystemExit, change_info)
 
+    @patch("organise_images.input")
+    def test_rename_to_a_taken_name(self, mocked_input):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            event_path = os.path.join(tmp_dir, "Japan")
+            os.makedirs(event_path)
+            for name in ("a.jpg", "b.jpg"):
+                with open(os.path.join(event_path, name), "w") as file:
+                    file.write(name)
+            db = pd.DataFrame({"Filename": ["a.jpg", "b.jpg"], "Event": ["Japan", "Japan"]},
+                              index = pd.Index([1, 2], name = "ID"))
+            with patch.object(config, "STORAGE", PickleStorage(os.path.join(tmp_dir, "image_DB.pkl"))), \
+                 patch.object(config, "DB", db), patch("display_images.get_event", return_value = event_path):
+
+                # The other image is kept, the name is asked again
+                mocked_input.side_effect = ["a.jpg", "N", "b.jpg", "N", "c.jpg"]
+                change_info_image()
+                self.assertEqual(sorted(os.listdir(event_path)), ["b.jpg", "c.jpg"])
+                with open(os.path.join(event_path, "b.jpg")) as file:
+                    self.assertEqual(file.read(), "b.jpg")
+                self.assertEqual(list(config.DB["Filename"]), ["c.jpg", "b.jpg"])
@@ -0,0 +1,50 @@
+import unittest
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from PIL import Image, UnidentifiedImageError
+from panorama_grid import GridRenderer
+
+class TestGridRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.figure = plt.figure()
+        self.grid = GridRenderer(self.figure.add_axes([0, 0, 1, 1]), cell_size = (100, 80), caption_height = 10)
+
+    def tearDown(self):
+        plt.close(self.figure)
+
+    def load_tile(self, image_name):
+        if image_name == "broken.txt":
+            raise UnidentifiedImageError(image_name)
+        return Image.new("RGB", (300, 100), (200, 0, 0))
+
+    def test_render_page(self):
+        names = ["a.jpg", "broken.txt", None, "b.jpg"]
+        self.grid.render(names, self.load_tile)
+
+        # Only one image artist is drawn for the whole page
+        self.assertEqual(len(self.grid.axis.images), 1)
+        self.assertEqual(self.grid.names[:4], ["a.jpg", None, None, "b.jpg"])
+        self.assertEqual(self.grid.captions[0].get_text(), "a.jpg")
+        self.assertEqual(self.grid.captions[1].get_text(), "")
+
+        # The tile is downscaled to fit in its cell and centred
+        self.assertEqual(tuple(self.grid.buffer[45, 50]), (200, 0, 0))
+        self.assertEqual(tuple(self.grid.buffer[15, 50]), (255, 255, 255))
+
+        # The next page replaces the previous one in the same buffer
+        self.grid.render(["c.jpg"], self.load_tile)
+        self.assertEqual(self.grid.names[:4], ["c.jpg", None, None, None])
+        self.assertEqual(tuple(self.grid.buffer[45, 350]), (255, 255, 255))
+
+    def test_name_at(self):
+        self.grid.render(["a.jpg", "b.jpg", None, None, None, "c.jpg"], self.load_tile)
+        self.assertEqual(self.grid.name_at(150, 40), "b.jpg")
+        self.assertEqual(self.grid.name_at(20, 100), "c.jpg")
+        self.assertIsNone(self.grid.name_at(250, 40))
+        self.assertIsNone(self.grid.name_at(600, 40))
+        self.assertIsNone(self.grid.name_at(None, None))
+
+if __name__ == '__main__':
+    unittest.main()
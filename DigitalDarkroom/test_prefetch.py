@@ -0,0 +1,51 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest.mock import patch
+from PIL import Image
+import thumbnails
+from prefetch import Prefetcher
+
+class TestPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for index in range(6):
+            path = os.path.join(self.tmp_dir.name, f"image_{index}.png")
+            Image.new("RGB", (80, 40), (index, 0, 0)).save(path)
+            self.paths.append(path)
+        self.patcher = patch.object(thumbnails, "default_cache",
+                                    thumbnails.ThumbnailCache(os.path.join(self.tmp_dir.name, "Thumbnails")))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_prefetched_tiles_are_reused(self):
+        prefetcher = Prefetcher(workers = 2, capacity = 4)
+        prefetcher.prefetch(self.paths[:3], 20)
+        tile = prefetcher.get(self.paths[0], 20)
+        self.assertEqual(tile.size, (4, 2))
+        self.assertIs(prefetcher.get(self.paths[0], 20), tile)
+
+        # The least recently used tiles are dropped above the capacity
+        for path in self.paths:
+            prefetcher.get(path, 20)
+        self.assertEqual(len(prefetcher.tiles), 4)
+        self.assertNotIn((self.paths[0], 20), prefetcher.tiles)
+
+    def test_outdated_requests_are_cancelled(self):
+        slow = thumbnails.get_thumbnail
+        with patch.object(thumbnails, "get_thumbnail", lambda *key: (time.sleep(0.05), slow(*key))[1]):
+            prefetcher = Prefetcher(workers = 1)
+            prefetcher.prefetch(self.paths[:4], 20)
+
+            # Skipping to other pages cancels the requests that have not started
+            prefetcher.prefetch(self.paths[4:], 20)
+            prefetcher.pool.shutdown(wait = True)
+        self.assertLess(len(prefetcher.tiles), 6)
+        self.assertIn((self.paths[5], 20), prefetcher.tiles)
+        self.assertEqual(prefetcher.pending, {})
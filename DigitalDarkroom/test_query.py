@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from geopy.exc import GeocoderUnavailable
+import config
+import geocoding
+import query
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self):
+        db = pd.DataFrame({"Filename": ["a.jpg", "b.jpg", "c.png", "d.jpg", "e.jpg"],
+                           "Event": ["Japan", "Japan", "Japan", "Greece", "Greece"],
+                           "Format": ["JPEG", "JPEG", "PNG", "JPEG", "JPEG"],
+                           "Mode": ["RGB", "RGB", "RGBA", "RGB", "L"],
+                           "Megapixels": [12.0, 24.2, 8.0, 16.0, np.nan],
+                           "Date": [np.array("2019-01-31", dtype = np.datetime64), np.array("2019-06-30", dtype = np.datetime64),
+                                    np.array("2019-07-01", dtype = np.datetime64), pd.NaT,
+                                    np.array("2020-05-02", dtype = np.datetime64)],
+                           "Latitude": [35.01, 34.69, 35.68, 37.97, np.nan],
+                           "Longitude": [135.77, 135.50, 139.69, 23.72, np.nan]},
+                          index = pd.Index([1, 2, 3, 5, 8], name = "ID"))
+        self.patches = [patch.object(config, "DB", db), patch.object(query, "default_index", None)]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+
+    def test_parse_query(self):
+        self.assertEqual(query.parse_query('event:"New York" mp>=12 near:Kyoto 500m'),
+                         [("equal", "Event", "New York"), ("range", "Megapixels", 12.0, None, True, True),
+                          ("near", "Kyoto", 0.5)])
+        self.assertEqual(query.parse_query("date:2019-03"),
+                         [("range", "Date", np.datetime64("2019-03-01"), np.datetime64("2019-04-01"), True, False)])
+        self.assertEqual(query.parse_query("near:35,135.5")[0], ("near", (35.0, 135.5), config.query_radius))
+        for text in ("Japan", "color:red", "mp>big", "date:2019/03", 'event:"Japan'):
+            self.assertRaises(ValueError, query.parse_query, text)
+
+    def test_find_images(self):
+        self.assertEqual(query.find_images("date:2019-01..2019-06"), [1, 2])
+        self.assertEqual(query.find_images("date:2019"), [1, 2, 3])
+        self.assertEqual(query.find_images("date:2019-07.."), [3, 8])
+        self.assertEqual(query.find_images("event:japan mp>12"), [2])
+        self.assertEqual(query.find_images("mp:8..12 format:JPEG"), [1])
+        self.assertEqual(query.find_images("mode:RGB mp<=16"), [1, 5])
+        self.assertEqual(query.find_images("event:Japan format:TIFF"), [])
+        self.assertEqual(query.find_images(""), [1, 2, 3, 5, 8])
+
+    def test_near(self):
+        self.assertEqual(query.find_images("near:35.0,135.7 50km"), [1, 2])
+        self.assertEqual(query.find_images("near:35.0,135.7 10km"), [1])
+        with patch.object(geocoding, "geocode", return_value = (37.98, 23.73)):
+            self.assertEqual(query.find_images('near:"Athens, Greece" event:Greece'), [5])
+        with patch.object(geocoding, "geocode", return_value = None):
+            self.assertRaises(ValueError, query.find_images, "near:Atlantis")
+
+        # The geocoder cannot be reached (offline)
+        with patch.object(geocoding, "geocode", side_effect = GeocoderUnavailable("offline")):
+            self.assertRaises(ValueError, query.find_images, "near:Kyoto")
+
+    def test_index_rebuilt(self):
+        index = query.get_index()
+        self.assertIs(query.get_index(), index)
+
+        # An event renamed in place is found after invalidate
+        config.DB.loc[[1, 2, 3], "Event"] = "Kyoto"
+        query.invalidate()
+        self.assertEqual(query.find_images("event:Kyoto"), [1, 2, 3])
+
+        # A new database is indexed again
+        config.DB = config.DB.drop(index = [1])
+        self.assertEqual(query.find_images("event:Kyoto"), [2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from PIL import Image
+import config
+import recipes
+import thumbnails
+from storage import PickleStorage
+from recipes import (RecipeRenderer, fuse, apply_recipe)
+
+class TestRecipes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp_dir.name, "Images", "Greece"))
+        self.image_path = os.path.join(self.tmp_dir.name, "Images", "Greece", "a.png")
+        image = Image.new("RGB", (400, 200), (0, 0, 255))
+        image.paste((255, 0, 0), (0, 0, 40, 40))
+        image.save(self.image_path)
+        self.patches = [patch.object(thumbnails, "default_cache",
+                                     thumbnails.ThumbnailCache(os.path.join(self.tmp_dir.name, "Thumbnails"))),
+                        patch.object(config, "images_path", os.path.join(self.tmp_dir.name, "Images")),
+                        patch.object(config, "STORAGE", PickleStorage(os.path.join(self.tmp_dir.name, "image_DB.pkl"))),
+                        patch.object(config, "DB", pd.DataFrame({"Filename": ["a.png"], "Event": ["Greece"],
+                                                                 "Edited": [False]}, index = pd.Index([1], name = "ID")))]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_fuse_rotations(self):
+        operations = [("rotate", 90), ["rotate", 180], ("filter", "blur"),
+                      ("rotate", 270), ("rotate", 90), ("enhance", "brightness", 1.5)]
+        self.assertEqual(fuse(operations), [("rotate", 270), ("filter", "blur"),
+                                            ("enhance", "brightness", 1.5)])
+
+        # The fused recipe gives the same image
+        image = Image.open(self.image_path)
+        self.assertEqual(apply_recipe(image, operations).tobytes(),
+                         apply_recipe(image, fuse(operations)).tobytes())
+
+    def test_prefixes_are_reused(self):
+        renderer = RecipeRenderer(capacity = 8)
+        operations = [("rotate", 90), ("filter", "blur")]
+        preview = renderer.render(self.image_path, operations, scale = 4)
+        self.assertEqual(preview.size, (50, 100))
+
+        # Adding an operation only applies the new operation
+        with patch("recipes.apply_operation", wraps = recipes.apply_operation) as apply_operation:
+            renderer.render(self.image_path, operations + [("enhance", "contrast", 2.0)], scale = 4)
+            self.assertEqual(apply_operation.call_count, 1)
+            renderer.render(self.image_path, operations, scale = 4)
+            self.assertEqual(apply_operation.call_count, 1)
+
+        # The full resolution is rendered from the original
+        self.assertEqual(renderer.render(self.image_path, operations, scale = 1).size, (200, 400))
+
+    def test_recipe_is_stored_not_applied(self):
+        original = open(self.image_path, "rb").read()
+        recipes.set_recipe(1, [("rotate", 90), ("rotate", 90)])
+        self.assertEqual(recipes.get_recipe(1), [("rotate", 180)])
+        self.assertTrue(config.DB.loc[1, "Edited"])
+        self.assertEqual(open(self.image_path, "rb").read(), original)
+        self.assertEqual(config.STORAGE.load().loc[1, "Recipe"], '[["rotate", 180]]')
+
+        # The export is rendered at full resolution
+        output_path = os.path.join(self.tmp_dir.name, "a_2.png")
+        recipes.export(1, recipes.get_recipe(1), output_path)
+        with Image.open(output_path) as image:
+            self.assertEqual(image.getpixel((399, 199)), (255, 0, 0))
+
+        recipes.set_recipe(1, [])
+        self.assertEqual(recipes.get_recipe(1), [])
+        self.assertFalse(config.DB.loc[1, "Edited"])
+        self.assertEqual(recipes.copy_name(1), "a_2.png")
+
+if __name__ == '__main__':
+    unittest.main()
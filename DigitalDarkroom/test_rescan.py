@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from PIL import Image
+import config
+import hashing
+from storage import PickleStorage
+from rescan import (file_signature, scan_library, rescan)
+
+class TestRescan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.images_path = os.path.join(self.tmp_dir.name, "Images")
+        for event in ("Japan", "Greece"):
+            os.makedirs(os.path.join(self.images_path, event))
+        for name in ("a.jpg", "b.jpg", "c.jpg"):
+            Image.new("RGB", (40, 30), "red").save(os.path.join(self.images_path, "Japan", name))
+        open(os.path.join(self.images_path, "Japan", "notes.txt"), "w").close()
+        self.db_path = os.path.join(self.tmp_dir.name, "image_DB.pkl")
+        self.patches = [patch.object(config, "images_path", self.images_path),
+                        patch.object(config, "STORAGE", PickleStorage(self.db_path)),
+                        patch.object(config, "DB", pd.DataFrame(columns = ["Filename", "Event", "Edited"]))]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def path(self, event, name):
+        return os.path.join(self.images_path, event, name)
+
+    def test_scan_library(self):
+        scanned = scan_library(self.images_path).set_index("Filename")
+        self.assertEqual(sorted(scanned.index), ["a.jpg", "b.jpg", "c.jpg"])
+        self.assertEqual(tuple(scanned.loc["a.jpg", ["Event", "Size", "Mtime"]]),
+                         ("Japan",) + file_signature(self.path("Japan", "a.jpg")))
+
+    def test_rescan(self):
+        result = rescan(workers = 2)
+        self.assertEqual(sorted(result["added"]), [os.path.join("Japan", name) for name in ("a.jpg", "b.jpg", "c.jpg")])
+        ids = dict(zip(config.DB["Filename"], config.DB.index))
+        self.assertEqual(config.DB.loc[ids["a.jpg"], "Width"], 40)
+        config.DB.loc[ids["a.jpg"], "Location"] = "Kyoto"
+        config.STORAGE.save_rows(config.DB, [ids["a.jpg"]])
+
+        # An unchanged library is not written
+        with patch.object(config.STORAGE, "save_rows") as save_rows, \
+             patch.object(config.STORAGE, "delete_rows") as delete_rows:
+            result = rescan()
+        self.assertEqual([len(names) for names in result.values()], [0, 0, 0, 0, 0])
+        save_rows.assert_not_called()
+        delete_rows.assert_not_called()
+
+        # Changed, moved, deleted and new files (the same file name in another event is another image)
+        Image.new("RGB", (60, 20), "blue").save(self.path("Japan", "a.jpg"))
+        os.utime(self.path("Japan", "a.jpg"), (0, 1))
+        shutil.move(self.path("Japan", "b.jpg"), self.path("Greece", "b.jpg"))
+        os.remove(self.path("Japan", "c.jpg"))
+        Image.new("RGB", (10, 10)).save(self.path("Greece", "d.png"))
+        Image.new("RGB", (10, 10)).save(self.path("Greece", "a.jpg"))
+        open(self.path("Greece", "e.jpg"), "w").close()
+        result = rescan()
+        result["added"].sort()
+        self.assertEqual(result, {"added": [os.path.join("Greece", "a.jpg"), os.path.join("Greece", "d.png")],
+                                  "updated": [os.path.join("Japan", "a.jpg")],
+                                  "moved": [os.path.join("Greece", "b.jpg")],
+                                  "removed": [os.path.join("Japan", "c.jpg")],
+                                  "skipped": [os.path.join("Greece", "e.jpg")]})
+
+        saved = PickleStorage(self.db_path).load()
+        self.assertEqual(sorted(zip(saved["Event"], saved["Filename"])),
+                         [("Greece", "a.jpg"), ("Greece", "b.jpg"), ("Greece", "d.png"), ("Japan", "a.jpg")])
+        self.assertEqual(tuple(saved.loc[ids["a.jpg"], ["Width", "Height", "Location", "Event"]]),
+                         (60, 20, "Kyoto", "Japan"))
+        self.assertEqual(saved.loc[ids["b.jpg"], "Event"], "Greece")
+        self.assertNotIn(ids["c.jpg"], saved.index)
+
+    def test_same_name_from_another_camera(self):
+        rescan()
+        ids = dict(zip(config.DB["Filename"], config.DB.index))
+        config.DB.loc[ids["a.jpg"], ["Location", "Edited"]] = ("Kyoto", True)
+        config.STORAGE.save_rows(config.DB, [ids["a.jpg"]])
+
+        # A different image with the name of a deleted one is a new image
+        os.remove(self.path("Japan", "a.jpg"))
+        Image.new("RGB", (50, 50), "green").save(self.path("Greece", "a.jpg"))
+        result = rescan()
+        self.assertEqual((result["added"], result["moved"], result["removed"]),
+                         ([os.path.join("Greece", "a.jpg")], [], [os.path.join("Japan", "a.jpg")]))
+        new_id = config.DB.index[config.DB["Filename"] == "a.jpg"][0]
+        self.assertNotEqual(new_id, ids["a.jpg"])
+        self.assertNotEqual(config.DB.loc[new_id, "Location"], "Kyoto")
+
+        # A copy of the same file (another modification time) is found by its content hash
+        config.DB.loc[new_id, "Hash"] = hashing.content_hash(self.path("Greece", "a.jpg"))
+        config.DB.loc[new_id, "Location"] = "Athens"
+        shutil.copyfile(self.path("Greece", "a.jpg"), self.path("Japan", "a.jpg"))
+        os.utime(self.path("Japan", "a.jpg"), (0, 1))
+        os.remove(self.path("Greece", "a.jpg"))
+        result = rescan()
+        self.assertEqual(result["moved"], [os.path.join("Japan", "a.jpg")])
+        self.assertEqual(config.DB.loc[new_id, "Location"], "Athens")
+
+    def test_legacy_rows_are_adopted(self):
+        config.DB = pd.DataFrame({"Filename": ["a.jpg", "b.jpg", "c.jpg"], "Event": ["Japan"] * 3, "Width": [1, 2, 3]},
+                                 index = pd.Index([1, 2, 3], name = "ID"))
+        result = rescan()
+        self.assertEqual(result["updated"], [])
+        self.assertEqual(list(config.DB["Width"]), [1, 2, 3])
+        self.assertEqual(PickleStorage(self.db_path).load().loc[2, "Size"],
+                         os.path.getsize(self.path("Japan", "b.jpg")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from PIL import Image
+import config
+import thumbnails
+from storage import PickleStorage
+from metadata_reader import (ORIENTATION, read_metadata, orient)
+from rotation import (ROTATIONS, compose_orientation, rotate_file, rotate_images)
+
+class TestRotation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.event_path = os.path.join(self.tmp_dir.name, "Images", "Greece")
+        os.makedirs(self.event_path)
+        generator = np.random.default_rng(0)
+        self.image = Image.fromarray(generator.integers(0, 256, (48, 64, 3), dtype = np.uint8))
+        self.patches = [patch.object(thumbnails, "default_cache",
+                                     thumbnails.ThumbnailCache(os.path.join(self.tmp_dir.name, "Thumbnails"))),
+                        patch.object(config, "images_path", os.path.join(self.tmp_dir.name, "Images")),
+                        patch.object(config, "STORAGE", PickleStorage(os.path.join(self.tmp_dir.name, "image_DB.pkl")))]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def displayed(self, path):
+        with Image.open(path) as image:
+            image.load()
+            return orient(image)
+
+    def test_compose_orientation(self):
+        for orientation in range(1, 9):
+            self.assertEqual(compose_orientation(compose_orientation(orientation, 90), 270), orientation)
+            self.assertEqual(compose_orientation(compose_orientation(orientation, 180), 180), orientation)
+        self.assertEqual(compose_orientation(1, 90), 8)
+        self.assertEqual(compose_orientation(1, 270), 6)
+
+    def test_jpeg_rotation_is_lossless(self):
+        for exif in (None, {ORIENTATION: 6}, {0x010F: "Camera"}):
+            path = os.path.join(self.event_path, "a.jpg")
+            if exif is None:
+                self.image.save(path, quality = 80)
+            else:
+                image_exif = Image.Exif()
+                image_exif.update(exif)
+                self.image.save(path, quality = 80, exif = image_exif)
+            before = self.displayed(path)
+            with Image.open(path) as image:
+                pixels = image.tobytes()
+
+            for degrees in (90, 180, 270):
+                rotate_file(path, degrees)
+                self.assertEqual(self.displayed(path).tobytes(), before.transpose(ROTATIONS[degrees]).tobytes())
+                before = self.displayed(path)
+
+                # The decoded pixels are the same as before the rotation
+                with Image.open(path) as image:
+                    self.assertEqual(image.tobytes(), pixels)
+                    if 0x010F in (exif or {}):
+                        self.assertEqual(image.getexif()[0x010F], "Camera")
+            self.assertIsNotNone(read_metadata(path)["orientation_offset"])
+
+    def test_rotate_images(self):
+        self.image.save(os.path.join(self.event_path, "a.jpg"))
+        self.image.save(os.path.join(self.event_path, "b.png"))
+        db = pd.DataFrame({"Filename": ["a.jpg", "b.png"], "Event": ["Greece", "Greece"], "Edited": [False, False],
+                           "Width": [64, 64], "Height": [48, 48]}, index = pd.Index([1, 2], name = "ID"))
+        with patch.object(config, "DB", db):
+            thumbnail = thumbnails.get_thumbnail(os.path.join(self.event_path, "a.jpg"), 4)
+            self.assertEqual(rotate_images([1, 2], 90), [1, 2])
+            saved = config.STORAGE.load()
+            self.assertEqual(list(saved["Width"]), [48, 48])
+            self.assertEqual(list(saved["Height"]), [64, 64])
+            self.assertTrue(saved["Edited"].all())
+
+            # Other formats are transposed, the thumbnails follow the orientation
+            with Image.open(os.path.join(self.event_path, "b.png")) as image:
+                self.assertEqual(image.tobytes(), self.image.transpose(ROTATIONS[90]).tobytes())
+            self.assertEqual(thumbnails.get_thumbnail(os.path.join(self.event_path, "a.jpg"), 4).size,
+                             thumbnail.size[::-1])
+
+    def test_rotate_oriented_jpeg(self):
+        from organise_images import image_metadata
+
+        # A 60x40 frame displayed as 40x60 (orientation 6)
+        path = os.path.join(self.event_path, "c.jpg")
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        Image.new("RGB", (60, 40)).save(path, exif = exif)
+        row = image_metadata(path, self.event_path, "c.jpg")
+        self.assertEqual((row["Width"], row["Height"]), (40, 60))
+
+        db = pd.DataFrame([row], index = pd.Index([1], name = "ID"))
+        with patch.object(config, "DB", db):
+            rotate_images([1], 90)
+            self.assertEqual(self.displayed(path).size, (60, 40))
+            self.assertEqual((config.DB.loc[1, "Width"], config.DB.loc[1, "Height"]), (60, 40))
+
+if __name__ == '__main__':
+    unittest.main()
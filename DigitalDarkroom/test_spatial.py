@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import config
+import spatial
+from spatial import (SpatialIndex, haversine)
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        self.ids = np.arange(1, 2001)
+        self.latitudes = generator.uniform(-90, 90, len(self.ids))
+        self.longitudes = generator.uniform(-180, 180, len(self.ids))
+        self.index = SpatialIndex(self.ids, self.latitudes, self.longitudes, cell = 5, merge_size = 50)
+
+    def test_radius_and_bbox(self):
+        for latitude, longitude, radius in [(35.0, 135.7, 800), (0, 179.5, 1500), (88, -20, 600), (-10, 0, 20000)]:
+            expected = self.ids[haversine(latitude, longitude, self.latitudes, self.longitudes) <= radius]
+            self.assertEqual(self.index.radius(latitude, longitude, radius).tolist(), expected.tolist())
+
+        inside = (self.latitudes >= -20) & (self.latitudes <= 30) & (self.longitudes >= 10) & (self.longitudes <= 60)
+        self.assertEqual(self.index.bbox(-20, 10, 30, 60).tolist(), self.ids[inside].tolist())
+
+        # A box crossing the antimeridian
+        inside = (self.latitudes >= 0) & (self.latitudes <= 40) & ((self.longitudes >= 170) | (self.longitudes <= -170))
+        self.assertEqual(self.index.bbox(0, 170, 40, -170).tolist(), self.ids[inside].tolist())
+
+    def test_update(self):
+        self.index.update([1, 2, 5000], [10.0, np.nan, 10.1], [20.0, np.nan, 20.1])
+        self.assertEqual(self.index.radius(10, 20, 50).tolist(), [1, 5000])
+        self.assertNotIn(2, self.index.bbox(-90, -180, 90, 180))
+        self.assertEqual(len(self.index), len(self.ids))
+
+        # Enough changes are merged into the sorted arrays
+        self.index.update(range(100, 160), [-45.0] * 60, [-60.0] * 60)
+        self.assertEqual(self.index.pending, {})
+        self.assertEqual(self.index.radius(10, 20, 50).tolist(), [1, 5000])
+        self.assertEqual(self.index.bbox(-45, -60, -45, -60).tolist(), list(range(100, 160)))
+
+    def test_refresh(self):
+        db = pd.DataFrame({"Filename": ["a.jpg", "b.jpg", "c.jpg"], "Latitude": [35.0, np.nan, 37.9],
+                           "Longitude": [135.7, np.nan, 23.7]}, index = pd.Index([1, 2, 3], name = "ID"))
+        with patch.object(config, "DB", db), patch.object(spatial, "default_index", None):
+            index = spatial.get_index()
+            self.assertEqual(index.radius(35.0, 135.7, 10).tolist(), [1])
+
+            # Coordinates set in place are recorded without building the index again
+            config.DB.loc[2, ["Latitude", "Longitude"]] = (35.01, 135.71)
+            spatial.refresh([2])
+            self.assertIs(spatial.get_index(), index)
+            self.assertEqual(index.radius(35.0, 135.7, 10).tolist(), [1, 2])
+
+            # New images are recorded if the index was up to date with the previous database
+            previous = config.DB
+            config.DB = pd.concat([config.DB, pd.DataFrame({"Filename": ["d.jpg"], "Latitude": [35.02],
+                                                            "Longitude": [135.72]}, index = pd.Index([4], name = "ID"))])
+            spatial.refresh([4], previous)
+            self.assertIs(spatial.get_index(), index)
+            self.assertEqual(index.radius(35.0, 135.7, 10).tolist(), [1, 2, 4])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import config
+from storage import (PickleStorage, SQLiteStorage, migrate, open_storage)
+
+class TestSQLiteStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pickle_path = os.path.join(self.tmp_dir.name, "image_DB.pkl")
+        self.sqlite_path = os.path.join(self.tmp_dir.name, "image_DB.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_migrate_bundled_database(self):
+        # The bundled database is indexed by the image names and gets IDs when it is loaded
+        shutil.copyfile(config.db_path, self.pickle_path)
+        self.assertNotIn("Filename", pd.read_pickle(self.pickle_path).columns)
+        db = PickleStorage(self.pickle_path).load()
+        self.assertEqual(list(db.index[:2]), [1, 2])
+        self.assertEqual(migrate(self.pickle_path, self.sqlite_path), len(db))
+        self.assertIsInstance(open_storage(self.pickle_path, self.sqlite_path), SQLiteStorage)
+        self.assertRaises(FileExistsError, migrate, self.pickle_path, self.sqlite_path)
+
+        loaded = SQLiteStorage(self.sqlite_path).load()
+        image_id = db.index[0]
+        self.assertEqual(loaded.loc[image_id, "Filename"], db.loc[image_id, "Filename"])
+        self.assertEqual(loaded.loc[image_id, "Event"], db.loc[image_id, "Event"])
+        self.assertEqual(loaded.loc[image_id, "Width"], db.loc[image_id, "Width"])
+        self.assertEqual(loaded.loc[image_id, "Date"], pd.Timestamp(db.loc[image_id, "Date"][()]))
+
+    def test_row_level_changes(self):
+        self.assertIsInstance(open_storage(self.pickle_path, self.sqlite_path), PickleStorage)
+        storage = SQLiteStorage(self.sqlite_path)
+        db = pd.DataFrame({"Filename": ["a.jpg", "b.jpg", "a.jpg"],
+                           "Event": ["Japan", "Japan", "Greece"],
+                           "Width": [100, 200, 300],
+                           "Date": [np.datetime64("2019-01-02"), pd.NaT, pd.NaT],
+                           "Edited": [False, True, np.nan]},
+                          index = pd.Index([1, 2, 3], name = "ID"))
+        storage.save(db)
+
+        db.loc[1, ["Latitude", "Longitude", "Location"]] = (35.0, 135.7, "Kyoto")
+        storage.save_rows(db, [1])
+        db = db.drop(index = 3)
+        storage.delete_rows(db, [3])
+        db.loc[2, "Filename"] = "d.jpg"
+        storage.save_rows(db, [2])
+
+        loaded = SQLiteStorage(self.sqlite_path).load()
+        self.assertEqual(list(loaded.index), [1, 2])
+        self.assertEqual(list(loaded["Filename"]), ["a.jpg", "d.jpg"])
+        self.assertEqual(loaded.loc[1, "Location"], "Kyoto")
+        self.assertEqual(loaded.loc[1, "Date"], pd.Timestamp("2019-01-02"))
+        self.assertIs(loaded.loc[2, "Edited"], True)
+        self.assertEqual(len(storage.load('"Event" = ?', ("Japan",))), 2)
+
+        # There is one image per event and file name
+        db.loc[4] = db.loc[1]
+        self.assertRaises(sqlite3.IntegrityError, storage.save_rows, db, [4])
+
+    def test_upgrade_catalogue_indexed_by_name(self):
+        connection = sqlite3.connect(self.sqlite_path)
+        with connection:
+            connection.execute('CREATE TABLE images ("Filename" TEXT PRIMARY KEY, "Event" TEXT, "Width" INTEGER)')
+            connection.execute('CREATE INDEX images_event ON images ("Event")')
+            connection.executemany("INSERT INTO images VALUES (?, ?, ?)",
+                                   [("a.jpg", "Japan", 100), ("b.jpg", "Greece", 200)])
+        connection.close()
+
+        loaded = SQLiteStorage(self.sqlite_path).load()
+        self.assertEqual(list(loaded.index), [1, 2])
+        self.assertEqual(list(loaded["Filename"]), ["a.jpg", "b.jpg"])
+        self.assertEqual(loaded.loc[2, "Width"], 200)
+
+class TestPickleStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "image_DB.pkl")
+        self.db = pd.DataFrame({"Filename": ["a.jpg", "b.jpg", "c.jpg"],
+                                "Event": ["Japan", "Japan", "Greece"], "Width": [100, 200, 300]},
+                               index = pd.Index([1, 2, 3], name = "ID"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_journal_replay(self):
+        storage = PickleStorage(self.path)
+        storage.save(self.db)
+        db = self.db.copy()
+        db.loc[1, "Width"] = 150
+        db.loc[4] = ("d.jpg", "Greece", 400)
+        storage.save_rows(db, [1, 4])
+        db = db.drop(index = 3)
+        storage.delete_rows(db, [3])
+        db.loc[2, "Filename"] = "e.jpg"
+        storage.save_rows(db, [2])
+
+        # The pickle file is not rewritten, the changes are in the journal
+        self.assertEqual(list(pd.read_pickle(self.path)["Filename"]), ["a.jpg", "b.jpg", "c.jpg"])
+        self.assertEqual(storage.records, 3)
+        loaded = PickleStorage(self.path).load()
+        self.assertEqual(list(loaded["Filename"]), ["a.jpg", "e.jpg", "d.jpg"])
+        self.assertEqual(loaded.loc[1, "Width"], 150)
+
+        # A torn last record (interrupted write) is ignored
+        with open(storage.journal_path, "ab") as file:
+            file.write(b"\x80\x05\x95garbage")
+        self.assertEqual(list(PickleStorage(self.path).load()["Filename"]), ["a.jpg", "e.jpg", "d.jpg"])
+
+        # The torn record is cut off, so the changes saved after it are kept
+        storage = PickleStorage(self.path)
+        db = storage.load()
+        db.loc[5] = ("f.jpg", "Greece", 500)
+        storage.save_rows(db, [5])
+        self.assertEqual(list(PickleStorage(self.path).load()["Filename"]), ["a.jpg", "e.jpg", "d.jpg", "f.jpg"])
+        db = db.drop(index = 5)
+        storage.delete_rows(db, [5])
+
+        storage.flush(db)
+        self.assertFalse(os.path.exists(storage.journal_path))
+        self.assertEqual(list(pd.read_pickle(self.path).index), [1, 2, 4])
+
+    def test_checkpoint(self):
+        storage = PickleStorage(self.path, checkpoint_records = 3)
+        storage.save(self.db)
+        for width in (1, 2, 3):
+            self.db.loc[1, "Width"] = width
+            storage.save_rows(self.db, [1])
+        self.assertFalse(os.path.exists(storage.journal_path))
+        self.assertEqual(pd.read_pickle(self.path).loc[1, "Width"], 3)
+
+    def test_snapshots(self):
+        storage = PickleStorage(self.path, snapshots = 2)
+        for width in (1, 2, 3, 4):
+            self.db.loc[1, "Width"] = width
+            storage.save(self.db)
+        self.assertEqual(pd.read_pickle(storage.snapshot_path(1)).loc[1, "Width"], 3)
+        self.assertEqual(pd.read_pickle(storage.snapshot_path(2)).loc[1, "Width"], 2)
+        self.assertFalse(os.path.exists(storage.snapshot_path(3)))
+
+        # Quitting without changes does not shift the snapshots
+        storage.flush(self.db)
+        self.assertEqual(pd.read_pickle(storage.snapshot_path(1)).loc[1, "Width"], 3)
+        self.assertEqual(pd.read_pickle(storage.snapshot_path(2)).loc[1, "Width"], 2)
+        self.assertEqual([name for name in os.listdir(self.tmp_dir.name) if name.endswith(".tmp")], [])
+
+        # A corrupted pickle file falls back to the most recent snapshot
+        with open(self.path, "wb") as file:
+            file.write(b"not a pickle")
+        self.assertEqual(PickleStorage(self.path, snapshots = 2).load().loc[1, "Width"], 3)
+
+    def test_upgrade_database_indexed_by_name(self):
+        storage = PickleStorage(self.path)
+        self.db.drop(columns = "Filename").set_axis(["a.jpg", "b.jpg", "c.jpg"]).to_pickle(self.path)
+        with open(storage.journal_path, "wb") as file:
+            pickle.dump(("rename", "b.jpg", "e.jpg"), file)
+
+        db = storage.load()
+        self.assertEqual(list(db.index), [1, 2, 3])
+        self.assertEqual(list(db["Filename"]), ["a.jpg", "e.jpg", "c.jpg"])
+
+        # Loading does not write the file, the changes made since are applied with the same IDs
+        self.assertNotIn("Filename", pd.read_pickle(self.path).columns)
+        db.loc[2, "Width"] = 250
+        storage.save_rows(db, [2])
+        db = db.drop(index = 3)
+        storage.delete_rows(db, [3])
+        loaded = PickleStorage(self.path).load()
+        self.assertEqual(list(loaded["Filename"]), ["a.jpg", "e.jpg"])
+        self.assertEqual(loaded.loc[2, "Width"], 250)
+
+        storage.flush(db)
+        self.assertEqual(list(pd.read_pickle(self.path)["Filename"]), ["a.jpg", "e.jpg"])
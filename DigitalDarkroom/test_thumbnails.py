@@ -0,0 +1,48 @@
+import os
+import time
+import tempfile
+import unittest
+from PIL import Image
+from thumbnails import ThumbnailCache
+
+class TestThumbnailCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.tmp_dir.name, "image.jpg")
+        Image.new("RGB", (400, 200), "red").save(self.image_path)
+        self.cache = ThumbnailCache(os.path.join(self.tmp_dir.name, "Thumbnails"), budget = 10 ** 6)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_thumbnail_sizes_and_reuse(self):
+        self.assertEqual(self.cache.get(self.image_path, 20).size, (20, 10))
+        self.assertEqual(self.cache.get(self.image_path, 4).size, (100, 50))
+        self.assertEqual(len(self.cache.files()), 2)
+        self.assertEqual(self.cache.get(self.image_path, 20).size, (20, 10))
+        self.assertEqual(len(self.cache.files()), 2)
+
+    def test_replaced_original_and_invalidate(self):
+        self.cache.get(self.image_path, 20)
+        time.sleep(0.01)
+        Image.new("RGB", (800, 200), "blue").save(self.image_path)
+        self.assertEqual(self.cache.get(self.image_path, 20).size, (40, 10))
+        self.cache.invalidate(self.image_path)
+        self.assertEqual(self.cache.files(), [])
+
+    def test_eviction_under_budget(self):
+        paths = []
+        for index in range(5):
+            path = os.path.join(self.tmp_dir.name, f"image_{index}.png")
+            Image.effect_noise((400, 400), 100).save(path)
+            paths.append(path)
+        self.cache.get(paths[0], 1)
+        self.cache.budget = 2.5 * self.cache.total
+        for path in paths[1:]:
+            self.cache.get(path, 1)
+        self.assertLessEqual(self.cache.total, self.cache.budget)
+        self.assertEqual(self.cache.total, sum(size for _, size, _ in self.cache.files()))
+
+        # The most recently used thumbnail is kept
+        self.assertTrue(os.path.exists(self.cache.thumbnail_path(paths[-1], 1)))
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+from PIL import (Image, ImageFilter)
+import config
+import recipes
+import tiling
+from tiling import (tile_boxes, filter_tiled, enhance_tiled)
+
+class TestTiling(unittest.TestCase):
+
+    def setUp(self):
+        # Noise image whose size is not a multiple of the tile size
+        generator = np.random.default_rng(0)
+        self.image = Image.fromarray(generator.integers(0, 256, (203, 317, 3), dtype = np.uint8))
+        self.image_rgba = self.image.convert("RGBA")
+        self.image_rgba.putalpha(Image.fromarray(generator.integers(0, 256, (203, 317), dtype = np.uint8)))
+
+    def test_tile_boxes(self):
+        boxes = tile_boxes((317, 203), 64)
+        self.assertEqual(len(boxes), 5 * 4)
+        self.assertEqual(boxes[-1], (256, 192, 317, 203))
+        self.assertEqual(sum((box[2] - box[0]) * (box[3] - box[1]) for box in boxes), 317 * 203)
+
+    def test_filters_are_identical(self):
+        for image in (self.image, self.image_rgba.convert("RGB"), self.image.convert("L")):
+            for image_filter in recipes.FILTERS.values():
+                for workers in (1, 4):
+                    tiled = filter_tiled(image, image_filter, tile_size = 64, workers = workers)
+                    self.assertEqual(tiled.tobytes(), image.filter(image_filter).tobytes(),
+                                     f"{image_filter.name} {image.mode}")
+
+        # Other kernel sizes use larger halos
+        median = ImageFilter.MedianFilter(7)
+        self.assertEqual(filter_tiled(self.image, median, tile_size = 50).tobytes(),
+                         self.image.filter(median).tobytes())
+
+    def test_enhancements_are_identical(self):
+        for image in (self.image, self.image_rgba):
+            for enhancer in recipes.ENHANCERS.values():
+                for factor in (0.3, 1.7):
+                    tiled = enhance_tiled(image, enhancer, factor, tile_size = 64, workers = 3)
+                    self.assertEqual(tiled.tobytes(), enhancer(image).enhance(factor).tobytes(),
+                                     f"{enhancer.__name__} {image.mode} {factor}")
+
+    def test_recipes_use_tiles_for_large_images(self):
+        operations = [("filter", "blur"), ("enhance", "contrast", 1.4), ("rotate", 90), ("enhance", "sharpness", 2.0)]
+        whole = recipes.apply_recipe(self.image, operations)
+        with patch.object(config, "tile_threshold", 1000), patch.object(config, "tile_size", 64), \
+             patch("tiling.process_tiled", wraps = tiling.process_tiled) as process_tiled:
+            tiled = recipes.apply_recipe(self.image, operations)
+        self.assertEqual(process_tiled.call_count, 3)
+        self.assertEqual(tiled.tobytes(), whole.tobytes())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from PIL import Image
+import config
+from storage import PickleStorage
+from watch import Watcher
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.images_path = os.path.join(self.tmp_dir.name, "Images")
+        self.drop_path = os.path.join(self.tmp_dir.name, "Drop")
+        os.makedirs(os.path.join(self.images_path, "Japan"))
+        os.makedirs(self.drop_path)
+        self.db_path = os.path.join(self.tmp_dir.name, "image_DB.pkl")
+        self.patches = [patch.object(config, "images_path", self.images_path),
+                        patch.object(config, "STORAGE", PickleStorage(self.db_path)),
+                        patch.object(config, "DB", pd.DataFrame(columns = ["Filename", "Event", "Edited"]))]
+        for patcher in self.patches:
+            patcher.start()
+        self.watcher = Watcher({self.drop_path: "Greece"}, settle = 5)
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_drop_folder_is_debounced(self):
+        path = os.path.join(self.drop_path, "a.jpg")
+        Image.new("RGB", (8, 8)).save(path)
+        open(os.path.join(self.drop_path, "notes.txt"), "w").close()
+        self.assertEqual(self.watcher.poll(now = 0), ({}, []))
+
+        # The file changes (still being copied): the delay starts again
+        Image.new("RGB", (16, 8)).save(path)
+        os.utime(path, (1, 1))
+        self.assertEqual(self.watcher.poll(now = 4), ({}, []))
+        self.assertEqual(self.watcher.poll(now = 8), ({}, []))
+        files, events = self.watcher.poll(now = 9)
+        self.assertEqual(files, {"Greece": [path]})
+
+        counts = self.watcher.process(files, events)
+        self.assertEqual(counts["uploaded"], 1)
+        self.assertEqual(config.DB.loc[1, "Filename"], "a.jpg")
+        self.assertEqual(config.DB.loc[1, "Event"], "Greece")
+        self.assertEqual(config.DB.loc[1, "Width"], 16)
+        self.assertTrue(os.path.isfile(os.path.join(self.images_path, "Greece", "a.jpg")))
+
+        # The file is not uploaded again, the new event folder is rescanned without changes
+        self.assertEqual(self.watcher.poll(now = 20), ({}, []))
+        files, events = self.watcher.poll(now = 30)
+        self.assertEqual((files, events), ({}, ["Greece"]))
+        self.assertEqual(self.watcher.process(files, events)["added"], 0)
+
+        # Files removed from the drop folder are forgotten
+        Image.new("RGB", (8, 8)).save(os.path.join(self.drop_path, "b.jpg"))
+        self.watcher.poll(now = 40)
+        self.assertEqual(list(self.watcher.pending_files), [os.path.join(self.drop_path, "b.jpg")])
+        os.remove(os.path.join(self.drop_path, "b.jpg"))
+        os.remove(path)
+        self.watcher.poll(now = 41)
+        self.assertEqual((self.watcher.pending_files, self.watcher.processed), ({}, {}))
+
+    def test_event_folders_are_rescanned(self):
+        for name in ("a.jpg", "b.jpg"):
+            Image.new("RGB", (8, 8)).save(os.path.join(self.images_path, "Japan", name))
+        self.assertEqual(self.watcher.poll(now = 0), ({}, []))
+        self.assertEqual(self.watcher.poll(now = 5), ({}, ["Japan"]))
+        self.assertEqual(self.watcher.process({}, ["Japan"])["added"], 2)
+
+        # Unchanged folders are not listed again
+        with patch.object(self.watcher, "event_signature") as event_signature:
+            self.assertEqual(self.watcher.poll(now = 10), ({}, []))
+        event_signature.assert_not_called()
+
+        # A renamed event
+        shutil.move(os.path.join(self.images_path, "Japan"), os.path.join(self.images_path, "Kyoto"))
+        self.watcher.poll(now = 20)
+        files, events = self.watcher.poll(now = 25)
+        self.assertEqual(events, ["Japan", "Kyoto"])
+        self.assertEqual(self.watcher.process(files, events)["moved"], 2)
+        self.assertEqual(list(PickleStorage(self.db_path).load()["Event"]), ["Kyoto", "Kyoto"])
+
+    def test_images_rewritten_in_place(self):
+        self.watcher = Watcher({self.drop_path: "Greece"}, settle = 5, check_interval = 60)
+        path = os.path.join(self.images_path, "Japan", "a.jpg")
+        Image.new("RGB", (8, 8)).save(path)
+        self.watcher.poll(now = 0)
+        self.assertEqual(self.watcher.process({}, self.watcher.poll(now = 5)[1])["added"], 1)
+
+        # The folder keeps its modification time: the change is found when every folder is listed
+        folder_times = os.stat(os.path.dirname(path))
+        Image.new("RGB", (32, 16)).save(path)
+        os.utime(os.path.dirname(path), ns = (folder_times.st_atime_ns, folder_times.st_mtime_ns))
+        self.assertEqual(self.watcher.poll(now = 30), ({}, []))
+        self.assertEqual(self.watcher.poll(now = 60), ({}, []))
+        files, events = self.watcher.poll(now = 65)
+        self.assertEqual(events, ["Japan"])
+        self.assertEqual(self.watcher.process(files, events)["updated"], 1)
+        self.assertEqual(config.DB.loc[1, "Width"], 32)
+
+        # The folder is not rescanned again until it changes
+        self.assertEqual(self.watcher.poll(now = 130), ({}, []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+"""
+Module to cache downscaled copies (thumbnails) of the images on disk.
+
+A thumbnail is identified by the path, modification time and size of the
+original and by its scale (1/20 for the panorama grid, 1/4 for the diaporama),
+so a replaced original never uses an outdated thumbnail. The least recently used
+thumbnails are deleted when the cache exceeds its disk budget.
+
+Classes
+-------
+ThumbnailCache
+    Disk cache of thumbnails with a size budget.
+
+Functions
+---------
+load_downscaled
+    Function to open an image and downscale it by a given factor.
+
+get_thumbnail
+    Function to get the thumbnail of an image at a given scale (created if needed).
+
+generate
+    Function to create the thumbnails of an image at all the display scales.
+
+invalidate
+    Function to delete the thumbnails of an image.
+"""
+import os
+import hashlib
+import tempfile
+import threading
+import config
+from PIL import Image
+from metadata_reader import (ORIENTATION, orient)
+
+def load_downscaled(path, scale):
+    """ Opens an image and downscales it by a factor without decoding it at full size.
+
+    JPEG images are decoded directly at 1/2, 1/4 or 1/8 of their size by libjpeg
+    (DCT scaling, see PIL.Image.draft). The remaining factor is reduced by box
+    averaging (PIL.Image.reduce) and resampled with a Lanczos filter. The result is
+    turned as given by the exif orientation of the image.
+
+    Parameters
+    ----------
+    path : str
+        the path to the image.
+    scale : int
+        the downscaling factor. Example: 20 for 1/20 of the width and height.
+
+    Returns
+    -------
+    PIL.Image
+        the downscaled image.
+    """
+    with Image.open(path) as image:
+        orientation = image.getexif().get(ORIENTATION, 1)
+        width = max(1, int(image.size[0] / scale))
+        height = max(1, int(image.size[1] / scale))
+        image.draft(None, (width, height))
+        return orient(image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap = 2.0),
+                      orientation)
+
+class ThumbnailCache():
+    """ Disk cache of thumbnails, limited to a size budget.
+
+    Attributes
+    ----------
+    path : str
+        the folder where the thumbnails are stored.
+    budget : int
+        the maximum size of the cache in bytes.
+    """
+
+    def __init__(self, path, budget = config.thumbnail_budget):
+        self.path = path
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.total = None
+
+    def key(self, image_path):
+        """ Returns the identifier of the original image in the cache (hash of its path).
+        """
+        return hashlib.sha1(os.path.realpath(image_path).encode()).hexdigest()
+
+    def thumbnail_path(self, image_path, scale):
+        """ Returns the path of the thumbnail of an image, depending on the current
+        modification time and size of the image.
+        """
+        stat = os.stat(image_path)
+        key = self.key(image_path)
+        return os.path.join(self.path, key[:2], f"{key}_{stat.st_mtime_ns}_{stat.st_size}_{scale}.jpg")
+
+    def get(self, image_path, scale):
+        """ Returns the thumbnail of an image, created and stored if not in the cache.
+
+        Parameters
+        ----------
+        image_path : str
+            the path to the original image.
+        scale : int
+            the downscaling factor.
+
+        Returns
+        -------
+        PIL.Image
+            the thumbnail.
+        """
+        thumbnail_path = self.thumbnail_path(image_path, scale)
+        try:
+            thumbnail = Image.open(thumbnail_path)
+            thumbnail.load()
+
+            # The modification time of a thumbnail is its last use
+            os.utime(thumbnail_path)
+            return thumbnail
+        except OSError:
+            pass
+        thumbnail = load_downscaled(image_path, scale)
+        self.store(thumbnail, thumbnail_path)
+        return thumbnail
+
+    def store(self, thumbnail, thumbnail_path):
+        """ Writes a thumbnail in the cache and deletes old thumbnails if over budget.
+        """
+        folder = os.path.dirname(thumbnail_path)
+        os.makedirs(folder, exist_ok = True)
+        if thumbnail.mode not in ("RGB", "L"):
+            thumbnail = thumbnail.convert("RGB")
+
+        # Write to a temporary file first so that a thumbnail is never read half-written
+        descriptor, temporary_path = tempfile.mkstemp(dir = folder, suffix = ".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            thumbnail.save(file, "JPEG", quality = 90)
+        os.replace(temporary_path, thumbnail_path)
+        with self.lock:
+            if self.total is None:
+                self.total = sum(size for _, size, _ in self.files())
+            else:
+                self.total += os.path.getsize(thumbnail_path)
+            if self.total > self.budget:
+                self.evict()
+
+    def files(self):
+        """ Lists the thumbnails as (last use, size, path).
+        """
+        thumbnails = []
+        if not os.path.isdir(self.path):
+            return thumbnails
+        for folder in os.scandir(self.path):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if entry.name.endswith(".jpg"):
+                        stat = entry.stat()
+                        thumbnails.append((stat.st_mtime, stat.st_size, entry.path))
+        return thumbnails
+
+    def evict(self):
+        """ Deletes the least recently used thumbnails until the cache is at 90% of its budget.
+        """
+        thumbnails = sorted(self.files())
+        self.total = sum(size for _, size, _ in thumbnails)
+        for _, size, path in thumbnails:
+            if self.total <= 0.9 * self.budget:
+                break
+            try:
+                os.remove(path)
+                self.total -= size
+            except OSError:
+                pass
+
+    def invalidate(self, image_path):
+        """ Deletes all the thumbnails of an image.
+        """
+        key = self.key(image_path)
+        folder = os.path.join(self.path, key[:2])
+        if not os.path.isdir(folder):
+            return
+        for entry in os.scandir(folder):
+            if entry.name.startswith(key):
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    with self.lock:
+                        if self.total is not None:
+                            self.total -= size
+                except OSError:
+                    pass
+
+# Cache used by the module functions, created when first needed
+default_cache = None
+
+def get_cache():
+    """ Returns the thumbnail cache stored in config.thumbnails_path.
+    """
+    global default_cache
+    if default_cache is None:
+        default_cache = ThumbnailCache(config.thumbnails_path)
+    return default_cache
+
+def get_thumbnail(image_path, scale):
+    """ Returns the thumbnail of an image at a scale, from the cache or created.
+
+    Parameters
+    ----------
+    image_path : str
+        the path to the original image.
+    scale : int
+        the downscaling factor (20 for the panorama, 4 for the diaporama).
+
+    Returns
+    -------
+    PIL.Image
+        the thumbnail.
+    """
+    return get_cache().get(image_path, scale)
+
+def generate(image_path):
+    """ Creates the thumbnails of an image for all the display scales (config.thumbnail_scales).
+    """
+    for scale in config.thumbnail_scales:
+        get_thumbnail(image_path, scale)
+
+def invalidate(image_path):
+    """ Deletes the thumbnails of an image, e.g. when the original is replaced.
+    """
+    get_cache().invalidate(image_path)
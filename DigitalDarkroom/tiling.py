@@ -0,0 +1,169 @@
+"""
+Module to filter and enhance very large images tile by tile.
+
+The image is cut into tiles that are extended by a halo of the radius of the
+filter kernel, so every output pixel is computed from the same neighbours as
+with the whole image operation and the stitched result is identical. Only the
+output image and a few tiles are allocated instead of the full size copies
+made by PIL.ImageFilter and PIL.ImageEnhance (expanded borders, degenerate
+images). Tiles can be processed by several threads: PIL releases the GIL
+while filtering and blending.
+
+Functions
+---------
+tile_boxes
+    Function to cut an image into tiles.
+
+kernel_radius
+    Function to get the halo needed by a filter.
+
+process_tiled
+    Function to apply a local operation to an image tile by tile.
+
+filter_tiled
+    Function to apply a PIL.ImageFilter filter tile by tile.
+
+enhance_tiled
+    Function to apply a PIL.ImageEnhance enhancement tile by tile.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from PIL import (Image, ImageEnhance, ImageFilter, ImageStat)
+import config
+
+def tile_boxes(size, tile_size = config.tile_size):
+    """ Returns the boxes (left, upper, right, lower) of the tiles covering an image.
+
+    Parameters
+    ----------
+    size : tuple
+        the width and height of the image.
+    tile_size : int
+        the width and height of a tile (smaller at the right and bottom edges).
+
+    Returns
+    -------
+    list
+        the boxes of the tiles, row by row.
+    """
+    return [(left, upper, min(left + tile_size, size[0]), min(upper + tile_size, size[1]))
+            for upper in range(0, size[1], tile_size)
+            for left in range(0, size[0], tile_size)]
+
+def kernel_radius(image_filter):
+    """ Returns the number of neighbouring pixels on each side used by a filter.
+    """
+    if hasattr(image_filter, "filterargs"):
+        return image_filter.filterargs[0][0] // 2
+    if hasattr(image_filter, "size"):
+        return image_filter.size // 2
+    raise ValueError(f"The kernel size of {image_filter} is unknown")
+
+def process_tiled(image, operation, halo, tile_size = config.tile_size, workers = config.tile_workers):
+    """ Applies a local operation to an image tile by tile and stitches the result.
+
+    Parameters
+    ----------
+    image : PIL.Image
+        the image.
+    operation : function
+        function returning the processed tile (same size and mode) of a tile.
+    halo : int
+        the number of pixels added on each side of the tiles (radius of the operation).
+    tile_size : int
+        the width and height of the tiles (without halo).
+    workers : int
+        the number of threads processing the tiles.
+
+    Returns
+    -------
+    PIL.Image
+        the processed image.
+    """
+    output = Image.new(image.mode, image.size)
+
+    def process(box):
+        """ Processes one tile with its halo and pastes the tile without halo in the output.
+        """
+        outer = (max(0, box[0] - halo), max(0, box[1] - halo),
+                 min(image.size[0], box[2] + halo), min(image.size[1], box[3] + halo))
+        result = operation(image.crop(outer))
+        inner = (box[0] - outer[0], box[1] - outer[1], box[2] - outer[0], box[3] - outer[1])
+        output.paste(result.crop(inner), box[:2])
+
+    boxes = tile_boxes(image.size, tile_size)
+    if workers > 1 and len(boxes) > 1:
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            list(pool.map(process, boxes))
+    else:
+        for box in boxes:
+            process(box)
+    return output
+
+def filter_tiled(image, image_filter, tile_size = config.tile_size, workers = config.tile_workers):
+    """ Applies a filter of PIL.ImageFilter tile by tile (same result as image.filter).
+
+    Parameters
+    ----------
+    image : PIL.Image
+        the image.
+    image_filter : PIL.ImageFilter.Filter
+        the filter. Example: ImageFilter.BLUR
+    tile_size : int
+        the width and height of the tiles.
+    workers : int
+        the number of threads processing the tiles.
+
+    Returns
+    -------
+    PIL.Image
+        the filtered image.
+    """
+    return process_tiled(image, lambda tile: tile.filter(image_filter), kernel_radius(image_filter),
+                         tile_size, workers)
+
+def enhance_tiled(image, enhancer, factor, tile_size = config.tile_size, workers = config.tile_workers):
+    """ Applies an enhancement of PIL.ImageEnhance tile by tile (same result as
+    enhancer(image).enhance(factor)).
+
+    Parameters
+    ----------
+    image : PIL.Image
+        the image.
+    enhancer : class
+        the enhancement. Example: ImageEnhance.Contrast
+    factor : float
+        the enhancement factor.
+    tile_size : int
+        the width and height of the tiles.
+    workers : int
+        the number of threads processing the tiles.
+
+    Returns
+    -------
+    PIL.Image
+        the enhanced image.
+    """
+    if enhancer is not ImageEnhance.Contrast:
+        halo = kernel_radius(ImageFilter.SMOOTH) if enhancer is ImageEnhance.Sharpness else 0
+        return process_tiled(image, lambda tile: enhancer(tile).enhance(factor), halo, tile_size, workers)
+
+    # The contrast is blended with the mean grey level of the whole image,
+    # computed from the histograms of the tiles
+    histogram = [0] * 256
+    for box in tile_boxes(image.size, tile_size):
+        tile = image.crop(box)
+        for level, count in enumerate((tile if tile.mode == "L" else tile.convert("L")).histogram()):
+            histogram[level] += count
+    mean = int(ImageStat.Stat(histogram).mean[0] + 0.5)
+
+    def contrast(tile):
+        """ Blends a tile with the mean grey level, as ImageEnhance.Contrast.
+        """
+        degenerate = Image.new("L", tile.size, mean)
+        if degenerate.mode != tile.mode:
+            degenerate = degenerate.convert(tile.mode)
+        if "A" in tile.getbands():
+            degenerate.putalpha(tile.getchannel("A"))
+        return Image.blend(degenerate, tile, factor)
+
+    return process_tiled(image, contrast, 0, tile_size, workers)
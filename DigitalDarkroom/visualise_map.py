@@ -3,45 +3,73 @@
 Functions
 ---------
 select_images
-    Function to select images from their locations on the worldmap. Called by a pick event on the figure.
+    Function to select the images of the cluster picked on the worldmap (with the spatial index). Called by a pick event on the figure.
+
+update_clusters
+    Function to draw the clusters of image locations in view. Called when the map is zoomed or moved.
     
 plot_locations
-    Function to plot the image locations on the worldmap.
+    Function to plot the image locations on the worldmap, grouped into clusters.
     
 plot_geo_heatmap
     Function to plot the density of the image locations on the worldmap.
 """
 import os
 import config
+import spatial
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 import geoplot as gplt
 import matplotlib.pyplot as plt
 import display_images as implay
+from map_clusters import MarkerClusters
 
 def select_images(pick_event):
-    """ Launches display of images that correspond to map location picked by user.
+    """ Launches display of the images of the cluster picked by user.
+    The images are found with the spatial index in the cells of the picked clusters,
+    so that the images located since the map was opened are also displayed.
     
     Parameters
     ----------
     pick_event : matplotlib.backend_bases.PickEvent
         the event that was picked on the map.
     """
-    # Get list of images that correspond to locations
+    # Get list of images of the picked markers (overlapping markers can be picked together)
+    index = spatial.get_index()
+    images = sorted({image_id for box in pick_event.artist.clusters.cells(pick_event.ind)
+                     for image_id in index.bbox(*box).tolist()})
     plt.close('all')
-    images = list(config.DB.iloc[pick_event.ind, :].index)
+    if not images:
+        return
 
-    # Launch image diaporama if right click 
+    # Launch image panorama if left click
     if pick_event.mouseevent.button == 1:
-        implay.display_diaporama(images, picker = False)
+        implay.display_panorama(images, picker = False)
 
-    # Launch image panorama if left click
+    # Launch image diaporama if right click
     elif pick_event.mouseevent.button == 3:
-        implay.display_panorama(images, picker = False)  
+        implay.display_diaporama(images, picker = False)
+
+def update_clusters(axis):
+    """ Draws one marker (sized by its number of images) per cluster in view, at the
+    zoom level of the view. Called when the limits of the map change.
+    
+    Parameters
+    ----------
+    axis : matplotlib.axes.Axes
+        the axis of the world map, with the markers of the clusters as attribute.
+    """
+    west, east = axis.get_xlim()
+    south, north = axis.get_ylim()
+    markers = axis.cluster_markers
+    longitudes, latitudes, counts = markers.clusters.view(south, west, north, east)
+    markers.set_offsets(np.column_stack([longitudes, latitudes]))
+    markers.set_sizes(MarkerClusters.marker_sizes(counts))
     
 def plot_locations():
     """ Plots image locations on world map.
+    The locations are grouped into clusters computed once for every zoom level.
     """
     # Initialise figure
     figure, axis = plt.subplots()
@@ -50,15 +78,16 @@ def plot_locations():
     world_map = gpd.read_file(os.path.join(config.program_path,'worldmap.shp'))
     world_map.plot(ax = axis, column = 'LABEL_Y', cmap = "viridis")
     axis.set_axis_off()
+    axis.set_autoscale_on(False)
 
-    # Create geopandas dataframe with the image locations
-    geodata_locations = gpd.GeoDataFrame(config.DB[["Latitude", "Longitude", "Location"]], 
-                                         geometry = gpd.points_from_xy(config.DB["Longitude"], 
-                                                                       config.DB["Latitude"]))
-
+    # Group the locations of the geotagged images into clusters
+    axis.cluster_markers = axis.scatter([], [], color = "red", edgecolors = "darkred", alpha = 0.8, picker = True)
+    axis.cluster_markers.clusters = MarkerClusters(*spatial.coordinates(config.DB))
 
-    # Plot image locations
-    geodata_locations.plot(ax = axis, color = "red", picker = True)
+    # Plot the clusters in view, again after each zoom or move
+    update_clusters(axis)
+    axis.callbacks.connect("xlim_changed", update_clusters)
+    axis.callbacks.connect("ylim_changed", update_clusters)
     plt.connect(s = "pick_event", func = select_images)
     plt.show()
     
@@ -0,0 +1,264 @@
+"""
+Module to keep the image database up to date while files are added (watch mode).
+
+The watched drop folders and the event folders of the Images tree are polled
+with os.scandir, so the watch mode needs no system service or extra package.
+A change is only processed once it has stayed the same for config.watch_settle
+seconds (debounce): a file that is still being copied is not read, and the
+changes of a burst of files are processed together.
+
+- The new images of a drop folder are uploaded to its event in one ingest session.
+- An event folder of the Images tree is listed again when its modification
+  time changes (a file was added, removed or renamed in it), then the event is
+  reconciled with the database by rescan.
+- A file rewritten in place does not change the modification time of its folder.
+  If config.watch_check_interval is set, the files of every event folder are
+  listed at that interval and the events whose sizes or modification times
+  changed are rescanned. This is off by default: each check reads the size and
+  modification time of every file of the library, so its cost grows with the library.
+
+Classes
+-------
+Watcher
+    Poller of the drop folders and of the Images tree.
+
+Functions
+---------
+watch
+    Function to run the watch mode until the user stops it.
+"""
+import os
+import time
+import argparse
+import config
+from rescan import (is_image_file, rescan)
+
+class Watcher():
+    """ Poller of the drop folders and of the event folders of the Images tree.
+
+    Attributes
+    ----------
+    folders : dict
+        the paths of the drop folders and the names of their events.
+    images_path : str
+        the path to the Images folder.
+    settle : float
+        the number of seconds a change must stay the same before it is processed.
+    pending_files : dict
+        the signature of the new files of the drop folders and the time it last changed.
+    pending_events : dict
+        the signature of the changed event folders and the time it last changed.
+    event_mtimes : dict
+        the modification time of each event folder when it was last processed.
+    event_signatures : dict
+        the signature of the files of each event folder when it was last processed.
+    check_interval : float
+        the number of seconds between two listings of the files of every event folder
+        (None: the files rewritten in place are not looked for).
+    checked : float
+        the time of the last listing of the files of every event folder.
+    processed : dict
+        the signature of the files of the drop folders already processed.
+    """
+
+    def __init__(self, folders = None, images_path = None, settle = config.watch_settle,
+                 check_interval = config.watch_check_interval):
+        self.folders = dict(config.watch_folders if folders is None else folders)
+        self.images_path = config.images_path if images_path is None else images_path
+        self.settle = settle
+        self.pending_files = {}
+        self.pending_events = {}
+        self.processed = {}
+        self.event_mtimes = self.list_events()
+        self.check_interval = check_interval
+        self.event_signatures = ({} if check_interval is None else
+                                 {event: self.event_signature(event) for event in self.event_mtimes})
+        self.checked = None
+
+    def list_events(self):
+        """ Returns the modification time of each event folder of the Images tree.
+        """
+        if not os.path.isdir(self.images_path):
+            return {}
+        with os.scandir(self.images_path) as entries:
+            return {entry.name: entry.stat().st_mtime_ns for entry in entries
+                    if entry.is_dir() and not entry.name.startswith(".")}
+
+    def event_signature(self, event):
+        """ Returns a hash of the name, size and modification time of each file of
+        an event folder (None if the folder was removed).
+        """
+        try:
+            with os.scandir(os.path.join(self.images_path, event)) as entries:
+                stats = sorted((entry.name, entry.stat()) for entry in entries if entry.is_file())
+        except FileNotFoundError:
+            return None
+        return hash(tuple((name, stat.st_size, stat.st_mtime_ns) for name, stat in stats))
+
+    def settled(self, pending, key, signature, now):
+        """ Records the signature of a change and returns True if it has not
+        changed for settle seconds.
+        """
+        if key not in pending or pending[key][0] != signature:
+            pending[key] = (signature, now)
+        if now - pending[key][1] >= self.settle:
+            del pending[key]
+            return True
+        return False
+
+    def poll(self, now = None):
+        """ Lists the watched folders once.
+
+        Parameters
+        ----------
+        now : float
+            the time of the poll in seconds (default: time.monotonic()).
+
+        Returns
+        -------
+        files : dict
+            the paths of the new or changed files of the drop folders that are ready, by event.
+        events : list
+            the names of the event folders of the Images tree that are ready to be rescanned.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        # New or changed files of the drop folders
+        files = {}
+        listed = set()
+        for folder, event in self.folders.items():
+            try:
+                entries = [entry for entry in os.scandir(folder) if entry.is_file() and is_image_file(entry.name)]
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                listed.add(entry.path)
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if self.processed.get(entry.path) == signature:
+                    continue
+                if self.settled(self.pending_files, entry.path, signature, now):
+                    files.setdefault(event, []).append(entry.path)
+                    self.processed[entry.path] = signature
+
+        # Files removed from the drop folders are forgotten
+        for path in set(self.pending_files) - listed:
+            del self.pending_files[path]
+        for path in set(self.processed) - listed:
+            del self.processed[path]
+
+        # Event folders whose list of files changed since they were last processed
+        event_mtimes = self.list_events()
+        for event in set(event_mtimes) | set(self.event_mtimes):
+            if event_mtimes.get(event) != self.event_mtimes.get(event) and event not in self.pending_events:
+                self.pending_events[event] = (self.event_signature(event), now)
+
+        # Files rewritten in place, found by listing every event folder from time to time (optional)
+        if self.check_interval is not None and self.checked is None:
+            self.checked = now
+        elif self.check_interval is not None and now - self.checked >= self.check_interval:
+            self.checked = now
+            for event in event_mtimes:
+                if event not in self.pending_events:
+                    signature = self.event_signature(event)
+                    if signature != self.event_signatures.get(event):
+                        self.pending_events[event] = (signature, now)
+        events = []
+        for event in list(self.pending_events):
+            signature = self.event_signature(event)
+            if self.settled(self.pending_events, event, signature, now):
+                events.append(event)
+                if event in event_mtimes:
+                    self.event_mtimes[event] = event_mtimes[event]
+                    self.event_signatures[event] = signature
+                else:
+                    self.event_mtimes.pop(event, None)
+                    self.event_signatures.pop(event, None)
+        return files, sorted(events)
+
+    def process(self, files, events):
+        """ Uploads the new files of the drop folders and rescans the changed events.
+
+        Parameters
+        ----------
+        files : dict
+            the paths of the files to upload, by event.
+        events : list
+            the names of the events to rescan.
+
+        Returns
+        -------
+        dict
+            the number of images uploaded, added, updated, moved and removed.
+        """
+        from ingest import (IngestSession, ingest_files)
+
+        counts = {"uploaded": 0, "added": 0, "updated": 0, "moved": 0, "removed": 0}
+        if files:
+            with IngestSession() as session:
+                for event, paths in files.items():
+                    dest = os.path.join(self.images_path, event)
+                    os.makedirs(dest, exist_ok = True)
+                    copied, _ = ingest_files(sorted(paths), dest, session)
+                    counts["uploaded"] += copied
+        if events:
+            result = rescan(self.images_path, events)
+            for key in ("added", "updated", "moved", "removed"):
+                counts[key] += len(result[key])
+        return counts
+
+    def run(self, interval = config.watch_interval, polls = None):
+        """ Polls the watched folders every interval seconds and processes the changes.
+
+        Parameters
+        ----------
+        interval : float
+            the number of seconds between two polls.
+        polls : int
+            the number of polls before returning (default: until interrupted).
+        """
+        number = 0
+        while polls is None or number < polls:
+            files, events = self.poll()
+            if files or events:
+                counts = self.process(files, events)
+                print(time.strftime("%H:%M:%S"),
+                      ", ".join(f"{count} {key}" for key, count in counts.items() if count) or "no changes")
+            number += 1
+            if polls is None or number < polls:
+                time.sleep(interval)
+
+def watch():
+    """ Runs the watch mode until the user presses Ctrl+C.
+    """
+    watcher = Watcher()
+    print("Watching", ", ".join(list(watcher.folders) + [watcher.images_path]))
+    print("Press Ctrl+C to stop.\n")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("\nThe watch mode has been stopped.\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Upload the new images of drop folders and keep the database "
+                                                   "up to date with the Images folder")
+    parser.add_argument("--folder", nargs = 2, action = "append", metavar = ("PATH", "EVENT"), default = [],
+                        help = "a drop folder and the event of its images (default: config.watch_folders)")
+    parser.add_argument("--interval", type = float, default = config.watch_interval)
+    parser.add_argument("--settle", type = float, default = config.watch_settle)
+    parser.add_argument("--check-interval", type = float, default = config.watch_check_interval,
+                        help = "seconds between two listings of the files of every event folder, "
+                               "to find the images rewritten in place (default: not checked)")
+    parser.add_argument("--polls", type = int, help = "stop after this number of polls")
+    args = parser.parse_args()
+
+    watcher = Watcher(dict(args.folder) if args.folder else None, settle = args.settle,
+                      check_interval = args.check_interval)
+    try:
+        watcher.run(args.interval, args.polls)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if config.is_loaded():
+            config.STORAGE.flush(config.DB)